@@ -0,0 +1,230 @@
+import json
+import math
+
+
+class Box():
+    """
+    A labeled bounding box with inclusive corner coordinates in full-resolution image pixels.
+    The label files store boxes as [x, y, width, height], so width = x2 - x1 + 1.
+    """
+    __slots__ = ('tag', 'x1', 'y1', 'x2', 'y2')
+
+    def __init__(self, tag, x1, y1, x2, y2):
+        self.tag = tag
+        self.x1, self.y1, self.x2, self.y2 = x1, y1, x2, y2
+
+    @property
+    def corners(self):
+        return self.x1, self.y1, self.x2, self.y2
+
+    @corners.setter
+    def corners(self, corners):
+        self.x1, self.y1, self.x2, self.y2 = corners
+
+    def center(self):
+        return (self.x1 + self.x2) / 2, (self.y1 + self.y2) / 2
+
+    @classmethod
+    def from_json(cls, gtbox):
+        x1, y1, width, height = map(int, gtbox["box"])
+        return cls(gtbox["tag"], x1, y1, x1 + width - 1, y1 + height - 1)
+
+    def to_json(self):
+        x_min, y_min = int(self.x1), int(self.y1)
+        width, height = self.x2 - self.x1 + 1, self.y2 - self.y1 + 1
+        return {"tag": self.tag, "box": [x_min, y_min, int(width), int(height)]}
+
+    def __eq__(self, other):
+        return isinstance(other, Box) and self.tag == other.tag and self.corners == other.corners
+
+    def __repr__(self):
+        return f"Box({self.tag!r}, {self.x1}, {self.y1}, {self.x2}, {self.y2})"
+
+
+def normalized(corners):
+    """Corners as (left, top, right, bottom), whatever direction the box was drawn or dragged in."""
+    x1, y1, x2, y2 = corners
+    return min(x1, x2), min(y1, y2), max(x1, x2), max(y1, y2)
+
+
+class BoxGrid():
+    """
+    Uniform grid over the box extents: every cell keeps the indices of the boxes overlapping it,
+    so a point query only looks at the few boxes around the point.
+    """
+
+    def __init__(self, cell=128):
+        self.cell = cell
+        self.cells = {}  # (column, row) -> set of box indices
+        self.ranges = {}  # box index -> (column1, row1, column2, row2)
+
+    def cell_range(self, x1, y1, x2, y2):
+        cell = self.cell
+        return math.floor(x1 / cell), math.floor(y1 / cell), math.floor(x2 / cell), math.floor(y2 / cell)
+
+    def insert(self, index, corners):
+        c1, r1, c2, r2 = self.ranges[index] = self.cell_range(*normalized(corners))
+        for column in range(c1, c2 + 1):
+            for row in range(r1, r2 + 1):
+                self.cells.setdefault((column, row), set()).add(index)
+
+    def remove(self, index):
+        c1, r1, c2, r2 = self.ranges.pop(index)
+        for column in range(c1, c2 + 1):
+            for row in range(r1, r2 + 1):
+                self.cells[(column, row)].discard(index)
+
+    def update(self, index, corners):
+        self.remove(index)
+        self.insert(index, corners)
+
+    def candidates(self, x1, y1, x2, y2):
+        """Indices of the boxes that may overlap the region (x1, y1, x2, y2)."""
+        c1, r1, c2, r2 = self.cell_range(x1, y1, x2, y2)
+        found = set()
+        for column in range(c1, c2 + 1):
+            for row in range(r1, r2 + 1):
+                found.update(self.cells.get((column, row), ()))
+        return found
+
+
+class AnnotationDocument():
+    """
+    Annotations of one frame: file metadata, boxes and HOI triplets, independent of any Tk widget.
+
+    `hoi` keeps the triplets as dicts in the label file layout
+    ({"object_id", "interaction", "subject_id"}, indices into `boxes`).
+    Boxes are changed through the methods below (or by assigning a new list to `boxes`), which keep
+    the spatial index used by box_at / corner_at up to date.
+    """
+
+    def __init__(self, file_name='', width=0, height=0, boxes=None, hoi=None):
+        self.file_name = file_name
+        self.width = width
+        self.height = height
+        self.boxes = boxes if boxes is not None else []
+        self.hoi = hoi if hoi is not None else []
+
+    @property
+    def boxes(self):
+        return self._boxes
+
+    @boxes.setter
+    def boxes(self, boxes):
+        self._boxes = boxes
+        self._grid = None  # rebuilt on the next query
+
+    # ----------------- boxes ---------------------
+    def add_box(self, tag, x1, y1, x2, y2):
+        self.boxes.append(Box(tag, x1, y1, x2, y2))
+        if self._grid is not None:
+            self._grid.insert(len(self.boxes) - 1, (x1, y1, x2, y2))
+        return len(self.boxes) - 1
+
+    def remove_box(self, index):
+        # connections keep their indices, as the tool always did
+        self._grid = None  # the following boxes move down one index
+        return self.boxes.pop(index)
+
+    def set_corners(self, index, corners):
+        self.boxes[index].corners = corners
+        if self._grid is not None:
+            self._grid.update(index % len(self.boxes), corners)
+
+    def set_tag(self, index, tag):
+        self.boxes[index].tag = tag
+
+    # ----------------- hit testing ---------------------
+    def grid(self):
+        if self._grid is None:
+            self._grid = BoxGrid()
+            for index, box in enumerate(self.boxes):
+                self._grid.insert(index, box.corners)
+        return self._grid
+
+    def box_at(self, x, y):
+        """Index of the smallest box containing (x, y), or None."""
+        best, best_area = None, None
+        for index in self.grid().candidates(x, y, x, y):
+            x1, y1, x2, y2 = normalized(self.boxes[index].corners)
+            if x1 <= x <= x2 and y1 <= y <= y2:
+                area = (x2 - x1 + 1) * (y2 - y1 + 1)
+                if best is None or (area, index) < (best_area, best):
+                    best, best_area = index, area
+        return best
+
+    def corner_at(self, x, y, threshold):
+        """
+        The box corner closest to (x, y) within `threshold` (on both axes), smaller boxes first on ties.
+        :return: (box index, 'top_left' | 'top_right' | 'bottom_left' | 'bottom_right') or None.
+        """
+        best, best_key = None, None
+        for index in self.grid().candidates(x - threshold, y - threshold, x + threshold, y + threshold):
+            x1, y1, x2, y2 = self.boxes[index].corners
+            area = abs((x2 - x1 + 1) * (y2 - y1 + 1))
+            corners = (("top_left", x1, y1), ("top_right", x2, y1), ("bottom_left", x1, y2), ("bottom_right", x2, y2))
+            for corner_name, cx, cy in corners:
+                distance = max(abs(cx - x), abs(cy - y))
+                if distance <= threshold and (best_key is None or (distance, area, index) < best_key):
+                    best, best_key = (index, corner_name), (distance, area, index)
+        return best
+
+    # ----------------- interactions ---------------------
+    def add_interaction(self, subject_id, object_id, interaction):
+        self.hoi.append({"object_id": object_id, "interaction": interaction, "subject_id": subject_id})
+        return len(self.hoi) - 1
+
+    def remove_interaction(self, index):
+        return self.hoi.pop(index)
+
+    def clear_interactions(self):
+        self.hoi = []
+
+    def clear_boxes(self):
+        self.boxes = []
+
+    def clear(self):
+        self.clear_boxes()
+        self.clear_interactions()
+
+    def default_hoi(self):
+        """
+        Interactions written when none were labeled: if the first box is a person,
+        it gets a `no_interaction` with every other box.
+        """
+        if len(self.boxes) != 0 and self.boxes[0].tag == 'person':
+            return [
+                {"object_id": index, "interaction": "no_interaction", "subject_id": 0}
+                for index in range(1, len(self.boxes))
+            ]
+        return []
+
+    # ----------------- (de)serialization ---------------------
+    @classmethod
+    def from_json(cls, data):
+        doc = cls(data.get("file_name", ''), data.get("width", 0), data.get("height", 0))
+        doc.boxes = [Box.from_json(gtbox) for gtbox in data.get("gtboxes", [])]
+        for conn in data.get("hoi", []):
+            doc.add_interaction(conn['subject_id'], conn['object_id'], conn['interaction'])
+        return doc
+
+    def to_json(self):
+        return {
+            "file_name": self.file_name,
+            "height": self.height,
+            "width": self.width,
+            "gtboxes": [box.to_json() for box in self.boxes],
+            "hoi": self.hoi if len(self.hoi) != 0 else self.default_hoi()
+        }
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r') as file:
+            return cls.from_json(json.load(file))
+
+    def save(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.to_json(), f)
+
+    def __repr__(self):
+        return f"AnnotationDocument({self.file_name!r}, boxes={self.boxes}, hoi={self.hoi})"
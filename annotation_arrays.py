@@ -0,0 +1,192 @@
+import glob
+import json
+import os
+
+import numpy as np
+
+from annotation import AnnotationDocument, Box
+
+
+class Vocabulary():
+    """Maps tag / interaction names to small integer codes (in order of first appearance)."""
+
+    def __init__(self, names=()):
+        self.names = []
+        self.codes = {}
+        for name in names:
+            self.code(name)
+
+    def code(self, name):
+        code = self.codes.get(name)
+        if code is None:
+            code = self.codes[name] = len(self.names)
+            self.names.append(name)
+        return code
+
+    def __getitem__(self, code):
+        return self.names[code]
+
+    def __len__(self):
+        return len(self.names)
+
+
+class AnnotationArrays():
+    """
+    Columnar representation of the annotations of one or more frames.
+
+    Boxes and HOI triplets of all frames are concatenated; frame i owns the rows
+    box_offsets[i]:box_offsets[i + 1] and hoi_offsets[i]:hoi_offsets[i + 1].
+    Boxes are stored as in the label files (x, y, w, h); hoi_subject/hoi_object are
+    frame-local indices into the frame's boxes, exactly as written in `hoi`.
+    """
+
+    def __init__(self, tags=None, interactions=None):
+        self.tags = tags if tags is not None else Vocabulary()
+        self.interactions = interactions if interactions is not None else Vocabulary()
+
+        self.file_names = []
+        self.paths = []  # label file of every frame, when loaded from disk
+        self.width = np.zeros(0, dtype=np.int32)
+        self.height = np.zeros(0, dtype=np.int32)
+
+        self.box_offsets = np.zeros(1, dtype=np.int64)
+        self.x = np.zeros(0, dtype=np.int32)
+        self.y = np.zeros(0, dtype=np.int32)
+        self.w = np.zeros(0, dtype=np.int32)
+        self.h = np.zeros(0, dtype=np.int32)
+        self.tag = np.zeros(0, dtype=np.int16)
+
+        self.hoi_offsets = np.zeros(1, dtype=np.int64)
+        self.hoi_subject = np.zeros(0, dtype=np.int32)
+        self.hoi_object = np.zeros(0, dtype=np.int32)
+        self.hoi_interaction = np.zeros(0, dtype=np.int16)
+
+    def __len__(self):
+        return len(self.file_names)
+
+    @property
+    def box_frame(self):
+        """Frame index of every box row."""
+        return np.repeat(np.arange(len(self), dtype=np.int32), np.diff(self.box_offsets))
+
+    @property
+    def hoi_frame(self):
+        """Frame index of every HOI row."""
+        return np.repeat(np.arange(len(self), dtype=np.int32), np.diff(self.hoi_offsets))
+
+    # ----------------- building ---------------------
+    @classmethod
+    def from_json(cls, records, tags=None, interactions=None):
+        """
+        Build the arrays from parsed label file dicts (one per frame).
+        Everything is collected into flat Python lists first and converted to arrays once.
+        """
+        arrays = cls(tags, interactions)
+        file_names, widths, heights = [], [], []
+        box_counts, boxes, tag_codes = [], [], []
+        hoi_counts, hoi_rows = [], []
+
+        for data in records:
+            file_names.append(data["file_name"])
+            widths.append(data["width"])
+            heights.append(data["height"])
+
+            gtboxes = data["gtboxes"]
+            box_counts.append(len(gtboxes))
+            for gtbox in gtboxes:
+                boxes.append(gtbox["box"])
+                tag_codes.append(arrays.tags.code(gtbox["tag"]))
+
+            hoi = data["hoi"]
+            hoi_counts.append(len(hoi))
+            for conn in hoi:
+                hoi_rows.append(
+                    (conn["subject_id"], conn["object_id"], arrays.interactions.code(conn["interaction"]))
+                )
+
+        arrays.file_names = file_names
+        arrays.width = np.asarray(widths, dtype=np.int32)
+        arrays.height = np.asarray(heights, dtype=np.int32)
+
+        arrays.box_offsets = np.zeros(len(file_names) + 1, dtype=np.int64)
+        np.cumsum(box_counts, out=arrays.box_offsets[1:])
+        box_array = np.asarray(boxes, dtype=np.int32).reshape(-1, 4)
+        arrays.x, arrays.y, arrays.w, arrays.h = (np.ascontiguousarray(col) for col in box_array.T)
+        arrays.tag = np.asarray(tag_codes, dtype=np.int16)
+
+        arrays.hoi_offsets = np.zeros(len(file_names) + 1, dtype=np.int64)
+        np.cumsum(hoi_counts, out=arrays.hoi_offsets[1:])
+        hoi_array = np.asarray(hoi_rows, dtype=np.int32).reshape(-1, 3)
+        arrays.hoi_subject = np.ascontiguousarray(hoi_array[:, 0])
+        arrays.hoi_object = np.ascontiguousarray(hoi_array[:, 1])
+        arrays.hoi_interaction = hoi_array[:, 2].astype(np.int16)
+        return arrays
+
+    @classmethod
+    def from_document(cls, doc, tags=None, interactions=None):
+        """Arrays of a single frame, as it would be written by saveImage."""
+        return cls.from_json([doc.to_json()], tags, interactions)
+
+    @classmethod
+    def from_files(cls, paths, tags=None, interactions=None):
+        def records():
+            for path in paths:
+                with open(path, 'r') as file:
+                    yield json.load(file)
+
+        arrays = cls.from_json(records(), tags, interactions)
+        arrays.paths = list(paths)
+        return arrays
+
+    @classmethod
+    def from_directory(cls, labels_dir, tags=None, interactions=None):
+        """Load a whole sequence (all .txt label files of a directory, sorted by name)."""
+        paths = sorted(glob.glob(os.path.join(labels_dir, '*.txt')))
+        return cls.from_files(paths, tags, interactions)
+
+    # ----------------- access ---------------------
+    def to_json(self, frame):
+        """The label file dict of `frame`, identical to what was loaded."""
+        b0, b1 = self.box_offsets[frame], self.box_offsets[frame + 1]
+        h0, h1 = self.hoi_offsets[frame], self.hoi_offsets[frame + 1]
+        return {
+            "file_name": self.file_names[frame],
+            "height": int(self.height[frame]),
+            "width": int(self.width[frame]),
+            "gtboxes": [
+                {"tag": self.tags[tag], "box": [x, y, w, h]}
+                for x, y, w, h, tag in zip(
+                    self.x[b0:b1].tolist(), self.y[b0:b1].tolist(), self.w[b0:b1].tolist(),
+                    self.h[b0:b1].tolist(), self.tag[b0:b1].tolist()
+                )
+            ],
+            "hoi": [
+                {"object_id": obj, "interaction": self.interactions[interaction], "subject_id": sub}
+                for sub, obj, interaction in zip(
+                    self.hoi_subject[h0:h1].tolist(), self.hoi_object[h0:h1].tolist(),
+                    self.hoi_interaction[h0:h1].tolist()
+                )
+            ],
+        }
+
+    def iter_json(self):
+        for frame in range(len(self)):
+            yield self.to_json(frame)
+
+    def document(self, frame):
+        """The frame as an AnnotationDocument."""
+        b0, b1 = self.box_offsets[frame], self.box_offsets[frame + 1]
+        doc = AnnotationDocument(self.file_names[frame], int(self.width[frame]), int(self.height[frame]))
+        doc.boxes = [
+            Box(self.tags[tag], x, y, x + w - 1, y + h - 1)
+            for x, y, w, h, tag in zip(
+                self.x[b0:b1].tolist(), self.y[b0:b1].tolist(), self.w[b0:b1].tolist(),
+                self.h[b0:b1].tolist(), self.tag[b0:b1].tolist()
+            )
+        ]
+        doc.hoi = self.to_json(frame)["hoi"]
+        return doc
+
+    def corners(self):
+        """Inclusive (x1, y1, x2, y2) corners of all boxes as an (N, 4) array."""
+        return np.stack([self.x, self.y, self.x + self.w - 1, self.y + self.h - 1], axis=1)
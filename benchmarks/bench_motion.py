@@ -0,0 +1,175 @@
+"""
+Replay a stream of synthetic <Motion> events through LabelTool.mouseMove and report the time per
+rendered update and events/sec.
+
+"before" is the original handler that deleted and re-created the crosshair lines and the
+rubber-band rectangle on every event, "after" is the current mouseMove with persistent items and
+coalesced redraws. An update is one call of the legacy handler, or one redraw_cursor of the
+current one. "update" is the cost of drawing the cursor once, "update_seconds" the total over the
+stream: coalescing makes fewer updates, it does not make a single one cheaper.
+
+Events are delivered at their timestamps (1 kHz for the synthetic stream), so the current handler
+redraws about once per MOTION_INTERVAL_MS as it would with a real mouse; --unpaced feeds them as
+fast as possible, which measures handler throughput only.
+
+    python -m benchmarks.bench_motion --events 5000 --boxes 200
+"""
+import argparse
+import json
+import math
+import random
+import time
+import types
+
+from benchmarks.bench_transition import summary
+from benchmarks.fake_tk import make_tool
+
+COLORS = {'person': 'red', 'object': 'blue'}
+
+
+def synthetic_events(count, width=2048, height=2048, seed=0):
+    """A smooth pointer path sampled at 1 kHz, as (t_ms, x, y)."""
+    rnd = random.Random(seed)
+    fx, fy = rnd.uniform(0.5, 1.5), rnd.uniform(0.5, 1.5)
+    events = []
+    for i in range(count):
+        t = i / 1000
+        x = width / 2 + width / 3 * math.sin(fx * t * 2 * math.pi)
+        y = height / 2 + height / 3 * math.cos(fy * t * 2 * math.pi)
+        events.append((i, int(x), int(y)))
+    return events
+
+
+def legacy_mouse_move(tool, event):
+    """mouseMove as it was before the crosshair items became persistent."""
+    x_offset = tool.mainPanel.canvasx(event.x)
+    y_offset = tool.mainPanel.canvasy(event.y)
+    tool.disp.config(text=f'x: {x_offset:.0f}, y: {y_offset:.0f}')
+
+    if tool.pyramid:
+        width, height = tool.pyramid.width, tool.pyramid.height
+        if tool.hl:
+            tool.mainPanel.delete(tool.hl)
+        tool.hl = tool.mainPanel.create_line(0, y_offset, width, y_offset, width=2)
+        if tool.vl:
+            tool.mainPanel.delete(tool.vl)
+        tool.vl = tool.mainPanel.create_line(x_offset, 0, x_offset, height, width=2)
+
+    if tool.STATE['click'] == 1:
+        if tool.bboxId:
+            tool.mainPanel.delete(tool.bboxId)
+        tool.bboxId = tool.mainPanel.create_rectangle(
+            tool.STATE['x'], tool.STATE['y'], x_offset, y_offset,
+            width=2,
+            outline=COLORS[tool.STATE['label_type'] if tool.STATE['label_type'] == 'person' else 'object']
+        )
+
+
+def populate(tool, boxes, seed=0):
+    """Put `boxes` rectangles and a connection line per object on the canvas."""
+    rnd = random.Random(seed)
+    tool.pyramid = types.SimpleNamespace(width=2048, height=2048)
+    for i in range(boxes):
+        x1, y1 = rnd.randrange(0, 1900), rnd.randrange(0, 1900)
+        x2, y2 = x1 + rnd.randrange(20, 140), y1 + rnd.randrange(20, 140)
+        tool.doc.add_box('person' if i == 0 else 'cup', x1, y1, x2, y2)
+        tool.bboxIdList.append(tool.mainPanel.create_rectangle(x1, y1, x2, y2, width=2, outline='blue'))
+        if i:
+            tool.connectionLines.append(tool.mainPanel.create_line(x1, y1, 100, 100, fill='yellow', width=2))
+    tool.STATE['click'] = 1
+    tool.STATE['x'], tool.STATE['y'] = 100, 100
+
+
+def timed(func, times):
+    def wrapper(*args):
+        start = time.perf_counter()
+        func(*args)
+        times.append(time.perf_counter() - start)
+    return wrapper
+
+
+def replay(tool, root, events, handler, coalesced, paced=True):
+    """
+    Feed every event to `handler` and pump the event loop after each one.
+    :param paced: Deliver every event at its timestamp instead of right after the previous one.
+    :param coalesced: The handler only schedules tool.redraw_cursor, whose calls are the updates;
+        otherwise every call of the handler is one.
+    :return: (seconds, list of the duration of every update in seconds)
+    """
+    update_times = []
+    if coalesced:
+        tool.redraw_cursor = timed(tool.redraw_cursor, update_times)  # shadows the method, see below
+    else:
+        handler = timed(handler, update_times)
+
+    start = time.perf_counter()
+    first_ms = events[0][0] if events else 0
+    for t_ms, x, y in events:
+        if paced:
+            delay = start + (t_ms - first_ms) / 1000 - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        handler(types.SimpleNamespace(x=x, y=y))
+        root.update()
+    # flush the last coalesced redraw instead of waiting for its timer
+    if tool.motionPending is not None:
+        root.after_cancel(tool.motionPending)
+        tool.redraw_cursor()
+    elapsed = time.perf_counter() - start
+
+    if coalesced:
+        del tool.redraw_cursor
+    return elapsed, update_times
+
+
+def run(events=5000, boxes=200, replay_file=None, real=True, paced=True):
+    stream = synthetic_events(events)
+    if replay_file:
+        with open(replay_file) as f:
+            stream = [tuple(e) for e in json.load(f)]
+
+    results = {"events": len(stream), "boxes": boxes, "paced": paced}
+    for name in ('before', 'after'):
+        tool, root, is_real = make_tool(real)
+        populate(tool, boxes)
+        created = getattr(tool.mainPanel, 'created', None)
+        if name == 'before':
+            elapsed, update_times = replay(tool, root, stream, lambda e: legacy_mouse_move(tool, e), False, paced)
+        else:
+            elapsed, update_times = replay(tool, root, stream, tool.mouseMove, True, paced)
+
+        result = {
+            "seconds": elapsed,
+            "events_per_sec": len(stream) / elapsed,
+            "redraws": len(update_times),
+            "update": summary(update_times),
+            "update_seconds": sum(update_times),
+        }
+        if created is not None:
+            result["canvas_items_created"] = tool.mainPanel.created - created
+        results[name] = result
+        results["tk"] = "real" if is_real else "fake"
+        tool.prefetcher.shutdown()
+        root.destroy()
+
+    before, after = results["before"], results["after"]
+    results["speedup_update"] = before["update"]["mean_ms"] / after["update"]["mean_ms"]
+    results["speedup_update_seconds"] = before["update_seconds"] / after["update_seconds"]
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Motion event replay benchmark")
+    parser.add_argument("--events", type=int, default=5000, help="Number of synthetic events (1 ms apart)")
+    parser.add_argument("--boxes", type=int, default=200, help="Boxes (and connection lines) on the canvas")
+    parser.add_argument("--record", type=str, default='', help="Write the synthetic event stream to this file and exit")
+    parser.add_argument("--replay", type=str, default='', help="Replay a recorded event stream [[t_ms, x, y], ...]")
+    parser.add_argument("--fake-tk", action='store_true', help="Use the fake canvas even if a display is available")
+    parser.add_argument("--unpaced", action='store_true', help="Feed the events without waiting for their timestamps")
+    args = parser.parse_args()
+
+    if args.record:
+        with open(args.record, 'w') as f:
+            json.dump(synthetic_events(args.events), f)
+    else:
+        print(json.dumps(run(args.events, args.boxes, args.replay, real=not args.fake_tk, paced=not args.unpaced), indent=2))
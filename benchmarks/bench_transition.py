@@ -0,0 +1,192 @@
+"""
+Step through a synthetic sequence with LabelTool.nextImage and report the per-frame transition time.
+
+"before" clears the canvas and listboxes and re-creates every item on each frame (the original
+clear_all + redraw), "after" is the current show_document, which reconciles the items of the
+previous frame with the new one. Boxes drift a few pixels per frame and occasionally a box is
+added, dropped or retagged, as in a labeled video.
+
+Only the label update differs between the two; the rest of a transition (image wait, rendering,
+label file read) is the same code, so "transition" changes far less than "label_update". An
+untimed pass first fills the on-disk caches (folder listing, label index), so neither variant
+pays for them.
+
+    python -m benchmarks.bench_transition --frames 200 --boxes 50
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import time
+
+from PIL import Image
+
+from benchmarks.fake_tk import make_tool
+
+COLORS = {'person': 'red', 'object': 'blue'}
+TAGS = ['cup', 'bottle', 'laptop', 'book']
+
+
+def make_sequence(root, frames, boxes, size, seed=0):
+    """Write Images/seq/*.png and Labels/seq/*.txt under `root`, return the image dir (relative to root)."""
+    rnd = random.Random(seed)
+    image_dir, label_dir = os.path.join('Images', 'seq'), os.path.join('Labels', 'seq')
+    os.makedirs(os.path.join(root, image_dir))
+    os.makedirs(os.path.join(root, label_dir))
+
+    state = []
+    for i in range(boxes):
+        x, y = rnd.randrange(0, size - 150), rnd.randrange(0, size - 150)
+        state.append(['person' if i == 0 else rnd.choice(TAGS), x, y, rnd.randrange(20, 140), rnd.randrange(20, 140)])
+
+    for frame in range(frames):
+        name = f'seq_{frame:04d}'
+        Image.new('RGB', (size, size), (frame % 256, 64, 128)).save(os.path.join(root, image_dir, name + '.png'))
+
+        for box in state:
+            box[1] = min(max(0, box[1] + rnd.randint(-3, 3)), size - box[3])
+            box[2] = min(max(0, box[2] + rnd.randint(-3, 3)), size - box[4])
+        event = rnd.random()
+        if event < 0.05 and len(state) > 1:
+            state.pop(rnd.randrange(1, len(state)))
+        elif event < 0.10:
+            state.append([rnd.choice(TAGS), rnd.randrange(0, size - 150), rnd.randrange(0, size - 150), 40, 40])
+        elif event < 0.15 and len(state) > 1:
+            state[rnd.randrange(1, len(state))][0] = rnd.choice(TAGS)
+
+        data = {
+            "file_name": name + '.png', "height": size, "width": size,
+            "gtboxes": [{"tag": tag, "box": [x, y, w, h]} for tag, x, y, w, h in state],
+            "hoi": [{"object_id": i, "interaction": "hold", "subject_id": 0} for i in range(1, len(state))],
+        }
+        with open(os.path.join(root, label_dir, name + '.txt'), 'w') as f:
+            json.dump(data, f)
+    return image_dir
+
+
+def legacy_show_document(tool, doc):
+    """Frame change as it was before: delete every item and row, then create them all again."""
+    tool.clear_all()
+    tool.doc = doc
+    for index, box in enumerate(doc.boxes):
+        color = COLORS[box.tag if box.tag == 'person' else 'object']
+        tmpId = tool.mainPanel.create_rectangle(*tool.to_canvas(*box.corners), width=2, outline=color)
+        tool.bboxIdList.append(tmpId)
+        tool.bboxIndex[tmpId] = index
+        tool.listbox.insert('end', f'[{index}][{box.tag}]')
+        tool.listbox.itemconfig(len(tool.bboxIdList) - 1, fg=color)
+    for conn in doc.hoi:
+        tool.connectionLines.append(
+            tool.mainPanel.create_line(*tool.connection_coords(doc, conn), fill="yellow", width=2)
+        )
+        tool.connectionListbox.insert('end', f"[{conn['subject_id']} - {conn['interaction']} - {conn['object_id']}]")
+
+
+def check(tool):
+    """The canvas items and listbox rows must describe tool.doc exactly."""
+    assert len(tool.bboxIdList) == len(tool.doc.boxes)
+    for index, box in enumerate(tool.doc.boxes):
+        assert tool.mainPanel.coords(tool.bboxIdList[index]) == tool.to_canvas(*box.corners)
+        assert tool.listbox.get(index) == f'[{index}][{box.tag}]'
+    assert tool.listbox.size() == len(tool.doc.boxes)
+    assert len(tool.connectionLines) == len(tool.doc.hoi) == tool.connectionListbox.size()
+
+
+def load(tool, image_dir):
+    """
+    loadDir without its messages (output dir, frame groups status); the frame groups are reported
+    from a background thread, which is waited for so nothing is printed into the results.
+    """
+    tool.entry.config(value=image_dir)
+    with contextlib.redirect_stdout(io.StringIO()):
+        tool.loadDir()
+        tool.groupsThread.join()
+
+
+def step(tool, frames, verify):
+    """Go through the sequence once, return the transition and the label update times per frame."""
+    show_document = tool.show_document
+    update_times = []
+
+    def timed(doc):
+        start = time.perf_counter()
+        show_document(doc)
+        update_times.append(time.perf_counter() - start)
+
+    tool.show_document = timed
+    transition_times = []
+    for _ in range(frames - 1):
+        start = time.perf_counter()
+        tool.nextImage()
+        transition_times.append(time.perf_counter() - start)
+        if verify:
+            check(tool)
+    del tool.show_document
+    return transition_times, update_times
+
+
+def summary(times):
+    times = sorted(times)
+    return {
+        "mean_ms": statistics.mean(times) * 1000,
+        "p50_ms": times[len(times) // 2] * 1000,
+        "p95_ms": times[int(len(times) * 0.95)] * 1000,
+    }
+
+
+def run(frames=200, boxes=50, size=512, real=True, verify=True):
+    root_dir = tempfile.mkdtemp(prefix='bench_transition_')
+    cwd = os.getcwd()
+    try:
+        image_dir = make_sequence(root_dir, frames, boxes, size)
+        os.chdir(root_dir)  # the tool derives the label dir from the relative Images/... path
+
+        results = {"frames": frames, "boxes": boxes, "size": size}
+        tool, root, is_real = make_tool(real)
+        load(tool, image_dir)
+        step(tool, frames, verify=False)
+        with contextlib.redirect_stdout(io.StringIO()):  # the cache statistics
+            tool.on_close()
+
+        for name in ('before', 'after'):
+            tool, root, is_real = make_tool(real)
+            if name == 'before':
+                tool.show_document = lambda doc: legacy_show_document(tool, doc)
+            load(tool, image_dir)
+            created = getattr(tool.mainPanel, 'created', None)
+            transition_times, update_times = step(tool, frames, verify)
+
+            results[name] = {"transition": summary(transition_times), "label_update": summary(update_times)}
+            if created is not None:
+                results[name]["canvas_items_created"] = tool.mainPanel.created - created
+            results["tk"] = "real" if is_real else "fake"
+            with contextlib.redirect_stdout(io.StringIO()):  # the cache statistics
+                tool.on_close()
+
+        results["speedup_label_update"] = (
+            results["before"]["label_update"]["mean_ms"] / results["after"]["label_update"]["mean_ms"]
+        )
+        results["speedup_transition"] = (
+            results["before"]["transition"]["mean_ms"] / results["after"]["transition"]["mean_ms"]
+        )
+        return results
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(root_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Frame transition benchmark")
+    parser.add_argument("--frames", type=int, default=200, help="Frames in the synthetic sequence")
+    parser.add_argument("--boxes", type=int, default=50, help="Boxes per frame (each object connected to the person)")
+    parser.add_argument("--size", type=int, default=512, help="Image width and height")
+    parser.add_argument("--fake-tk", action='store_true', help="Use the fake canvas even if a display is available")
+    parser.add_argument("--no-verify", action='store_true', help="Skip checking the canvas against the document")
+    args = parser.parse_args()
+    print(json.dumps(run(args.frames, args.boxes, args.size, real=not args.fake_tk, verify=not args.no_verify),
+                     indent=2))
@@ -0,0 +1,222 @@
+"""
+Minimal stand-ins for the Tk widgets used by LabelTool, so the tool can be driven without a display.
+
+The fake canvas keeps its items in a dict and counts created/deleted items; the fake root runs
+`after` callbacks from a timer queue whenever update() is called.
+"""
+import heapq
+import itertools
+import time
+import types
+from tkinter import TclError
+
+
+class FakeWidget():
+    def __init__(self, *args, **kwargs):
+        self.options = dict(kwargs)
+
+    def config(self, **kwargs):
+        self.options.update(kwargs)
+
+    configure = config
+
+    def get(self):
+        return self.options.get('value', '')
+
+    def set(self, value):
+        self.options['value'] = value
+
+    def __getattr__(self, name):
+        # pack/grid/bind/focus/... are no-ops
+        return lambda *args, **kwargs: None
+
+
+class FakeRoot(FakeWidget):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.timers = []
+        self.counter = itertools.count()
+
+    def after(self, ms, func=None, *args):
+        timer_id = f"after#{next(self.counter)}"
+        heapq.heappush(self.timers, (time.perf_counter() + ms / 1000, timer_id, func, args))
+        return timer_id
+
+    def after_idle(self, func, *args):
+        return self.after(0, func, *args)
+
+    def after_cancel(self, timer_id):
+        self.timers = [timer for timer in self.timers if timer[1] != timer_id]
+        heapq.heapify(self.timers)
+
+    def update(self):
+        now = time.perf_counter()
+        while self.timers and self.timers[0][0] <= now:
+            _, _, func, args = heapq.heappop(self.timers)
+            func(*args)
+
+    update_idletasks = update
+
+    def drain(self):
+        """Run all pending timers, waiting for the ones that are not due yet."""
+        while self.timers:
+            time.sleep(max(0.0, self.timers[0][0] - time.perf_counter()))
+            self.update()
+
+    def destroy(self):
+        self.timers = []
+
+
+class FakeCanvas(FakeWidget):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.items = {}
+        self.ids = itertools.count(1)
+        self.created = 0
+        self.deleted = 0
+        self.width, self.height = 1200, 900
+
+    def _create(self, kind, coords, options):
+        if len(coords) == 1:
+            coords = coords[0]
+        item = next(self.ids)
+        self.items[item] = {"type": kind, "coords": [float(c) for c in coords], "options": options}
+        self.created += 1
+        return item
+
+    def create_line(self, *coords, **options):
+        return self._create('line', coords, options)
+
+    def create_rectangle(self, *coords, **options):
+        return self._create('rectangle', coords, options)
+
+    def create_image(self, *coords, **options):
+        return self._create('image', coords, options)
+
+    def create_text(self, *coords, **options):
+        return self._create('text', coords, options)
+
+    def delete(self, *items):
+        for item in items:
+            if item == 'all':
+                self.deleted += len(self.items)
+                self.items.clear()
+            elif self.items.pop(item, None) is not None:
+                self.deleted += 1
+
+    def coords(self, item, *coords):
+        if coords:
+            if len(coords) == 1:
+                coords = coords[0]
+            self.items[item]["coords"] = [float(c) for c in coords]
+        return list(self.items[item]["coords"])
+
+    def move(self, item, dx, dy):
+        coords = self.items[item]["coords"]
+        self.items[item]["coords"] = [c + (dx if i % 2 == 0 else dy) for i, c in enumerate(coords)]
+
+    def scale(self, tag, x0, y0, fx, fy):
+        for entry in self.items.values():
+            coords = entry["coords"]
+            entry["coords"] = [
+                (x0 + (c - x0) * fx) if i % 2 == 0 else (y0 + (c - y0) * fy) for i, c in enumerate(coords)
+            ]
+
+    def itemconfig(self, item, **options):
+        self.items[item]["options"].update(options)
+
+    itemconfigure = itemconfig
+
+    def canvasx(self, x):
+        return float(x)
+
+    def canvasy(self, y):
+        return float(y)
+
+    def winfo_width(self):
+        return self.width
+
+    def winfo_height(self):
+        return self.height
+
+
+class FakeListbox(FakeWidget):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.rows = []
+        self.selection = ()
+
+    def insert(self, index, text):
+        if index == 'end':
+            self.rows.append(text)
+        else:
+            self.rows.insert(int(index), text)
+
+    def delete(self, first, last=None):
+        if last is None:
+            del self.rows[int(first)]
+        else:
+            last = len(self.rows) - 1 if last == 'end' else int(last)
+            del self.rows[int(first):last + 1]
+
+    def get(self, first, last=None):
+        if last is None:
+            return self.rows[int(first)]
+        last = len(self.rows) - 1 if last == 'end' else int(last)
+        return tuple(self.rows[int(first):last + 1])
+
+    def curselection(self):
+        return self.selection
+
+    def size(self):
+        return len(self.rows)
+
+
+class FakePhotoImage():
+    def __init__(self, image=None, **kwargs):
+        self.image = image
+
+    def width(self):
+        return self.image.width
+
+    def height(self):
+        return self.image.height
+
+
+def install(main_module):
+    """Replace the Tk widget classes imported by main.py with the fakes."""
+    main_module.Canvas = FakeCanvas
+    main_module.Listbox = FakeListbox
+    for name in ('Frame', 'Label', 'Button', 'Entry', 'Scrollbar', 'StringVar', 'Toplevel', 'Radiobutton'):
+        setattr(main_module, name, FakeWidget)
+    main_module.ttk = types.SimpleNamespace(OptionMenu=FakeWidget, Progressbar=FakeWidget)
+    main_module.ImageTk = types.SimpleNamespace(PhotoImage=FakePhotoImage)
+    # the filmstrip makes its own PhotoImages on the canvas it gets from main
+    import filmstrip
+    filmstrip.ImageTk = main_module.ImageTk
+
+
+def make_root(real=True):
+    """
+    Return (root, is_real). A real Tk root is used when a display is available.
+    :param real: Try a real Tk root first.
+    """
+    if real:
+        try:
+            from tkinter import Tk
+            root = Tk()
+            root.withdraw()
+            return root, True
+        except TclError:
+            pass
+    return FakeRoot(), False
+
+
+def make_tool(real=True):
+    """Create a LabelTool on a real or fake root. The fakes are installed when no display is available."""
+    import main
+
+    root, is_real = make_root(real)
+    if not is_real:
+        install(main)
+    return main.LabelTool(root), root, is_real
@@ -0,0 +1,276 @@
+"""
+Benchmark suite: runs every measurement on a synthetic dataset and writes the results as JSON.
+
+    python -m benchmarks.suite --output bench.json
+    python -m benchmarks.suite --frames 40 --size 2048 --compare bench.json
+
+Measured:
+- decode: full-resolution PNG decode and pyramid level creation (cold and from the disk cache)
+- labels: label JSON load (store read + parse) and save (serialize + write), files and SQLite store
+- transition: LabelTool.nextImage latency over the sequence (benchmarks.bench_transition)
+- motion: cursor redraws and time per redraw of mouseMove over a paced event stream (benchmarks.bench_motion)
+- convert: convert_2_odgt.export_dir throughput, in this process and on a process pool
+
+The dataset is generated from a fixed seed, so runs with the same arguments are comparable.
+--compare prints the metrics that got worse than a previous result file by more than --tolerance
+and exits with 1 if there are any.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import PIL
+from PIL import Image
+
+from annotation import AnnotationDocument
+from benchmarks import bench_motion, bench_transition
+from benchmarks.fake_tk import make_tool
+from convert_2_odgt import export_dir
+from label_store import FileLabelStore, SqliteLabelStore
+from prefetch import decode_image
+from pyramid import ImagePyramid
+
+TAGS = ['cup', 'bottle', 'laptop', 'book', 'cell phone']
+
+# metrics where larger is better; for all others (times) smaller is better
+HIGHER_IS_BETTER = ('per_sec',)
+
+
+def make_image(rnd, size):
+    """A smooth random texture, so PNG sizes and decode times are closer to camera frames than flat colors."""
+    noise = rnd.integers(0, 255, (size // 16 + 1, size // 16 + 1, 3), dtype=np.uint8)
+    return Image.fromarray(noise).resize((size, size), Image.BILINEAR)
+
+
+def make_label(rnd, file_name, size, boxes):
+    gtboxes = []
+    for i in range(boxes):
+        x, y = int(rnd.integers(0, size - 200)), int(rnd.integers(0, size - 200))
+        gtboxes.append({"tag": 'person' if i == 0 else TAGS[int(rnd.integers(len(TAGS)))],
+                        "box": [x, y, int(rnd.integers(20, 200)), int(rnd.integers(20, 200))]})
+    hoi = [{"object_id": i, "interaction": "hold", "subject_id": 0} for i in range(1, boxes)]
+    return {"file_name": file_name, "height": size, "width": size, "gtboxes": gtboxes, "hoi": hoi}
+
+
+def make_dataset(root, frames, size, boxes, label_files, seed=0):
+    """
+    Images/synthetic/*.png with labels in Labels/synthetic, plus `label_files` extra label files
+    in Labels/convert for the export benchmark.
+    """
+    rnd = np.random.default_rng(seed)
+    for sub in ('Images/synthetic', 'Labels/synthetic', 'Labels/convert'):
+        os.makedirs(os.path.join(root, sub))
+    for frame in range(frames):
+        name = f'synthetic_{frame:04d}'
+        make_image(rnd, size).save(os.path.join(root, 'Images/synthetic', name + '.png'), compress_level=1)
+        with open(os.path.join(root, 'Labels/synthetic', name + '.txt'), 'w') as f:
+            json.dump(make_label(rnd, name + '.png', size, boxes), f)
+    for i in range(label_files):
+        name = f'convert_{i:06d}'
+        with open(os.path.join(root, 'Labels/convert', name + '.txt'), 'w') as f:
+            json.dump(make_label(rnd, name + '.png', size, boxes), f)
+
+
+def summary(times):
+    """mean / p50 / p95 / max in milliseconds."""
+    times = sorted(times)
+    return {
+        "mean_ms": statistics.mean(times) * 1000,
+        "p50_ms": times[len(times) // 2] * 1000,
+        "p95_ms": times[min(len(times) - 1, int(len(times) * 0.95))] * 1000,
+        "max_ms": times[-1] * 1000,
+    }
+
+
+def timed(func, items):
+    times = []
+    for item in items:
+        start = time.perf_counter()
+        func(item)
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def bench_decode(root):
+    paths = sorted(os.path.join(root, 'Images/synthetic', name) for name in os.listdir(os.path.join(root, 'Images/synthetic')))
+    cache_dir = os.path.join(root, 'decode_cache')
+    return {
+        "decode_full": summary(timed(decode_image, paths)),
+        "pyramid_level1_cold": summary(timed(lambda path: ImagePyramid(path, cache_dir).level(1), paths)),
+        "pyramid_level1_cached": summary(timed(lambda path: ImagePyramid(path, cache_dir).level(1), paths)),
+    }
+
+
+def bench_labels(root, repeat=5):
+    labels_dir = os.path.join(root, 'Labels/synthetic')
+    results = {}
+    for kind in ('files', 'sqlite'):
+        if kind == 'files':
+            store = FileLabelStore(labels_dir)
+        else:
+            store = SqliteLabelStore(os.path.join(root, 'bench.sqlite'))
+            store.save_many((name, FileLabelStore(labels_dir).load_json(name)) for name in FileLabelStore(labels_dir).names())
+        names = store.names() * repeat
+        docs = {}
+
+        def load(name):
+            docs[name] = AnnotationDocument.from_json(json.loads(store.load_json(name)))
+
+        def save(name):
+            store.save_json(name, json.dumps(docs[name].to_json()))
+
+        results[kind] = {"load": summary(timed(load, names)), "save": summary(timed(save, names))}
+        store.close()
+    return results
+
+
+def bench_transition_latency(root, real):
+    cwd = os.getcwd()
+    os.chdir(root)  # the tool derives the label dir from the relative Images/... path
+    try:
+        tool, tk_root, is_real = make_tool(real)
+        frames = len(os.listdir('Images/synthetic'))
+        bench_transition.load(tool, os.path.join('Images', 'synthetic'))
+        transition_times, update_times = bench_transition.step(tool, frames, verify=False)
+        with contextlib.redirect_stdout(io.StringIO()):  # the cache statistics
+            tool.on_close()
+    finally:
+        os.chdir(cwd)
+    return {"transition": summary(transition_times), "label_update": summary(update_times),
+            "tk": "real" if is_real else "fake"}
+
+
+def bench_motion_updates(events, boxes, real):
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = bench_motion.run(events, boxes, real=real)
+    after = result["after"]
+    return {"update": after["update"], "update_seconds": after["update_seconds"], "redraws": after["redraws"],
+            "tk": result["tk"]}
+
+
+def bench_convert(root, workers):
+    labels_dir = os.path.join(root, 'Labels/convert')
+    odgt = os.path.join(root, 'convert.odgt')
+    files = len(os.listdir(labels_dir))
+    results = {}
+    for name, pool_size in (('serial', 0), ('pool', workers)):
+        executor = ProcessPoolExecutor(max_workers=pool_size) if pool_size > 0 else None
+        try:
+            start = time.perf_counter()
+            export_dir(labels_dir, odgt, executor)
+            elapsed = time.perf_counter() - start
+        finally:
+            if executor is not None:
+                executor.shutdown()
+        results[name] = {
+            "seconds": elapsed,
+            "files_per_sec": files / elapsed,
+            "mb_per_sec": os.path.getsize(odgt) / elapsed / 1e6,
+        }
+    return results
+
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        commit = ''
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "numpy": np.__version__,
+        "pillow": PIL.__version__,
+        "commit": commit,
+        "time": time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+
+
+def run(frames=20, size=2048, boxes=30, label_files=2000, events=5000, workers=None, real=True, keep=''):
+    root = keep or tempfile.mkdtemp(prefix='bench_suite_')
+    try:
+        if not os.path.exists(os.path.join(root, 'Images/synthetic')):
+            make_dataset(root, frames, size, boxes, label_files)
+        results = {
+            "params": {"frames": frames, "size": size, "boxes": boxes, "label_files": label_files, "events": events},
+            "environment": environment(),
+            "decode": bench_decode(root),
+            "labels": bench_labels(root),
+            "transition": bench_transition_latency(root, real),
+            "motion": bench_motion_updates(events, boxes, real),
+            "convert": bench_convert(root, workers or os.cpu_count()),
+        }
+    finally:
+        if not keep:
+            shutil.rmtree(root, ignore_errors=True)
+    return results
+
+
+def flatten(results, prefix=''):
+    """{'a': {'b': 1}} -> {'a.b': 1} for the numeric leaves."""
+    flat = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[prefix + key] = value
+    return flat
+
+
+def compare(results, baseline, tolerance):
+    """Metrics that are worse than in `baseline` by more than `tolerance` (relative)."""
+    current, previous = flatten(results), flatten(baseline)
+    regressions = []
+    for key, value in current.items():
+        # single worst samples are too noisy to compare
+        if key.startswith(('params.', 'environment.')) or key.endswith('max_ms') or not previous.get(key):
+            continue
+        higher_is_better = key.endswith(HIGHER_IS_BETTER)
+        if key.endswith('_ms') or key.endswith('seconds') or higher_is_better:
+            change = (value - previous[key]) / previous[key]
+            if (-change if higher_is_better else change) > tolerance:
+                regressions.append((key, previous[key], value, change))
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark suite")
+    parser.add_argument("--frames", type=int, default=20, help="Images in the synthetic sequence")
+    parser.add_argument("--size", type=int, default=2048, help="Image width and height")
+    parser.add_argument("--boxes", type=int, default=30, help="Boxes per frame")
+    parser.add_argument("--label-files", type=int, default=2000, help="Label files for the convert benchmark")
+    parser.add_argument("--events", type=int, default=5000, help="Motion events (1 ms apart)")
+    parser.add_argument("--workers", type=int, default=0, help="Processes for the convert benchmark (default: CPUs)")
+    parser.add_argument("--fake-tk", action='store_true', help="Use the fake canvas even if a display is available")
+    parser.add_argument("--keep", type=str, default='', help="Generate the dataset in / reuse it from this directory")
+    parser.add_argument("--output", type=str, default='', help="Write the results to this JSON file")
+    parser.add_argument("--compare", type=str, default='', help="Previous results to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative slowdown for --compare")
+    args = parser.parse_args()
+
+    results = run(args.frames, args.size, args.boxes, args.label_files, args.events, args.workers,
+                  real=not args.fake_tk, keep=args.keep)
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    print(text)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for key, before, after, change in regressions:
+            print(f"REGRESSION {key}: {before:.3f} -> {after:.3f} ({change:+.0%})", file=sys.stderr)
+        sys.exit(1 if regressions else 0)
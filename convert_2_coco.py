@@ -0,0 +1,320 @@
+"""
+Export label directories to one COCO-style JSON file with HICO-DET style HOI triplets, and import it back.
+
+    python convert_2_coco.py export Labels.coco.json                  # every camera folder under Labels/1fps, Labels/2fps and Labels/hico
+    python convert_2_coco.py export hico.coco.json Labels/hico
+    python convert_2_coco.py import hico.coco.json --labels-root Labels
+
+The export has the usual COCO sections plus the interactions:
+
+    images:          {"id", "file_name", "width", "height", "folder"}      (folder: camera folder relative to the labels root)
+    annotations:     {"id", "image_id", "category_id", "bbox": [x, y, w, h], "area", "iscrowd"}
+    hoi_annotations: {"id", "image_id", "subject_id", "object_id", "category_id"}   (subject/object: annotation ids)
+    categories:      person and label_options.OBJECT_OPTIONS, then other tags found in the files
+    hoi_categories:  label_options.CONNECTION_OPTIONS, then other interactions found in the files
+
+Label files of all folders are read on a process pool in chunks and written as they arrive: images go
+straight to the output, annotations and interactions to temporary files that are appended at the end,
+so memory stays flat however large the tree is. Import writes every image of the file back as a label
+file in <labels root>/<folder>; it only reads files in the layout above (every image needs its
+"folder", interactions need "hoi_categories"), not COCO files from other tools.
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from convert_2_odgt import find_label_dirs, list_label_files
+from image_catalog import label_name
+from label_options import CONNECTION_OPTIONS, OBJECT_OPTIONS
+from label_store import FileLabelStore
+
+
+class JsonArrayWriter():
+    """Writes a JSON array to a text file one item at a time, an item per line."""
+
+    def __init__(self, file):
+        self.file = file
+        self.count = 0
+        file.write('[')
+
+    def write(self, item):
+        self.file.write(',\n' if self.count else '\n')
+        self.file.write(json.dumps(item, separators=(',', ':')))
+        self.count += 1
+
+    def close(self):
+        self.file.write('\n]' if self.count else ']')
+
+
+class JsonObjectWriter():
+    """Writes a JSON object to a text file one member at a time; arrays can be streamed into it."""
+
+    def __init__(self, file):
+        self.file = file
+        self.members = 0
+        file.write('{')
+
+    def key(self, key):
+        self.file.write(',\n' if self.members else '\n')
+        self.file.write(json.dumps(key) + ': ')
+        self.members += 1
+
+    def value(self, key, value):
+        self.key(key)
+        self.file.write(json.dumps(value))
+
+    def array(self, key):
+        """A JsonArrayWriter for the member; it must be closed before the next member is written."""
+        self.key(key)
+        return JsonArrayWriter(self.file)
+
+    def copy(self, key, src):
+        """A member whose JSON text is the content of the file object `src`."""
+        self.key(key)
+        shutil.copyfileobj(src, self.file)
+
+    def close(self):
+        self.file.write('\n}\n')
+
+
+class Categories():
+    """Category ids by name: the known names first, others get the next ids as they are seen."""
+
+    def __init__(self, names, supercategory=None):
+        self.ids = {}
+        self.supercategory = supercategory
+        for name in names:
+            self.id(name)
+
+    def id(self, name):
+        if name not in self.ids:
+            self.ids[name] = len(self.ids) + 1
+        return self.ids[name]
+
+    def to_json(self):
+        categories = []
+        for name, category_id in self.ids.items():
+            category = {"id": category_id, "name": name}
+            if self.supercategory is not None:
+                category["supercategory"] = self.supercategory(name)
+            categories.append(category)
+        return categories
+
+
+def read_label_file(txt_file):
+    """
+    The parts of a label file the export needs.
+    :return: (file_name, width, height, [(tag, x, y, w, h)], [(subject, object, interaction)], error)
+    """
+    try:
+        with open(txt_file, 'r') as file:
+            data = json.load(file)
+        boxes = [(gtbox["tag"], *map(int, gtbox["box"])) for gtbox in data["gtboxes"]]
+        hoi = [(int(conn["subject_id"]), int(conn["object_id"]), conn["interaction"]) for conn in data["hoi"]]
+        return data["file_name"], int(data["width"]), int(data["height"]), boxes, hoi, None
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        return None, 0, 0, [], [], f"{txt_file}: {e!r}"
+
+
+def read_chunk(txt_files):
+    return [read_label_file(txt_file) for txt_file in txt_files]
+
+
+def iter_label_files(jobs, executor=None, chunksize=64, max_pending=16):
+    """
+    Yield (folder, record) for the label files of every (folder, label dir) job, in order.
+    With an executor, chunks of any folder are read in parallel with at most `max_pending` chunks in flight.
+    """
+    chunks = ((folder, txt_files[i:i + chunksize])
+              for folder, labels_dir in jobs
+              for txt_files in [list_label_files(labels_dir)]
+              for i in range(0, len(txt_files), chunksize))
+    if executor is None:
+        for folder, chunk in chunks:
+            for record in read_chunk(chunk):
+                yield folder, record
+        return
+
+    pending = deque()
+    for folder, chunk in chunks:
+        pending.append((folder, executor.submit(read_chunk, chunk)))
+        if len(pending) >= max_pending:
+            folder, future = pending.popleft()
+            for record in future.result():
+                yield folder, record
+    while pending:
+        folder, future = pending.popleft()
+        for record in future.result():
+            yield folder, record
+
+
+def export_coco(label_dirs, json_path, labels_root='Labels', executor=None, chunksize=64):
+    """
+    Stream all label files of `label_dirs` into one COCO-style JSON file (written atomically).
+    :return: (counts dict, list of errors)
+    """
+    categories = Categories(['person'] + OBJECT_OPTIONS, lambda name: 'person' if name == 'person' else 'object')
+    hoi_categories = Categories(CONNECTION_OPTIONS)
+    jobs = [(os.path.relpath(labels_dir, labels_root).replace(os.sep, '/'), labels_dir) for labels_dir in label_dirs]
+    errors = []
+    image_id = annotation_id = hoi_id = 0
+
+    tmp_path = json_path + '.tmp'
+    with open(tmp_path, 'w') as file, \
+            tempfile.TemporaryFile('w+') as annotations_file, tempfile.TemporaryFile('w+') as hoi_file:
+        out = JsonObjectWriter(file)
+        out.value("info", {"description": "HOI labels exported by convert_2_coco.py",
+                           "folders": [folder for folder, _ in jobs]})
+        images = out.array("images")
+        annotations = JsonArrayWriter(annotations_file)
+        hoi_annotations = JsonArrayWriter(hoi_file)
+
+        for folder, (file_name, width, height, boxes, hoi, error) in iter_label_files(jobs, executor, chunksize):
+            if error is not None:
+                errors.append(error)
+                continue
+            image_id += 1
+            images.write({"id": image_id, "file_name": file_name, "width": width, "height": height, "folder": folder})
+            first_id = annotation_id + 1
+            for tag, x, y, w, h in boxes:
+                annotation_id += 1
+                annotations.write({"id": annotation_id, "image_id": image_id, "category_id": categories.id(tag),
+                                   "bbox": [x, y, w, h], "area": w * h, "iscrowd": 0})
+            for subject, obj, interaction in hoi:
+                if not (0 <= subject < len(boxes) and 0 <= obj < len(boxes)):
+                    errors.append(f"{folder}/{file_name}: hoi {subject} - {interaction} - {obj} "
+                                  f"with {len(boxes)} boxes, skipped")
+                    continue
+                hoi_id += 1
+                hoi_annotations.write({"id": hoi_id, "image_id": image_id, "subject_id": first_id + subject,
+                                       "object_id": first_id + obj, "category_id": hoi_categories.id(interaction)})
+
+        images.close()
+        annotations.close()
+        hoi_annotations.close()
+        annotations_file.seek(0)
+        out.copy("annotations", annotations_file)
+        hoi_file.seek(0)
+        out.copy("hoi_annotations", hoi_file)
+        # last, so tags and interactions outside the tool's lists get ids as they are found
+        out.value("categories", categories.to_json())
+        out.value("hoi_categories", hoi_categories.to_json())
+        out.close()
+    os.replace(tmp_path, json_path)
+    return {"images": image_id, "annotations": annotation_id, "hoi_annotations": hoi_id}, errors
+
+
+def read_coco(json_path, folders=None):
+    """
+    The images of a file written by export_coco with their gtboxes and hoi in the label file format.
+    :raises ValueError: If the file is not in that layout, e.g. a COCO file without "folder" per image.
+    :return: List of (image, gtboxes, hoi).
+    """
+    with open(json_path, 'r') as file:
+        data = json.load(file)
+    if not isinstance(data, dict):
+        raise ValueError(f"{json_path}: not a COCO-style JSON object")
+    missing = [key for key in ("images", "annotations", "categories") if key not in data]
+    if data.get("hoi_annotations") and "hoi_categories" not in data:
+        missing.append("hoi_categories")
+    if missing:
+        raise ValueError(f"{json_path}: no {', '.join(missing)}; only files written by convert_2_coco.py export "
+                         f"can be imported")
+
+    try:
+        tags = {category["id"]: category["name"] for category in data["categories"]}
+        interactions = {category["id"]: category["name"] for category in data.get("hoi_categories", [])}
+        records = {}
+        for image in data["images"]:
+            if "folder" not in image:
+                raise ValueError(f"{json_path}: image {image.get('id')} has no \"folder\"; only files written by "
+                                 f"convert_2_coco.py export can be imported")
+            if folders is None or image["folder"] in folders:
+                records[image["id"]] = (image, [], [])
+        index = {}  # annotation id -> position in its image's gtboxes
+        for annotation in data["annotations"]:
+            record = records.get(annotation["image_id"])
+            if record is not None:
+                index[annotation["id"]] = len(record[1])
+                record[1].append({"tag": tags[annotation["category_id"]], "box": annotation["bbox"]})
+        for conn in data.get("hoi_annotations", []):
+            record = records.get(conn["image_id"])
+            if record is not None:
+                record[2].append({"object_id": index[conn["object_id"]],
+                                  "interaction": interactions[conn["category_id"]],
+                                  "subject_id": index[conn["subject_id"]]})
+    except (KeyError, TypeError) as e:
+        raise ValueError(f"{json_path}: missing or unknown {e} in an image, annotation or category")
+    return list(records.values())
+
+
+def import_coco(json_path, labels_root='Labels', folders=None):
+    """
+    Write the images of a COCO-style export back as label files in <labels_root>/<folder>.
+    :param folders: Only import these folders (e.g. ['hico']), default all.
+    :raises ValueError: If the file was not written by export_coco (see read_coco).
+    :return: Number of label files written per folder.
+    """
+    written = {}
+    stores = {}
+    for image, gtboxes, hoi in read_coco(json_path, folders):
+        folder = image["folder"]
+        if folder not in stores:
+            out_dir = os.path.join(labels_root, *folder.split('/'))
+            os.makedirs(out_dir, exist_ok=True)
+            stores[folder] = FileLabelStore(out_dir)
+        label = {"file_name": image["file_name"], "height": image["height"], "width": image["width"],
+                 "gtboxes": gtboxes, "hoi": hoi}
+        stores[folder].save_json(label_name(image["file_name"]), json.dumps(label))
+        written[folder] = written.get(folder, 0) + 1
+    return written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert label directories to and from COCO-style JSON")
+    sub = parser.add_subparsers(dest="command", required=True)
+    export = sub.add_parser("export", help="Label directories -> one COCO-style JSON file")
+    export.add_argument("json_path")
+    export.add_argument("labels_dir", nargs='*', help="Label directories (default: all camera folders)")
+    export.add_argument("--workers", type=int, default=os.cpu_count(), help="Worker processes (0 = read in this process)")
+    export.add_argument("--chunksize", type=int, default=64, help="Label files per worker task")
+    imp = sub.add_parser("import", help="COCO-style JSON file written by export -> label directories",
+                         description="Write a file made by 'convert_2_coco.py export' back as label files. Other "
+                                     "COCO files are rejected: every image needs the \"folder\" of its camera and "
+                                     "interactions need \"hoi_categories\".")
+    imp.add_argument("json_path")
+    imp.add_argument("--folder", action='append', help="Only import this folder (e.g. hico), can be repeated")
+    for command in (export, imp):
+        command.add_argument("--labels-root", type=str, default='Labels', help="Root of the camera folders")
+    args = parser.parse_args(argv)
+
+    if args.command == 'import':
+        try:
+            written = import_coco(args.json_path, args.labels_root, args.folder)
+        except (OSError, ValueError) as e:
+            print(f"Could not import {args.json_path}: {e}", file=sys.stderr)
+            return 1
+        for folder, count in written.items():
+            print(f"{args.json_path} -> {os.path.join(args.labels_root, folder)}: {count} label files")
+        return 0
+
+    label_dirs = args.labels_dir or find_label_dirs(args.labels_root)
+    executor = ProcessPoolExecutor(max_workers=args.workers) if args.workers > 0 else None
+    try:
+        counts, errors = export_coco(label_dirs, args.json_path, args.labels_root, executor, args.chunksize)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    print(f"{len(label_dirs)} folders -> {args.json_path}: " + ", ".join(f"{n} {key}" for key, n in counts.items()))
+    for error in errors:
+        print(f"  invalid: {error}", file=sys.stderr)
+    return 1 if errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,20 +1,340 @@
-import os
+"""
+Export label directories to .odgt files (one JSON record per line).
+
+    python convert_2_odgt.py                                   # every camera folder under Labels/1fps, Labels/2fps and Labels/hico
+    python convert_2_odgt.py Labels/2fps/reolink_overhead      # -> Labels/2fps/reolink_overhead.odgt
+    python convert_2_odgt.py --incremental                     # only re-read label files that changed
+
+The .odgt of a camera folder is written next to it (Labels/<group>/<camera>.odgt), since the same
+camera can appear in several groups (Labels/1fps/hanwha_QNF-8010_overhead and
+Labels/2fps/hanwha_QNF-8010_overhead). Exports of the earlier layout, Labels/<camera>.odgt, are
+not updated; main() points them out.
+
+Label files are read and validated on a process pool and the records are streamed to the
+output in file name order, so memory stays bounded by the number of chunks in flight.
+
+Every export also writes <odgt>.manifest.json with (file name, size, mtime, record hash, byte offset,
+length) per label file. The incremental mode uses it to re-read only changed files and to copy all
+other records from the previous .odgt; the result is byte-identical to a full rebuild.
+The sidecar index <odgt>.idx.json (record file_name -> offset/length) for odgt_index.OdgtReader is
+written along with it.
+"""
+import argparse
 import glob
+import hashlib
+import json
+import os
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from odgt_index import save_index
+
+LABEL_GROUPS = ('1fps', '2fps', 'hico')
+MANIFEST_VERSION = 2
+
+
+def find_label_dirs(labels_root='Labels', groups=LABEL_GROUPS):
+    """
+    Camera folders under `labels_root`: every sub directory of a group, or the group itself
+    if it holds label files directly (e.g. Labels/hico).
+    """
+    label_dirs = []
+    for group in groups:
+        group_dir = os.path.join(labels_root, group)
+        if not os.path.isdir(group_dir):
+            continue
+        if glob.glob(os.path.join(group_dir, '*.txt')):
+            label_dirs.append(group_dir)
+        for entry in sorted(os.scandir(group_dir), key=lambda e: e.name):
+            if entry.is_dir():
+                label_dirs.append(entry.path)
+    return label_dirs
+
+
+def default_odgt_path(labels_dir):
+    """Labels/2fps/reolink_overhead -> Labels/2fps/reolink_overhead.odgt"""
+    return os.path.normpath(labels_dir) + '.odgt'
+
+
+def legacy_odgt_path(labels_dir, labels_root='Labels'):
+    """Labels/2fps/reolink_overhead -> Labels/reolink_overhead.odgt, where exports used to be written."""
+    return os.path.join(labels_root, os.path.basename(os.path.normpath(labels_dir)) + '.odgt')
+
+
+def list_label_files(labels_dir):
+    txt_files = glob.glob(os.path.join(labels_dir, "*.txt"))
+    txt_files.sort()
+    return txt_files
+
+
+def read_record(txt_file):
+    """
+    Read one label file and return it as a single .odgt line.
+    :return: (line, file_name, error) - line is None if the file is not a valid JSON object.
+    """
+    try:
+        with open(txt_file, 'r') as file:
+            anno = file.read().strip()
+        data = json.loads(anno)
+    except (OSError, ValueError) as e:
+        return None, None, f"{txt_file}: {e}"
+    if not isinstance(data, dict):
+        return None, None, f"{txt_file}: not a JSON object"
+    if '\n' in anno:
+        # pretty-printed file, re-serialize it onto one line
+        anno = json.dumps(data)
+    return anno, data.get("file_name", ''), None
+
+
+def read_chunk(txt_files):
+    return [read_record(txt_file) for txt_file in txt_files]
+
+
+def iter_records(txt_files, executor=None, chunksize=64, max_pending=8):
+    """
+    Yield (line, file_name, error) for every file, in order.
+    With an executor, chunks of files are parsed in parallel with at most `max_pending` chunks in flight.
+    """
+    chunks = (txt_files[i:i + chunksize] for i in range(0, len(txt_files), chunksize))
+    if executor is None:
+        for chunk in chunks:
+            yield from read_chunk(chunk)
+        return
+
+    pending = deque()
+    for chunk in chunks:
+        pending.append(executor.submit(read_chunk, chunk))
+        if len(pending) >= max_pending:
+            yield from pending.popleft().result()
+    while pending:
+        yield from pending.popleft().result()
+
+
+def manifest_path(odgt_file_path):
+    return odgt_file_path + '.manifest.json'
+
+
+def load_manifest(odgt_file_path):
+    """Manifest entries by label file name, or None if there is no usable manifest for the .odgt."""
+    try:
+        with open(manifest_path(odgt_file_path), 'r') as file:
+            manifest = json.load(file)
+        odgt_size = os.path.getsize(odgt_file_path)
+    except (OSError, ValueError):
+        return None
+    if manifest.get("version") != MANIFEST_VERSION:
+        return None
+    entries = [dict(zip(manifest["fields"], row)) for row in manifest["entries"]]
+    if sum(entry["length"] for entry in entries) != odgt_size:
+        return None
+    return {entry["name"]: entry for entry in entries}
+
+
+def save_manifest(odgt_file_path, labels_dir, entries):
+    fields = ["name", "size", "mtime_ns", "sha1", "offset", "length", "file_name"]
+    manifest = {
+        "version": MANIFEST_VERSION,
+        "labels_dir": labels_dir,
+        "fields": fields,
+        "entries": [[entry[field] for field in fields] for entry in entries],
+    }
+    tmp_path = manifest_path(odgt_file_path) + '.tmp'
+    with open(tmp_path, 'w') as file:
+        json.dump(manifest, file)
+    os.replace(tmp_path, manifest_path(odgt_file_path))
+
+
+def stat_entry(txt_file):
+    st = os.stat(txt_file)
+    return {"name": os.path.basename(txt_file), "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+def record_entry(entry, data, offset, file_name=None):
+    """Complete a manifest entry with the hash, offset and length of the encoded record (b'' if invalid)."""
+    entry["sha1"] = hashlib.sha1(data).hexdigest() if data else None
+    entry["offset"] = offset
+    entry["length"] = len(data)
+    entry["file_name"] = file_name
+    return entry
+
+
+def index_records(entries):
+    return [(entry["file_name"], entry["offset"], entry["length"]) for entry in entries if entry["length"]]
+
+
+def export_dir(labels_dir, odgt_file_path, executor=None, chunksize=64):
+    """
+    Stream all label files of `labels_dir` into `odgt_file_path` (written atomically) and write its manifest.
+    :return: (number of records written, list of errors)
+    """
+    txt_files = list_label_files(labels_dir)
+    # stat before reading: a file modified during the export looks changed on the next incremental run
+    entries = [stat_entry(txt_file) for txt_file in txt_files]
+    errors = []
+    count = 0
+    offset = 0
+
+    tmp_path = odgt_file_path + '.tmp'
+    with open(tmp_path, 'wb') as file:
+        for entry, (line, file_name, error) in zip(entries, iter_records(txt_files, executor, chunksize)):
+            if error is not None:
+                errors.append(error)
+                record_entry(entry, b'', offset)
+                continue
+            data = (line + '\n').encode()
+            file.write(data)
+            record_entry(entry, data, offset, file_name)
+            offset += len(data)
+            count += 1
+    os.replace(tmp_path, odgt_file_path)
+    save_manifest(odgt_file_path, labels_dir, entries)
+    save_index(odgt_file_path, index_records(entries))
+    return count, errors
+
+
+def export_dir_incremental(labels_dir, odgt_file_path, executor=None, chunksize=64):
+    """
+    Update `odgt_file_path` re-reading only label files whose size or mtime changed since the last export.
+
+    Unchanged records are copied from the previous .odgt using the manifest offsets. If nothing after the
+    first change can be reused, the file is truncated and appended to in place; otherwise the new file is
+    spliced together from old byte ranges and new records.
+    :return: (number of records, number of label files re-read, list of errors)
+    """
+    old = load_manifest(odgt_file_path)
+    if old is None:
+        count, errors = export_dir(labels_dir, odgt_file_path, executor, chunksize)
+        return count, count + len(errors), errors
+
+    txt_files = list_label_files(labels_dir)
+    entries = [stat_entry(txt_file) for txt_file in txt_files]
+
+    # which files have to be read again
+    changed = []
+    for i, entry in enumerate(entries):
+        prev = old.get(entry["name"])
+        if prev is None or prev["sha1"] is None or prev["size"] != entry["size"] or prev["mtime_ns"] != entry["mtime_ns"]:
+            changed.append(i)
+
+    new_data = {}  # index -> (encoded record (b'' if invalid), record file_name)
+    errors = []
+    for i, (line, file_name, error) in zip(changed, iter_records([txt_files[i] for i in changed], executor, chunksize)):
+        if error is not None:
+            errors.append(error)
+            new_data[i] = (b'', None)
+            continue
+        data = (line + '\n').encode()
+        prev = old.get(entries[i]["name"])
+        if prev is not None and prev["sha1"] == hashlib.sha1(data).hexdigest():
+            continue  # touched but identical, keep copying it from the old file
+        new_data[i] = (data, file_name)
+
+    # plan: every output record is either a byte range of the old file or new data
+    plan = []
+    offset = 0
+    for i, entry in enumerate(entries):
+        if i in new_data:
+            data, file_name = new_data[i]
+            record_entry(entry, data, offset, file_name)
+            plan.append(data)
+        else:
+            prev = old[entry["name"]]
+            entry.update(sha1=prev["sha1"], offset=offset, length=prev["length"], file_name=prev["file_name"])
+            plan.append((prev["offset"], prev["length"]))
+        offset += entry["length"]
+
+    # records that are already in place at the start of the file
+    keep = 0
+    while keep < len(plan) and isinstance(plan[keep], tuple) and plan[keep][0] == entries[keep]["offset"]:
+        keep += 1
+    old_size = sum(prev["length"] for prev in old.values())
+
+    if keep == len(plan) and offset == old_size:
+        pass  # nothing changed
+    elif all(not isinstance(item, tuple) for item in plan[keep:]):
+        # only new records after the kept prefix: truncate and append
+        with open(odgt_file_path, 'r+b') as file:
+            file.truncate(entries[keep]["offset"] if keep < len(entries) else offset)
+            file.seek(0, os.SEEK_END)
+            for data in plan[keep:]:
+                file.write(data)
+    else:
+        tmp_path = odgt_file_path + '.tmp'
+        with open(odgt_file_path, 'rb') as src, open(tmp_path, 'wb') as dst:
+            run = None  # pending contiguous old byte range (start, end)
+            for item in plan:
+                if isinstance(item, tuple):
+                    start, length = item
+                    if run is not None and run[1] == start:
+                        run = (run[0], start + length)
+                        continue
+                    if run is not None:
+                        copy_range(src, dst, *run)
+                    run = (start, start + length)
+                else:
+                    if run is not None:
+                        copy_range(src, dst, *run)
+                        run = None
+                    dst.write(item)
+            if run is not None:
+                copy_range(src, dst, *run)
+        os.replace(tmp_path, odgt_file_path)
+
+    save_manifest(odgt_file_path, labels_dir, entries)
+    save_index(odgt_file_path, index_records(entries))
+    count = sum(1 for entry in entries if entry["length"])
+    return count, len(changed), errors
+
+
+def copy_range(src, dst, start, end):
+    src.seek(start)
+    remaining = end - start
+    while remaining > 0:
+        chunk = src.read(min(remaining, 1 << 20))
+        if not chunk:
+            break
+        dst.write(chunk)
+        remaining -= len(chunk)
 
-labels_dir_path = 'Labels/2fps/hanwha_QNF-8010_wallmount'
-odgt_file_path = 'Labels/hanwha_QNF-8010_wallmount.odgt'
 
-txt_files = glob.glob(os.path.join(labels_dir_path, "*.txt"))
-txt_files.sort()
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export label directories to .odgt files")
+    parser.add_argument("labels_dir", nargs='?', default='', help="Single label directory to export (default: all camera folders)")
+    parser.add_argument("odgt_file", nargs='?', default='', help="Output file for a single directory (default: <labels_dir>.odgt)")
+    parser.add_argument("--labels-root", type=str, default='Labels', help="Root searched for camera folders")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Worker processes (0 = read in this process)")
+    parser.add_argument("--chunksize", type=int, default=64, help="Label files per worker task")
+    parser.add_argument("--incremental", action='store_true', help="Only re-read label files changed since the last export")
+    args = parser.parse_args(argv)
 
-annotations = []
-for txt_file in txt_files:
-    with open (txt_file, 'r') as file:
-        anno = file.read()
-        annotations.append(anno)
+    if args.labels_dir:
+        jobs = [(args.labels_dir, args.odgt_file or default_odgt_path(args.labels_dir))]
+    else:
+        jobs = [(labels_dir, default_odgt_path(labels_dir)) for labels_dir in find_label_dirs(args.labels_root)]
 
+    executor = ProcessPoolExecutor(max_workers=args.workers) if args.workers > 0 else None
+    failed = False
+    try:
+        for labels_dir, odgt_file_path in jobs:
+            legacy_path = legacy_odgt_path(labels_dir, args.labels_root)
+            if odgt_file_path == default_odgt_path(labels_dir) and os.path.exists(legacy_path):
+                print(f"note: {legacy_path} is an export of the old layout and is not updated, "
+                      f"{labels_dir} is exported to {odgt_file_path}", file=sys.stderr)
+            if args.incremental:
+                count, read, errors = export_dir_incremental(labels_dir, odgt_file_path, executor, args.chunksize)
+                print(f"{labels_dir} -> {odgt_file_path}: {count} records ({read} re-read)")
+            else:
+                count, errors = export_dir(labels_dir, odgt_file_path, executor, args.chunksize)
+                print(f"{labels_dir} -> {odgt_file_path}: {count} records")
+            for error in errors:
+                print(f"  invalid: {error}", file=sys.stderr)
+            failed = failed or bool(errors)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    return 1 if failed else 0
 
-with open(odgt_file_path, 'w') as file:
-    for annotation in annotations:
-        file.write(annotation + '\n')
 
+if __name__ == '__main__':
+    sys.exit(main())
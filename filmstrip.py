@@ -0,0 +1,248 @@
+"""
+Filmstrip of the frames around the current one, shown under the canvas of LabelTool.
+
+Every slot shows the frame's thumbnail on a background colored by its label status (STATUS_COLORS)
+and its number; a click jumps to the frame, the mouse wheel scrolls the strip without navigating.
+Thumbnails are made on a background thread pool and persisted in <cache_dir>/thumbnails, keyed by
+path, mtime and size; the Tk thread only picks up finished ones from a queue, so scrolling over
+thousands of frames never waits for a decode.
+"""
+import hashlib
+import os
+import queue
+import threading
+from collections import OrderedDict
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+
+from PIL import Image, ImageTk
+
+from image_source import open_image, stat_image
+from pyramid import reducible
+
+THUMB_SIZE = 96
+# no label file / labeled without interactions (only no_interaction) / labeled with interactions,
+# and frames the label index has not read yet
+STATUS_COLORS = {'unlabeled': 'gray60', 'labeled': 'orange', 'hoi': 'green3', 'unknown': 'gray90'}
+POLL_MS = 50
+
+
+def thumbnail_path(cache_dir, image_path, size=THUMB_SIZE):
+    image_size, mtime_ns = stat_image(image_path, cache_dir)
+    key = hashlib.sha1(f"{os.path.abspath(image_path)}:{mtime_ns}:{image_size}:{size}".encode()).hexdigest()
+    return os.path.join(cache_dir, 'thumbnails', key[:2], key + '.png')
+
+
+def make_thumbnail(image_path, cache_dir, size=THUMB_SIZE):
+    """Thumbnail of an image (at most size x size), from the disk cache or made and stored there."""
+    cache_path = thumbnail_path(cache_dir, image_path, size)
+    if os.path.exists(cache_path):
+        try:
+            img = Image.open(cache_path)
+            img.load()
+            return img
+        except OSError:
+            pass
+
+    with open_image(image_path, cache_dir) as img:
+        factor = max(1, min(img.width, img.height) // (size * 2))
+        thumb = reducible(img).reduce(factor) if factor > 1 else img.copy()
+    thumb.thumbnail((size, size))
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    tmp_path = f"{cache_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    thumb.save(tmp_path, format='PNG')
+    os.replace(tmp_path, cache_path)
+    return thumb
+
+
+class ThumbnailCache():
+    """
+    Thumbnails by image path: kept in memory (up to `max_items`) and made on `workers` threads.
+    request() queues a thumbnail, take_done() returns the paths finished since the last call.
+    """
+
+    def __init__(self, cache_dir='.cache', size=THUMB_SIZE, workers=2, max_items=512):
+        self.cache_dir = cache_dir
+        self.size = size
+        self.max_items = max_items
+        self.images = OrderedDict()  # path -> PIL image
+        self.pending = {}  # path -> future
+        self.done = queue.Queue()
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='thumbnail')
+
+    def get(self, path):
+        with self.lock:
+            img = self.images.get(path)
+            if img is not None:
+                self.images.move_to_end(path)
+            return img
+
+    def request(self, path):
+        """Queue the thumbnail of `path` unless it is in memory or already queued; True if queued now."""
+        with self.lock:
+            if path in self.images or path in self.pending:
+                return False
+            future = self.executor.submit(make_thumbnail, path, self.cache_dir, self.size)
+            self.pending[path] = future
+        future.add_done_callback(lambda future: self._finished(path, future))
+        return True
+
+    def _finished(self, path, future):
+        try:
+            img = future.result()
+        except CancelledError:
+            img = None
+        except Exception as e:
+            print(f"Could not make a thumbnail of {path}: {e}")
+            img = None
+        with self.lock:
+            self.pending.pop(path, None)
+            if img is not None:
+                self.images[path] = img
+                while len(self.images) > self.max_items:
+                    self.images.popitem(last=False)
+        if img is not None:
+            self.done.put(path)
+
+    def take_done(self):
+        paths = []
+        try:
+            while True:
+                paths.append(self.done.get_nowait())
+        except queue.Empty:
+            return paths
+
+    def busy(self):
+        with self.lock:
+            return bool(self.pending)
+
+    def cancel_except(self, paths):
+        """Drop queued thumbnails that are not in `paths` (the strip moved on)."""
+        with self.lock:
+            futures = [future for path, future in self.pending.items() if path not in paths]
+        for future in futures:
+            future.cancel()
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+class Filmstrip():
+    """
+    Slots for `count` frames drawn on `canvas`, centered on the current frame by show().
+    :param on_select: Called with the 0-based index of a clicked frame.
+    :param status: Callable returning 'unlabeled', 'labeled', 'hoi' or 'unknown' for a 0-based frame index,
+        without blocking; call status_changed() when an 'unknown' status becomes known.
+    """
+
+    def __init__(self, canvas, root, thumbnails, on_select, status, count=11):
+        self.canvas = canvas
+        self.root = root
+        self.thumbnails = thumbnails
+        self.on_select = on_select
+        self.status = status
+        self.count = count
+        self.slot = thumbnails.size + 8
+        self.images = None
+        self.first = 0
+        self.cur = 0
+        self.slots = []  # (background, image, text) canvas items
+        self.photos = [None] * count  # PhotoImages of the slots, referenced so Tk keeps them
+        self.shown = [None] * count  # frame index whose thumbnail each slot shows
+        self.polling = None
+        self.unknown = False  # whether a visible slot is colored 'unknown'
+        self.stale = threading.Event()  # set by status_changed(), from any thread
+
+        canvas.bind("<Button-1>", self.click)
+        canvas.bind("<MouseWheel>", lambda event: self.scroll(-1 if event.delta > 0 else 1))
+        canvas.bind("<Button-4>", lambda event: self.scroll(-1))
+        canvas.bind("<Button-5>", lambda event: self.scroll(1))
+
+    def status_changed(self, *args):
+        """A frame status became known or changed; the colors are updated on the next poll."""
+        self.stale.set()
+
+    def set_images(self, images):
+        self.images = images
+        self.first = 0
+        self.shown = [None] * self.count
+
+    def show(self, cur):
+        """Center the strip on frame `cur` (0-based)."""
+        self.cur = cur
+        self.first = cur - self.count // 2
+        self.redraw()
+
+    def scroll(self, steps):
+        if self.images is None:
+            return
+        self.first = min(max(self.first + steps * max(1, self.count // 2), -(self.count // 2)),
+                         len(self.images) - 1 - self.count // 2)
+        self.redraw()
+
+    def click(self, event):
+        if self.images is None:
+            return
+        index = self.first + int(self.canvas.canvasx(event.x) // self.slot)
+        if 0 <= index < len(self.images) and index != self.cur:
+            self.on_select(index)
+
+    def redraw(self):
+        """Bring the slots in line with the visible frames; thumbnails not made yet are requested."""
+        if self.images is None:
+            return
+        size = self.thumbnails.size
+        visible = set()
+        self.stale.clear()
+        self.unknown = False
+        for i in range(self.count):
+            index = self.first + i
+            x = i * self.slot
+            if i == len(self.slots):
+                self.slots.append((
+                    self.canvas.create_rectangle(x + 1, 1, x + self.slot - 1, size + 23, width=0),
+                    self.canvas.create_image(x + self.slot // 2, 4 + size // 2),
+                    self.canvas.create_text(x + self.slot // 2, size + 14, text=''),
+                ))
+            background, image, text = self.slots[i]
+            if not 0 <= index < len(self.images):
+                self.canvas.itemconfig(background, fill='', outline='', width=0)
+                self.canvas.itemconfig(text, text='')
+                self.set_thumbnail(i, None, None)
+                continue
+
+            status = self.status(index)
+            self.unknown = self.unknown or status == 'unknown'
+            self.canvas.itemconfig(background, fill=STATUS_COLORS[status],
+                                   outline='black', width=3 if index == self.cur else 0)
+            self.canvas.itemconfig(text, text="%04d" % (index + 1))
+            path = self.images[index]
+            visible.add(path)
+            if self.shown[i] != index:
+                img = self.thumbnails.get(path)
+                if img is None:
+                    self.thumbnails.request(path)
+                self.set_thumbnail(i, index if img is not None else None, img)
+
+        self.thumbnails.cancel_except(visible)
+        if self.polling is None and self.pending():
+            self.polling = self.root.after(POLL_MS, self.poll)
+
+    def pending(self):
+        return self.unknown or self.stale.is_set() or self.thumbnails.busy() or not self.thumbnails.done.empty()
+
+    def set_thumbnail(self, i, index, img):
+        self.shown[i] = index
+        self.photos[i] = ImageTk.PhotoImage(img) if img is not None else None
+        self.canvas.itemconfig(self.slots[i][1], image=self.photos[i] or '')
+
+    def poll(self):
+        """
+        Show the thumbnails finished by the workers and recolor changed statuses; runs on the Tk
+        thread while thumbnails are pending or visible frames are not indexed yet.
+        """
+        self.polling = None
+        if self.thumbnails.take_done() or self.stale.is_set():
+            self.redraw()
+        elif self.pending():
+            self.polling = self.root.after(POLL_MS, self.poll)
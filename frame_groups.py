@@ -0,0 +1,244 @@
+"""
+Groups of consecutive near-identical frames, so static stretches of a sequence can be labeled once.
+
+    python frame_groups.py Images/2fps/reolink_overhead                  # compute signatures, print the groups
+    python frame_groups.py Images/2fps/reolink_overhead --copy-labels    # also copy labels across each group
+
+Every frame gets a signature: its grayscale image averaged over a SIGNATURE_GRID x SIGNATURE_GRID
+grid of blocks. Two frames are near-identical when no block mean differs by more than `threshold`
+gray levels, which ignores sensor noise but not a person moving through a single block. A group is
+a run of frames that are all near-identical to its first frame.
+
+Signatures are computed on a process pool and cached per directory in <cache_dir>/signatures/,
+keyed by file name and the size and mtime of the file itself (not of the cached directory listing,
+which misses frames replaced in place), so only new or changed frames are decoded again. The tool reads
+the cache when a directory is loaded (see LabelTool.nextChangeImage and copyToGroup).
+"""
+import argparse
+import functools
+import hashlib
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from image_catalog import label_dir
+from image_source import open_catalog, open_image
+from label_store import open_store
+
+SIGNATURE_GRID = 32
+DEFAULT_THRESHOLD = 8.0
+SIGNATURE_VERSION = 1
+
+
+def frame_signature(path, grid=SIGNATURE_GRID, cache_dir='.cache'):
+    """Grayscale block means of an image as a (grid, grid) uint8 array."""
+    with open_image(path, cache_dir) as img:
+        gray = img.convert('L')
+        # reduce() is a fast box filter; it keeps at least 4 pixels per block for the mean below
+        factor = max(1, min(gray.width, gray.height) // (grid * 4))
+        if factor > 1:
+            gray = gray.reduce(factor)
+    pixels = np.asarray(gray, dtype=np.float32)
+    h, w = pixels.shape[0] // grid * grid, pixels.shape[1] // grid * grid
+    blocks = pixels[:h, :w].reshape(grid, h // grid, grid, w // grid)
+    return np.round(blocks.mean(axis=(1, 3))).astype(np.uint8)
+
+
+def signature_distance(a, b):
+    """Largest block difference in gray levels, for single signatures or stacks of them."""
+    return np.abs(a.astype(np.int16) - b.astype(np.int16)).max(axis=(-2, -1))
+
+
+def cache_path(catalog, cache_dir):
+    key = hashlib.sha1(os.path.abspath(catalog.image_dir).encode()).hexdigest()
+    return os.path.join(cache_dir, 'signatures', key + '.npz')
+
+
+def load_signatures(catalog, cache_dir):
+    """
+    Cached signatures of the catalog's frames. Every frame is stat()ed, so the catalog's size and
+    mtime_ns are current afterwards (frames that are gone keep their old entry and are not valid).
+    :return: (signatures array, boolean array of the frames whose cached signature is valid)
+    """
+    signatures = np.zeros((len(catalog), SIGNATURE_GRID, SIGNATURE_GRID), dtype=np.uint8)
+    valid = np.zeros(len(catalog), dtype=bool)
+    keys = []
+    for i, name in enumerate(catalog.names):
+        try:
+            keys.append((name, *catalog.stat(i)))
+        except OSError:
+            keys.append(None)
+    catalog.save_changes()
+    try:
+        with np.load(cache_path(catalog, cache_dir)) as cached:
+            if int(cached["version"]) != SIGNATURE_VERSION:
+                return signatures, valid
+            rows = {(name, int(size), int(mtime_ns)): i for i, (name, size, mtime_ns)
+                    in enumerate(zip(cached["names"].tolist(), cached["size"], cached["mtime_ns"]))}
+            cached_signatures = cached["signatures"]
+    except (OSError, ValueError, KeyError):
+        return signatures, valid
+
+    for i, key in enumerate(keys):
+        row = rows.get(key)
+        if row is not None:
+            signatures[i] = cached_signatures[row]
+            valid[i] = True
+    return signatures, valid
+
+
+def save_signatures(catalog, cache_dir, signatures):
+    """Write the signatures keyed by the catalog's stat of every frame, as refreshed by load_signatures."""
+    path = cache_path(catalog, cache_dir)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + '.tmp.npz'
+        np.savez(tmp_path, version=SIGNATURE_VERSION, names=np.array(catalog.names),
+                 size=np.array(catalog.size, dtype=np.int64), mtime_ns=np.array(catalog.mtime_ns, dtype=np.int64),
+                 signatures=signatures)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"Could not write frame signatures {path}: {e}")
+
+
+def compute_signatures(catalog, cache_dir='.cache', workers=0):
+    """
+    Signatures of all frames, decoding only the frames without a valid cached signature.
+    :param workers: Worker processes (0 = this process).
+    :return: (signatures array, number of frames decoded)
+    """
+    signatures, valid = load_signatures(catalog, cache_dir)
+    missing = np.flatnonzero(~valid).tolist()
+    if missing:
+        paths = [catalog[i] for i in missing]
+        signature = functools.partial(frame_signature, cache_dir=cache_dir)
+        if workers > 0 and len(missing) > 1:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                results = executor.map(signature, paths, chunksize=max(1, len(paths) // (workers * 8)))
+                for i, result in zip(missing, results):
+                    signatures[i] = result
+        else:
+            for i, path in zip(missing, paths):
+                signatures[i] = signature(path)
+        save_signatures(catalog, cache_dir, signatures)
+    return signatures, len(missing)
+
+
+def group_starts(signatures, threshold=DEFAULT_THRESHOLD):
+    """
+    First frame of the group of every frame.
+    A frame joins the current group while it is within `threshold` of the group's first frame.
+    """
+    starts = np.zeros(len(signatures), dtype=np.int64)
+    start = 0
+    for i in range(1, len(signatures)):
+        if signature_distance(signatures[i], signatures[start]) > threshold:
+            start = i
+        starts[i] = start
+    return starts
+
+
+class FrameGroups():
+    """
+    Runs of near-identical frames of an image catalog.
+    :param starts: First frame of the group of every frame (see group_starts).
+    """
+
+    def __init__(self, starts):
+        self.starts = np.asarray(starts, dtype=np.int64)
+        self.boundaries = np.flatnonzero(np.diff(self.starts)) + 1  # first frame of every group but the first
+
+    @classmethod
+    def load(cls, catalog, cache_dir='.cache', threshold=DEFAULT_THRESHOLD):
+        """Groups from the signature cache, or None if any frame has no cached signature."""
+        signatures, valid = load_signatures(catalog, cache_dir)
+        if len(catalog) == 0 or not valid.all():
+            return None
+        return cls(group_starts(signatures, threshold))
+
+    def __len__(self):
+        return len(self.boundaries) + 1 if len(self.starts) else 0
+
+    def group(self, i):
+        """(first, last) frame of the group of frame i, 0-based and inclusive."""
+        end = np.searchsorted(self.boundaries, i, side='right')
+        last = self.boundaries[end] - 1 if end < len(self.boundaries) else len(self.starts) - 1
+        return int(self.starts[i]), int(last)
+
+    def next_change(self, i):
+        """First frame after i that is in a different group, or None."""
+        end = np.searchsorted(self.boundaries, i, side='right')
+        return int(self.boundaries[end]) if end < len(self.boundaries) else None
+
+
+def copy_labels(catalog, groups, store):
+    """
+    Copy the labels of the first labeled frame of every group to the unlabeled frames after it.
+    :return: Number of label files written.
+    """
+    written = 0
+    first = 0
+    while first is not None:
+        _, last = groups.group(first)
+        source = None
+        for i in range(first, last + 1):
+            name = catalog.label_name(i)
+            if store.exists(name):
+                source = store.load(name)
+            elif source is not None:
+                source.file_name = catalog.names[i]
+                store.save(name, source)
+                written += 1
+        first = groups.next_change(first)
+    return written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Find runs of near-identical frames")
+    parser.add_argument("image_dir", help="Image directory or shard, e.g. Images/2fps/reolink_overhead")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Largest block difference (gray levels) of near-identical frames")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Worker processes (0 = this process)")
+    parser.add_argument("--cache-dir", type=str, default='.cache', help="Directory for on-disk caches")
+    parser.add_argument("--store", type=str, default='files', choices=['files', 'sqlite'], help="Label storage")
+    parser.add_argument("--copy-labels", action='store_true',
+                        help="Copy the labels of each group's first labeled frame to its unlabeled frames")
+    parser.add_argument("--quiet", action='store_true', help="Only print the summary")
+    args = parser.parse_args(argv)
+
+    catalog = open_catalog(args.image_dir, cache_dir=args.cache_dir)
+    if len(catalog) == 0:
+        print(f"No .png images found in {args.image_dir}")
+        return 1
+
+    started = time.perf_counter()
+    signatures, decoded = compute_signatures(catalog, args.cache_dir, args.workers)
+    groups = FrameGroups(group_starts(signatures, args.threshold))
+    elapsed = time.perf_counter() - started
+
+    if not args.quiet:
+        first = 0
+        while first is not None:
+            _, last = groups.group(first)
+            if last > first:
+                print(f"{first + 1:04d}-{last + 1:04d}: {last - first + 1} frames")
+            first = groups.next_change(first)
+    print(f"{len(catalog)} frames ({decoded} decoded in {elapsed:.1f} s), {len(groups)} groups, "
+          f"{len(catalog) - len(groups)} frames can be skipped")
+
+    if args.copy_labels:
+        out_dir = label_dir(args.image_dir)
+        os.makedirs(out_dir, exist_ok=True)
+        store = open_store(args.store, out_dir)
+        try:
+            print(f"{copy_labels(catalog, groups, store)} label files written to {out_dir}")
+        finally:
+            store.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,109 @@
+import threading
+from collections import OrderedDict
+
+from image_source import stat_image
+
+
+def image_nbytes(img, photo=True):
+    """
+    Approximate memory footprint of a decoded PIL image.
+    :param img: The PIL image.
+    :param photo: Also count the Tk photo image, which keeps 4 bytes (RGBA) per pixel.
+    :return: Size in bytes.
+    """
+    size = img.width * img.height * len(img.getbands())
+    if photo:
+        size += img.width * img.height * 4
+    return size
+
+
+class ImageCache():
+    """
+    LRU cache of decoded images keyed by (path, mtime), bounded by the total size of its entries.
+
+    A changed file on disk gets a new key, so stale entries are never returned and simply age out.
+    """
+
+    def __init__(self, max_bytes=512 * 1024 * 1024, cache_dir='.cache'):
+        self.max_bytes = max_bytes
+        self.cache_dir = cache_dir  # where the index of a shard is cached, see image_source
+        self.entries = OrderedDict()  # (path, mtime) -> (value, nbytes)
+        self.lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.evicted_bytes = 0
+
+    def key(self, path):
+        try:
+            return path, stat_image(path, self.cache_dir)[1]
+        except OSError:
+            return path, None
+
+    def get(self, path):
+        key = self.key(path)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def __contains__(self, path):
+        key = self.key(path)
+        with self.lock:
+            return key in self.entries
+
+    def put(self, path, value, nbytes):
+        """Insert `value` and evict the least recently used entries until the byte budget fits."""
+        if nbytes > self.max_bytes:
+            return
+        key = self.key(path)
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.bytes -= old[1]
+            self.entries[key] = (value, nbytes)
+            self.bytes += nbytes
+            self._evict()
+
+    def resize(self, path, nbytes):
+        """
+        Update the size of the entry of `path`, e.g. when a pyramid level was loaded after put().
+        The budget is enforced again, which may evict this entry too.
+        """
+        key = self.key(path)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return
+            self.entries[key] = (entry[0], nbytes)
+            self.bytes += nbytes - entry[1]
+            self._evict()
+
+    def _evict(self):
+        while self.bytes > self.max_bytes:
+            _, (_, evicted) = self.entries.popitem(last=False)
+            self.bytes -= evicted
+            self.evictions += 1
+            self.evicted_bytes += evicted
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.bytes = 0
+
+    def stats(self):
+        with self.lock:
+            return {
+                "entries": len(self.entries),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "evicted_bytes": self.evicted_bytes,
+            }
@@ -0,0 +1,174 @@
+"""
+Sorted listing of the frames of an image directory, cached on disk.
+
+The listing (file names with size and mtime) is kept in <cache_dir>/catalog/<key>.json and reused as
+long as the directory's own mtime is unchanged, which is the case until files are added, removed or
+renamed. A file overwritten in place keeps the directory mtime, so the listing's stat of a frame
+can be stale: stat(i) reads the file's own stat and corrects the listing.
+Paths and label names are derived once per frame, in order, when they are first needed.
+"""
+import hashlib
+import json
+import os
+import threading
+
+CATALOG_VERSION = 1
+# uncompressed archives of frames that can stand in for an image directory (see image_source)
+SHARD_EXTENSIONS = ('.tar', '.zip')
+
+
+def label_name(file_name):
+    """Name of the label of an image file: hanwha_QNF-8010_overhead_0383.png -> hanwha_QNF-8010_overhead_0383"""
+    return file_name.split('.')[0]
+
+
+def label_dir(image_dir):
+    """
+    Label directory of an image directory or shard:
+    Images/2fps/reolink_overhead and Images/2fps/reolink_overhead.tar -> Labels/2fps/reolink_overhead
+    """
+    root, extension = os.path.splitext(image_dir)
+    if extension.lower() in SHARD_EXTENSIONS:
+        image_dir = root
+    if image_dir.startswith("Images"):
+        return image_dir.replace("Images", "Labels", 1)
+    return "Labels"
+
+
+class ImageCatalog():
+    """
+    Sequence of the image paths of a directory, sorted by file name.
+
+    catalog[i] is the path of frame i, catalog.label_name(i) its label name;
+    catalog.size[i] / catalog.mtime_ns[i] are the stat of the file when the directory was scanned
+    (or last stat()ed); use stat(i) where a replaced frame matters.
+    """
+
+    def __init__(self, image_dir, cache_dir='.cache', extension='.png'):
+        self.image_dir = image_dir
+        self.cache_dir = cache_dir
+        self.extension = extension
+        self.names = []
+        self.size = []
+        self.mtime_ns = []
+        self.rescanned = False  # whether the last load() had to scan the directory
+        self.dir_mtime_ns = None
+        self.changed = False  # whether stat() corrected entries that are not saved yet
+        self._paths = {}
+        self._label_names = {}
+        self._index = None
+        self.load()
+
+    def index_path(self):
+        key = hashlib.sha1(f"{os.path.abspath(self.image_dir)}:{self.extension}".encode()).hexdigest()
+        return os.path.join(self.cache_dir, 'catalog', key + '.json')
+
+    def load(self):
+        """Read the cached listing, or scan the directory if it changed since the listing was written."""
+        try:
+            dir_mtime_ns = os.stat(self.image_dir).st_mtime_ns
+        except OSError:
+            self.set_entries([], [], [])
+            return
+        self.dir_mtime_ns = dir_mtime_ns
+
+        try:
+            with open(self.index_path(), 'r') as file:
+                index = json.load(file)
+            if index.get("version") == CATALOG_VERSION and index.get("dir_mtime_ns") == dir_mtime_ns:
+                self.set_entries(index["names"], index["size"], index["mtime_ns"])
+                self.rescanned = False
+                return
+        except (OSError, ValueError, KeyError):
+            pass
+
+        self.scan()
+        self.save(dir_mtime_ns)
+
+    def scan(self):
+        entries = []
+        with os.scandir(self.image_dir) as it:
+            for entry in it:
+                if entry.name.endswith(self.extension) and entry.is_file():
+                    st = entry.stat()
+                    entries.append((entry.name, st.st_size, st.st_mtime_ns))
+        entries.sort()
+        self.set_entries([e[0] for e in entries], [e[1] for e in entries], [e[2] for e in entries])
+        self.rescanned = True
+
+    def save(self, dir_mtime_ns):
+        """
+        Write the listing; `dir_mtime_ns` is the directory mtime from before the scan, so a file added
+        while scanning makes the next load() scan again.
+        """
+        index = {
+            "version": CATALOG_VERSION,
+            "image_dir": os.path.abspath(self.image_dir),
+            "dir_mtime_ns": dir_mtime_ns,
+            "names": self.names,
+            "size": self.size,
+            "mtime_ns": self.mtime_ns,
+        }
+        path = self.index_path()
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # the frame groups are validated on a background thread, which may save at the same time
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'w') as file:
+                json.dump(index, file)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Could not write image catalog {path}: {e}")
+
+    def set_entries(self, names, size, mtime_ns):
+        self.names, self.size, self.mtime_ns = list(names), list(size), list(mtime_ns)
+        self._paths = {}
+        self._label_names = {}
+        self._index = None
+        self.changed = False
+
+    def stat(self, i):
+        """
+        (size, mtime_ns) of frame i from the file itself; an entry that differs (the file was replaced
+        in place) is updated, call save_changes() to write it to the cached listing.
+        """
+        st = os.stat(self[i])
+        stat = (st.st_size, st.st_mtime_ns)
+        if stat != (self.size[i], self.mtime_ns[i]):
+            self.size[i], self.mtime_ns[i] = stat
+            self.changed = True
+        return stat
+
+    def save_changes(self):
+        if self.changed and self.dir_mtime_ns is not None:
+            self.save(self.dir_mtime_ns)
+        self.changed = False
+
+    def __len__(self):
+        return len(self.names)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self.names)
+        path = self._paths.get(i)
+        if path is None:
+            path = self._paths[i] = os.path.join(self.image_dir, self.names[i])
+        return path
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def label_name(self, i):
+        name = self._label_names.get(i)
+        if name is None:
+            name = self._label_names[i] = label_name(self.names[i])
+        return name
+
+    def index(self, file_name):
+        """Frame index (0-based) of an image file name, or None."""
+        if self._index is None:
+            self._index = {name: i for i, name in enumerate(self.names)}
+        return self._index.get(file_name)
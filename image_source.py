@@ -0,0 +1,252 @@
+"""
+Where LabelTool reads its frames from: a directory of PNGs, or an uncompressed tar or zip shard.
+
+A shard is opened once, the byte offset of every PNG member is indexed (and the index cached in
+<cache_dir>/shards/), and frames are decoded straight from a memory-mapped view of the shard file.
+Frames inside a shard are addressed by virtual paths "<shard>::<member>", e.g.
+
+    Images/2fps/reolink_overhead.tar::reolink_overhead/reolink_overhead_0383.png
+
+open_image() and stat_image() accept both plain and virtual paths; label names and the label
+directory are derived as for a directory (Images/2fps/reolink_overhead.tar -> Labels/2fps/reolink_overhead).
+"""
+import hashlib
+import io
+import json
+import mmap
+import os
+import struct
+import tarfile
+import threading
+import zipfile
+
+from PIL import Image
+
+from image_catalog import SHARD_EXTENSIONS, ImageCatalog, label_name
+
+SHARD_SEPARATOR = '::'
+SHARD_INDEX_VERSION = 1
+
+
+def is_shard(path):
+    return path.lower().endswith(SHARD_EXTENSIONS) and os.path.isfile(path)
+
+
+def split_path(path):
+    """(shard path, member name) of a virtual path, (path, None) for a plain file."""
+    shard_path, sep, member = path.partition(SHARD_SEPARATOR)
+    return (shard_path, member) if sep else (path, None)
+
+
+class MemberReader(io.RawIOBase):
+    """Seekable read-only file over a slice of a memory map, without copying the member."""
+
+    def __init__(self, view):
+        self.view = view
+        self.pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, buffer):
+        n = min(len(buffer), len(self.view) - self.pos)
+        buffer[:n] = self.view[self.pos:self.pos + n]
+        self.pos += n
+        return n
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self.pos
+        elif whence == io.SEEK_END:
+            offset += len(self.view)
+        self.pos = max(0, offset)
+        return self.pos
+
+    def tell(self):
+        return self.pos
+
+
+def tar_members(shard_path, extension):
+    with tarfile.open(shard_path, 'r:') as tar:
+        return [(member.name, member.offset_data, member.size)
+                for member in tar if member.isfile() and member.name.lower().endswith(extension)]
+
+
+def zip_members(shard_path, extension):
+    members = []
+    with zipfile.ZipFile(shard_path) as archive, open(shard_path, 'rb') as file:
+        for info in archive.infolist():
+            if info.is_dir() or not info.filename.lower().endswith(extension):
+                continue
+            if info.compress_type != zipfile.ZIP_STORED:
+                raise ValueError(f"{shard_path}: {info.filename} is compressed, shards must be stored uncompressed")
+            # the data follows the local file header, whose extra field may differ from the central directory
+            file.seek(info.header_offset)
+            header = file.read(30)
+            name_length, extra_length = struct.unpack('<HH', header[26:30])
+            members.append((info.filename, info.header_offset + 30 + name_length + extra_length, info.file_size))
+    return members
+
+
+class ImageShard():
+    """An uncompressed tar or zip file of images, memory-mapped, with an index of its members."""
+
+    def __init__(self, shard_path, cache_dir='.cache', extension='.png'):
+        self.path = shard_path
+        self.cache_dir = cache_dir
+        stat = os.stat(shard_path)
+        self.size, self.mtime_ns = stat.st_size, stat.st_mtime_ns
+
+        members = self.load_index(extension)
+        if members is None:
+            if shard_path.lower().endswith('.zip'):
+                try:
+                    members = zip_members(shard_path, extension)
+                except zipfile.BadZipFile as e:
+                    raise ValueError(f"{shard_path}: not a valid zip file ({e})")
+            else:
+                try:
+                    members = tar_members(shard_path, extension)
+                except tarfile.TarError as e:
+                    raise ValueError(f"{shard_path}: not an uncompressed tar file ({e})")
+            members.sort(key=lambda member: os.path.basename(member[0]))
+            self.save_index(extension, members)
+
+        self.members = members
+        self.by_name = {name: (offset, size) for name, offset, size in members}
+        self.file = open(shard_path, 'rb')
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if self.size else b''
+
+    def index_path(self, extension):
+        key = hashlib.sha1(f"{os.path.abspath(self.path)}:{self.mtime_ns}:{self.size}:{extension}".encode()).hexdigest()
+        return os.path.join(self.cache_dir, 'shards', key + '.json')
+
+    def load_index(self, extension):
+        try:
+            with open(self.index_path(extension), 'r') as file:
+                index = json.load(file)
+        except (OSError, ValueError):
+            return None
+        if index.get("version") != SHARD_INDEX_VERSION:
+            return None
+        return [tuple(member) for member in index["members"]]
+
+    def save_index(self, extension, members):
+        path = self.index_path(extension)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = path + '.tmp'
+            with open(tmp_path, 'w') as file:
+                json.dump({"version": SHARD_INDEX_VERSION, "shard": os.path.abspath(self.path),
+                           "members": [list(member) for member in members]}, file)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Could not write shard index {path}: {e}")
+
+    def view(self, name):
+        offset, size = self.by_name[name]
+        return memoryview(self.map)[offset:offset + size]
+
+    def open(self, name):
+        """PIL image of a member, decoded lazily from the memory map like Image.open."""
+        return Image.open(io.BufferedReader(MemberReader(self.view(name))))
+
+    def close(self):
+        if isinstance(self.map, mmap.mmap):
+            self.map.close()
+        self.file.close()
+
+
+_shards = {}
+_shards_lock = threading.Lock()
+
+
+def open_shard(shard_path, cache_dir='.cache'):
+    """The shared ImageShard of a file, reopened if the file changed."""
+    key = os.path.abspath(shard_path)
+    with _shards_lock:
+        shard = _shards.get(key)
+        stat = os.stat(shard_path)
+        if shard is None or (shard.size, shard.mtime_ns) != (stat.st_size, stat.st_mtime_ns):
+            shard = _shards[key] = ImageShard(shard_path, cache_dir)
+        return shard
+
+
+def open_image(path, cache_dir='.cache'):
+    """
+    Image.open for plain and virtual (shard member) paths.
+    :param cache_dir: Where the index of a shard not opened yet is cached.
+    """
+    shard_path, member = split_path(path)
+    if member is None:
+        return Image.open(path)
+    return open_shard(shard_path, cache_dir).open(member)
+
+
+def stat_image(path, cache_dir='.cache'):
+    """(size, mtime_ns) of an image; members of a shard report their size and the shard's mtime."""
+    shard_path, member = split_path(path)
+    if member is None:
+        stat = os.stat(path)
+        return stat.st_size, stat.st_mtime_ns
+    shard = open_shard(shard_path, cache_dir)
+    if member not in shard.by_name:
+        raise FileNotFoundError(path)
+    return shard.by_name[member][1], shard.mtime_ns
+
+
+class ShardCatalog():
+    """
+    Frames of a shard in the same form as ImageCatalog: catalog[i] is the virtual path of frame i,
+    catalog.names[i] its file name, catalog.label_name(i) its label name.
+    """
+
+    def __init__(self, shard_path, cache_dir='.cache', extension='.png'):
+        self.image_dir = shard_path
+        self.cache_dir = cache_dir
+        self.shard = open_shard(shard_path, cache_dir)
+        self.members = [name for name, _, _ in self.shard.members]
+        self.names = [os.path.basename(name) for name in self.members]
+        self.size = [size for _, _, size in self.shard.members]
+        self.mtime_ns = [self.shard.mtime_ns] * len(self.members)
+        self.rescanned = False
+        self._index = None
+
+    def __len__(self):
+        return len(self.members)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        return self.image_dir + SHARD_SEPARATOR + self.members[i]
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def label_name(self, i):
+        return label_name(self.names[i])
+
+    def stat(self, i):
+        """(size, mtime_ns) of frame i as stat_image() reports it now (the shard may have been rewritten)."""
+        stat = stat_image(self[i], self.cache_dir)
+        self.size[i], self.mtime_ns[i] = stat
+        return stat
+
+    def save_changes(self):
+        pass
+
+    def index(self, file_name):
+        if self._index is None:
+            self._index = {name: i for i, name in enumerate(self.names)}
+        return self._index.get(file_name)
+
+
+def open_catalog(image_dir, cache_dir='.cache'):
+    """ShardCatalog for a .tar/.zip file, ImageCatalog for a directory."""
+    if is_shard(image_dir):
+        return ShardCatalog(image_dir, cache_dir)
+    return ImageCatalog(image_dir, cache_dir=cache_dir)
@@ -0,0 +1,132 @@
+"""
+Per-frame label status (labeled?, number of boxes, tags, interactions) of an image directory.
+
+The index is built on a background thread when a directory is loaded and updated by saveImage,
+so "next unlabeled frame" or "next frame with tag X" is a scan over small in-memory records
+instead of a load per frame.
+"""
+import json
+import threading
+
+# navigation filters: (kind, value) -> predicate on FrameStatus
+FILTERS = {
+    'unlabeled': lambda status, value: not status.labeled,
+    'no_interactions': lambda status, value: status.labeled and not status.interactions,
+    'tag': lambda status, value: value in status.tags,
+    'interaction': lambda status, value: value in status.interactions,
+}
+
+
+class FrameStatus():
+    __slots__ = ('labeled', 'boxes', 'tags', 'interactions')
+
+    def __init__(self, labeled=False, boxes=0, tags=frozenset(), interactions=frozenset()):
+        self.labeled = labeled
+        self.boxes = boxes
+        self.tags = tags
+        self.interactions = interactions
+
+    @classmethod
+    def from_json(cls, data):
+        """Status of a frame from its label file dict, or of an unlabeled frame if data is None."""
+        if data is None:
+            return cls()
+        gtboxes = data.get("gtboxes", [])
+        return cls(
+            True, len(gtboxes),
+            frozenset(gtbox["tag"] for gtbox in gtboxes),
+            frozenset(conn["interaction"] for conn in data.get("hoi", []))
+        )
+
+    def __repr__(self):
+        return (f"FrameStatus(labeled={self.labeled}, boxes={self.boxes}, "
+                f"tags={sorted(self.tags)}, interactions={sorted(self.interactions)})")
+
+
+class LabelIndex():
+    """
+    Status of every frame of a label store, in image order.
+    :param store: Label store (anything with load_json(name)).
+    :param names: Label names of the frames, in image order.
+    :param on_update: Called with the label name whenever a frame's status is recorded, from the
+        background thread too.
+    """
+
+    def __init__(self, store, names, on_update=None):
+        self.store = store
+        self.names = names
+        self.on_update = on_update
+        self.status = {}  # label name -> FrameStatus
+        self.lock = threading.Lock()
+        self.closed = False
+        self.thread = threading.Thread(target=self._build, name='label-index', daemon=True)
+        self.thread.start()
+
+    def _read(self, name):
+        text = self.store.load_json(name)
+        try:
+            return FrameStatus.from_json(None if text is None else json.loads(text))
+        except (ValueError, KeyError, TypeError):
+            return FrameStatus(labeled=True)  # a broken label file still counts as labeled
+
+    def _build(self):
+        for name in self.names:
+            if self.closed:
+                return
+            if name in self.status:
+                continue
+            status = self._read(name)
+            with self.lock:
+                # a save that happened while the file was read is newer, keep it
+                self.status.setdefault(name, status)
+            if self.on_update is not None:
+                self.on_update(name)
+
+    def ready(self):
+        return not self.thread.is_alive()
+
+    def get(self, name):
+        """Status of a frame, read now if the background build has not reached it yet."""
+        with self.lock:
+            status = self.status.get(name)
+        if status is None:
+            status = self._read(name)
+            with self.lock:
+                status = self.status.setdefault(name, status)
+        return status
+
+    def peek(self, name):
+        """Status of a frame if it is indexed already, else None; never reads the store."""
+        with self.lock:
+            return self.status.get(name)
+
+    def update(self, name, data):
+        """Record the label file dict `data` that was just saved for frame `name`."""
+        status = FrameStatus.from_json(data)
+        with self.lock:
+            self.status[name] = status
+        if self.on_update is not None:
+            self.on_update(name)
+
+    def find(self, start, kind, value=None, step=1):
+        """
+        Index of the next frame after `start` (0-based, in direction `step`) matching a filter, or None.
+        :param kind: One of FILTERS ('unlabeled', 'no_interactions', 'tag', 'interaction').
+        :param value: The tag or interaction for the 'tag' / 'interaction' filters.
+        """
+        predicate = FILTERS[kind]
+        i = start + step
+        while 0 <= i < len(self.names):
+            if predicate(self.get(self.names[i]), value):
+                return i
+            i += step
+        return None
+
+    def counts(self):
+        """Number of indexed and of labeled frames."""
+        with self.lock:
+            return len(self.status), sum(1 for status in self.status.values() if status.labeled)
+
+    def close(self):
+        self.closed = True
+        self.thread.join()
@@ -0,0 +1,22 @@
+"""
+Tags and interactions offered by the tool; also the category lists of the statistics and exports.
+"""
+# object tags, besides 'person'
+OBJECT_OPTIONS = sorted(
+    ['cell phone'] +
+    ['cup', 'bottle'] +
+    ['couch'] +
+    ['apple'] +
+    ['book'] +
+    ['laptop']
+)
+
+CONNECTION_OPTIONS = sorted(
+    ['no_interaction', 'hold'] +
+    ['talk_on', 'text_on'] +
+    ['drink_with'] +
+    ['lie_on', 'sit_on'] +
+    ['eat'] +  # hold
+    ['read'] +  # hold -> erstmal nicht labeln
+    ['type_on']  # hold
+)
@@ -0,0 +1,213 @@
+"""
+Aggregate statistics of the labels: frames, boxes per tag, connections per interaction, box sizes
+and boxes per frame, per camera folder, per group (1fps / 2fps / hico) and in total.
+
+    python label_stats.py                                  # JSON for every camera folder under Labels/
+    python label_stats.py --format csv --output stats.csv
+    python label_stats.py --source odgt                    # read the exported .odgt files instead
+
+Every folder is read in one streaming pass on a process pool; the per-folder results are merged.
+"""
+import argparse
+import csv
+import json
+import math
+import os
+import sys
+from bisect import bisect_right
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+from convert_2_odgt import default_odgt_path, find_label_dirs, list_label_files
+from label_options import CONNECTION_OPTIONS, OBJECT_OPTIONS
+
+# box size classes by sqrt(width * height) in pixels
+SIZE_BINS = (0, 16, 32, 64, 128, 256, 512, 1024)
+
+
+def size_bin_name(i):
+    lo = SIZE_BINS[i]
+    return f"{lo}-{SIZE_BINS[i + 1]}" if i + 1 < len(SIZE_BINS) else f"{lo}+"
+
+
+class LabelStats():
+    """Counters of a set of frames; add() one label file dict at a time, merge() partial results."""
+
+    def __init__(self):
+        self.frames = 0
+        self.boxes = 0
+        self.connections = 0
+        self.tags = Counter()
+        self.interactions = Counter()
+        self.boxes_per_frame = Counter()  # number of boxes -> number of frames
+        self.box_sizes = Counter()  # SIZE_BINS index -> number of boxes
+        self.width_sum = 0
+        self.height_sum = 0
+        self.errors = 0
+
+    def add(self, data):
+        gtboxes = data.get("gtboxes", [])
+        hoi = data.get("hoi", [])
+        self.frames += 1
+        self.boxes += len(gtboxes)
+        self.connections += len(hoi)
+        self.boxes_per_frame[len(gtboxes)] += 1
+        for gtbox in gtboxes:
+            _, _, w, h = gtbox["box"]
+            self.tags[gtbox["tag"]] += 1
+            self.box_sizes[bisect_right(SIZE_BINS, math.sqrt(max(0, w * h))) - 1] += 1
+            self.width_sum += w
+            self.height_sum += h
+        for conn in hoi:
+            self.interactions[conn["interaction"]] += 1
+
+    def merge(self, other):
+        for name in ('frames', 'boxes', 'connections', 'width_sum', 'height_sum', 'errors'):
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+        for name in ('tags', 'interactions', 'boxes_per_frame', 'box_sizes'):
+            getattr(self, name).update(getattr(other, name))
+        return self
+
+    def to_json(self):
+        # the tool's tags and interactions are always listed, others that occur in the files follow
+        tags = ['person'] + OBJECT_OPTIONS
+        tags += sorted(set(self.tags) - set(tags))
+        interactions = CONNECTION_OPTIONS + sorted(set(self.interactions) - set(CONNECTION_OPTIONS))
+        return {
+            "frames": self.frames,
+            "boxes": self.boxes,
+            "connections": self.connections,
+            "boxes_per_frame_mean": self.boxes / self.frames if self.frames else 0.0,
+            "box_width_mean": self.width_sum / self.boxes if self.boxes else 0.0,
+            "box_height_mean": self.height_sum / self.boxes if self.boxes else 0.0,
+            "tags": {tag: self.tags[tag] for tag in tags},
+            "interactions": {interaction: self.interactions[interaction] for interaction in interactions},
+            "box_sizes": {size_bin_name(i): self.box_sizes[i] for i in range(len(SIZE_BINS))},
+            "boxes_per_frame": {str(count): self.boxes_per_frame[count] for count in sorted(self.boxes_per_frame)},
+            "errors": self.errors,
+        }
+
+
+def iter_label_files(labels_dir):
+    for txt_file in list_label_files(labels_dir):
+        try:
+            with open(txt_file, 'r') as file:
+                yield json.load(file)
+        except (OSError, ValueError):
+            yield None
+
+
+def iter_odgt(odgt_file_path):
+    with open(odgt_file_path, 'r') as file:
+        for line in file:
+            if line.strip():
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    yield None
+
+
+def dir_stats(labels_dir, source='labels'):
+    """
+    Statistics of one camera folder, from its label files or its .odgt export.
+    :raises FileNotFoundError: With source 'odgt', if the folder has no export (see convert_2_odgt.py).
+    """
+    stats = LabelStats()
+    if source == 'odgt':
+        records = iter_odgt(default_odgt_path(labels_dir))
+    else:
+        records = iter_label_files(labels_dir)
+    for data in records:
+        try:
+            if data is None:
+                raise ValueError
+            stats.add(data)
+        except (ValueError, KeyError, TypeError, AttributeError):
+            stats.errors += 1
+    return stats
+
+
+def group_of(labels_dir, labels_root):
+    """Labels/2fps/reolink_overhead -> 2fps, Labels/hico -> hico"""
+    return os.path.relpath(labels_dir, labels_root).split(os.sep)[0]
+
+
+def report(label_dirs, labels_root='Labels', source='labels', workers=0):
+    if workers > 0 and len(label_dirs) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(dir_stats, label_dirs, [source] * len(label_dirs)))
+    else:
+        results = [dir_stats(labels_dir, source) for labels_dir in label_dirs]
+
+    total = LabelStats()
+    groups = {}
+    for labels_dir, stats in zip(label_dirs, results):
+        total.merge(stats)
+        groups.setdefault(group_of(labels_dir, labels_root), LabelStats()).merge(stats)
+    return {
+        "total": total.to_json(),
+        "groups": {group: stats.to_json() for group, stats in groups.items()},
+        "cameras": {labels_dir: stats.to_json() for labels_dir, stats in zip(label_dirs, results)},
+    }
+
+
+def write_csv(result, file):
+    """One row per camera folder, group and the total; nested counters become prefixed columns."""
+    rows = [('total', result["total"])]
+    rows += [(f"group:{group}", stats) for group, stats in result["groups"].items()]
+    rows += list(result["cameras"].items())
+
+    columns = []
+    for _, stats in rows:
+        for key, value in stats.items():
+            names = [f"{key}:{sub}" for sub in value] if isinstance(value, dict) else [key]
+            columns += [name for name in names if name not in columns]
+
+    writer = csv.writer(file)
+    writer.writerow(['name'] + columns)
+    for name, stats in rows:
+        flat = {}
+        for key, value in stats.items():
+            if isinstance(value, dict):
+                flat.update((f"{key}:{sub}", count) for sub, count in value.items())
+            else:
+                flat[key] = value
+        writer.writerow([name] + [flat.get(column, 0) for column in columns])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Label statistics report")
+    parser.add_argument("labels_dir", nargs='*', help="Label directories (default: all camera folders)")
+    parser.add_argument("--labels-root", type=str, default='Labels', help="Root searched for camera folders")
+    parser.add_argument("--source", type=str, default='labels', choices=['labels', 'odgt'],
+                        help="Read the label files or the <dir>.odgt exports")
+    parser.add_argument("--format", type=str, default='json', choices=['json', 'csv'])
+    parser.add_argument("--output", type=str, default='', help="Output file (default: stdout)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Worker processes (0 = this process)")
+    args = parser.parse_args(argv)
+
+    label_dirs = args.labels_dir or find_label_dirs(args.labels_root)
+    if args.source == 'odgt':
+        missing = [default_odgt_path(labels_dir) for labels_dir in label_dirs
+                   if not os.path.exists(default_odgt_path(labels_dir))]
+        if missing:
+            print(f"No .odgt export: {', '.join(missing)}\n"
+                  f"Run convert_2_odgt.py first, or use --source labels", file=sys.stderr)
+            return 1
+    result = report(label_dirs, args.labels_root, args.source, args.workers)
+
+    file = open(args.output, 'w', newline='') if args.output else sys.stdout
+    try:
+        if args.format == 'csv':
+            write_csv(result, file)
+        else:
+            json.dump(result, file, indent=2)
+            file.write('\n')
+    finally:
+        if args.output:
+            file.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,362 @@
+"""
+Label storage backends used by LabelTool. Labels are addressed by name, the image file name
+without extension (hanwha_QNF-8010_overhead_0383), and stored as the JSON of the label file format.
+
+- FileLabelStore: one <name>.txt per frame in a directory (the original layout).
+- SqliteLabelStore: a whole sequence in one SQLite database, with boxes and interactions
+  also kept in indexed tables for queries such as "all frames containing tag X".
+- WriteBehindStore: wraps either of them and does the writes on a background thread.
+
+Conversion between the two layouts:
+
+    python label_store.py to-sqlite Labels/2fps/reolink_overhead Labels/2fps/reolink_overhead.sqlite
+    python label_store.py to-files Labels/2fps/reolink_overhead.sqlite Labels/2fps/reolink_overhead
+    python label_store.py query Labels/2fps/reolink_overhead.sqlite --tag laptop
+"""
+import argparse
+import glob
+import json
+import os
+import sqlite3
+import sys
+import threading
+from collections import OrderedDict
+
+from annotation import AnnotationDocument
+
+
+class FileLabelStore():
+    def __init__(self, out_dir):
+        self.out_dir = out_dir
+
+    def path(self, name):
+        return os.path.join(self.out_dir, name + '.txt')
+
+    def names(self):
+        return sorted(os.path.basename(path)[:-len('.txt')] for path in glob.glob(os.path.join(self.out_dir, '*.txt')))
+
+    def exists(self, name):
+        return os.path.exists(self.path(name))
+
+    def load_json(self, name):
+        """The stored JSON text of a frame, or None."""
+        try:
+            with open(self.path(name), 'r') as file:
+                return file.read()
+        except FileNotFoundError:
+            return None
+
+    def load(self, name):
+        text = self.load_json(name)
+        return None if text is None else AnnotationDocument.from_json(json.loads(text))
+
+    def save_json(self, name, text):
+        # write to a temporary file and rename it, a killed process never leaves half a label file
+        tmp_path = self.path(name) + '.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(text)
+        os.replace(tmp_path, self.path(name))
+
+    def save(self, name, doc):
+        self.save_json(name, json.dumps(doc.to_json()))
+
+    def save_many(self, items):
+        """Write many (name, text) pairs; files are written verbatim, so the list of skipped frames is empty."""
+        for name, text in items:
+            self.save_json(name, text)
+        return []
+
+    def delete(self, name):
+        if self.exists(name):
+            os.remove(self.path(name))
+
+    def frames_with_tag(self, tag):
+        return [name for name in self.names() if any(box.tag == tag for box in self.load(name).boxes)]
+
+    def frames_with_interaction(self, interaction):
+        return [name for name in self.names() if any(c["interaction"] == interaction for c in self.load(name).hoi)]
+
+    def close(self):
+        pass
+
+
+class SqliteLabelStore():
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS frames (
+            name TEXT PRIMARY KEY,
+            file_name TEXT,
+            width INTEGER,
+            height INTEGER,
+            data TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS boxes (
+            frame TEXT NOT NULL REFERENCES frames(name) ON DELETE CASCADE,
+            idx INTEGER NOT NULL,
+            tag TEXT NOT NULL,
+            x INTEGER, y INTEGER, w INTEGER, h INTEGER,
+            PRIMARY KEY (frame, idx)
+        );
+        CREATE TABLE IF NOT EXISTS hoi (
+            frame TEXT NOT NULL REFERENCES frames(name) ON DELETE CASCADE,
+            idx INTEGER NOT NULL,
+            subject_id INTEGER, object_id INTEGER,
+            interaction TEXT NOT NULL,
+            PRIMARY KEY (frame, idx)
+        );
+        CREATE INDEX IF NOT EXISTS boxes_tag ON boxes(tag);
+        CREATE INDEX IF NOT EXISTS hoi_interaction ON hoi(interaction);
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        # shared with the background writer thread, access is serialized by the lock
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA foreign_keys=ON")
+        self.conn.executescript(self.SCHEMA)
+
+    def names(self):
+        with self.lock:
+            return [row[0] for row in self.conn.execute("SELECT name FROM frames ORDER BY name")]
+
+    def exists(self, name):
+        with self.lock:
+            return self.conn.execute("SELECT 1 FROM frames WHERE name = ?", (name,)).fetchone() is not None
+
+    def load_json(self, name):
+        with self.lock:
+            row = self.conn.execute("SELECT data FROM frames WHERE name = ?", (name,)).fetchone()
+        return None if row is None else row[0]
+
+    def load(self, name):
+        text = self.load_json(name)
+        return None if text is None else AnnotationDocument.from_json(json.loads(text))
+
+    def _write(self, name, text):
+        # rows are built before anything is written, so a malformed frame leaves the database unchanged
+        data = json.loads(text)
+        boxes = []
+        for i, gtbox in enumerate(data.get("gtboxes", [])):
+            if len(gtbox["box"]) != 4:
+                raise ValueError(f"box {i} has {len(gtbox['box'])} values instead of 4")
+            boxes.append((name, i, gtbox["tag"], *gtbox["box"]))
+        hoi = [(name, i, c["subject_id"], c["object_id"], c["interaction"]) for i, c in enumerate(data.get("hoi", []))]
+
+        self.conn.execute("DELETE FROM frames WHERE name = ?", (name,))
+        self.conn.execute(
+            "INSERT INTO frames (name, file_name, width, height, data) VALUES (?, ?, ?, ?, ?)",
+            (name, data.get("file_name"), data.get("width"), data.get("height"), text)
+        )
+        self.conn.executemany("INSERT INTO boxes (frame, idx, tag, x, y, w, h) VALUES (?, ?, ?, ?, ?, ?, ?)", boxes)
+        self.conn.executemany("INSERT INTO hoi (frame, idx, subject_id, object_id, interaction) VALUES (?, ?, ?, ?, ?)",
+                              hoi)
+
+    def save_json(self, name, text):
+        with self.lock, self.conn:
+            self._write(name, text)
+
+    def save(self, name, doc):
+        self.save_json(name, json.dumps(doc.to_json()))
+
+    def save_many(self, items):
+        """
+        Write many (name, text) pairs in a single transaction. Malformed frames are skipped.
+        :return: List of (name, error message) of the skipped frames.
+        """
+        skipped = []
+        with self.lock, self.conn:
+            for name, text in items:
+                try:
+                    self._write(name, text)
+                except (ValueError, KeyError, TypeError, AttributeError) as e:
+                    skipped.append((name, f"{type(e).__name__}: {e}"))
+        return skipped
+
+    def delete(self, name):
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM frames WHERE name = ?", (name,))
+
+    def frames_with_tag(self, tag):
+        with self.lock:
+            return [row[0] for row in self.conn.execute(
+                "SELECT DISTINCT frame FROM boxes WHERE tag = ? ORDER BY frame", (tag,)
+            )]
+
+    def frames_with_interaction(self, interaction):
+        with self.lock:
+            return [row[0] for row in self.conn.execute(
+                "SELECT DISTINCT frame FROM hoi WHERE interaction = ? ORDER BY frame", (interaction,)
+            )]
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+class WriteBehindStore():
+    """
+    Store wrapper that queues writes and performs them on a background thread.
+
+    Only the latest text per frame is kept in the queue; reads see queued writes, so a frame
+    can be reloaded before it reached the disk. flush() waits for the queue, close() flushes.
+    A write that fails keeps its text (reads still see it) until take_failed() queues it again.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self.pending = OrderedDict()  # name -> text, not yet written
+        self.writing = None  # (name, text) currently being written
+        self.failed = OrderedDict()  # name -> (text, exception) of writes that failed
+        self.cond = threading.Condition()
+        self.closed = False
+        self.thread = threading.Thread(target=self._run, name='label-writer', daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while True:
+            with self.cond:
+                while not self.pending and not self.closed:
+                    self.cond.wait()
+                if not self.pending:
+                    return
+                self.writing = self.pending.popitem(last=False)
+            name, text = self.writing
+            try:
+                self.store.save_json(name, text)
+            except Exception as e:
+                print(f"Failed to save labels of {name}: {e}")
+                with self.cond:
+                    if name not in self.pending:  # unless a newer text replaced it meanwhile
+                        self.failed[name] = (text, e)
+            with self.cond:
+                self.writing = None
+                self.cond.notify_all()
+
+    def _queued(self, name):
+        """Text waiting to be written for `name`, or None (called with the lock held)."""
+        if name in self.pending:
+            return self.pending[name]
+        if self.writing is not None and self.writing[0] == name:
+            return self.writing[1]
+        if name in self.failed:
+            return self.failed[name][0]
+        return None
+
+    def save_json(self, name, text):
+        with self.cond:
+            self.pending.pop(name, None)
+            self.failed.pop(name, None)
+            self.pending[name] = text
+            self.cond.notify_all()
+
+    def save(self, name, doc):
+        self.save_json(name, json.dumps(doc.to_json()))
+
+    def load_json(self, name):
+        with self.cond:
+            text = self._queued(name)
+        return text if text is not None else self.store.load_json(name)
+
+    def load(self, name):
+        text = self.load_json(name)
+        return None if text is None else AnnotationDocument.from_json(json.loads(text))
+
+    def exists(self, name):
+        with self.cond:
+            if self._queued(name) is not None:
+                return True
+        return self.store.exists(name)
+
+    def take_failed(self):
+        """
+        Frames whose last write failed, as {name: exception}; their texts are queued again.
+        """
+        with self.cond:
+            failed, self.failed = self.failed, OrderedDict()
+            for name, (text, _) in failed.items():
+                self.pending.setdefault(name, text)
+            self.cond.notify_all()
+        return {name: error for name, (_, error) in failed.items()}
+
+    def flush(self):
+        with self.cond:
+            while self.pending or self.writing is not None:
+                self.cond.wait()
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+        self.thread.join()
+        self.store.close()
+
+    def __getattr__(self, name):
+        # queries and listings go to the wrapped store once everything queued is written
+        attr = getattr(self.store, name)
+        if callable(attr):
+            def flushed(*args, **kwargs):
+                self.flush()
+                return attr(*args, **kwargs)
+            return flushed
+        return attr
+
+
+def open_store(kind, out_dir):
+    """Store for the label directory `out_dir`; the SQLite database lives next to it as <out_dir>.sqlite."""
+    if kind == 'sqlite':
+        return SqliteLabelStore(os.path.normpath(out_dir) + '.sqlite')
+    return FileLabelStore(out_dir)
+
+
+def copy_store(src, dst):
+    """
+    Copy every frame from one store to another, keeping the stored JSON text unchanged.
+    :return: (number of frames copied, list of (name, error message) of the frames skipped)
+    """
+    names = src.names()
+    skipped = dst.save_many((name, src.load_json(name)) for name in names)
+    return len(names) - len(skipped), skipped
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert and query label stores")
+    sub = parser.add_subparsers(dest="command", required=True)
+    to_sqlite = sub.add_parser("to-sqlite", help="Per-file label directory -> SQLite database")
+    to_sqlite.add_argument("labels_dir")
+    to_sqlite.add_argument("db_path")
+    to_files = sub.add_parser("to-files", help="SQLite database -> per-file label directory")
+    to_files.add_argument("db_path")
+    to_files.add_argument("labels_dir")
+    query = sub.add_parser("query", help="List frames containing a tag or interaction")
+    query.add_argument("db_path")
+    query.add_argument("--tag", type=str, default='')
+    query.add_argument("--interaction", type=str, default='')
+    args = parser.parse_args(argv)
+
+    if args.command in ('to-sqlite', 'to-files'):
+        if args.command == 'to-sqlite':
+            src, dst, target = FileLabelStore(args.labels_dir), SqliteLabelStore(args.db_path), args.db_path
+        else:
+            os.makedirs(args.labels_dir, exist_ok=True)
+            src, dst, target = SqliteLabelStore(args.db_path), FileLabelStore(args.labels_dir), args.labels_dir
+        try:
+            copied, skipped = copy_store(src, dst)
+        finally:
+            src.close()
+            dst.close()
+        print(f"{copied} frames -> {target}")
+        for name, error in skipped:
+            print(f"  skipped {name}: {error}", file=sys.stderr)
+        return 1 if skipped else 0
+    else:
+        store = SqliteLabelStore(args.db_path)
+        names = store.frames_with_tag(args.tag) if args.tag else store.frames_with_interaction(args.interaction)
+        for name in names:
+            print(name)
+        store.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -13,17 +13,58 @@ import json
 from tkinter import *
 from tkinter import ttk, messagebox
 
-from PIL import Image, ImageTk
+from PIL import ImageTk
 import os
-import glob
+import tarfile
+import threading
+import time
+import zipfile
+
+from annotation import AnnotationDocument
+from filmstrip import THUMB_SIZE, Filmstrip, ThumbnailCache
+from frame_groups import DEFAULT_THRESHOLD as GROUP_THRESHOLD, FrameGroups
+from image_cache import ImageCache
+from image_catalog import label_dir
+from image_source import open_catalog
+from label_index import LabelIndex
+from latency import PROFILER, profiled
+from label_options import CONNECTION_OPTIONS, OBJECT_OPTIONS
+from label_store import WriteBehindStore, open_store
+from prefetch import ImagePrefetcher
+from propagation import MODES as PROPAGATION_MODES, BoxPropagator
+from pyramid import ImagePyramid, prune_level_cache
 
 parser = argparse.ArgumentParser(description="Object bounding box label tool")
 parser.add_argument("--debug", type=str, default='', help="Enable debug mode or specify debug options")
-args = parser.parse_args()
+parser.add_argument("--profile", type=str, default='',
+                    help="Record the latency of every handler and write its percentiles to this JSON file on exit")
+parser.add_argument("--prefetch-ahead", type=int, default=2, help="Number of following images decoded in the background")
+parser.add_argument("--prefetch-behind", type=int, default=1, help="Number of previous images decoded in the background")
+parser.add_argument("--prefetch-workers", type=int, default=2, help="Worker threads used for prefetching")
+parser.add_argument("--cache-mb", type=int, default=512, help="Memory budget of the decoded image cache in MB")
+parser.add_argument("--cache-dir", type=str, default='.cache', help="Directory for on-disk caches (image pyramids)")
+parser.add_argument("--level-cache-mb", type=int, default=2048,
+                    help="Disk budget of the cached pyramid levels in MB, the least recently used are deleted on exit")
+parser.add_argument("--store", type=str, default='files', choices=['files', 'sqlite'],
+                    help="Label storage: one .txt per image, or one SQLite database per image dir")
+parser.add_argument("--zoom", type=float, default=1.0, help="Initial display zoom (e.g. 0.5 shows 2048px frames at 1024px)")
+parser.add_argument("--propagate", type=str, default='match', choices=PROPAGATION_MODES,
+                    help="How 'Next wA' places the previous boxes: template matching, constant velocity, or copied as is")
+parser.add_argument("--filmstrip", type=int, default=11, help="Frames shown in the filmstrip under the canvas (0 = hide it)")
+parser.add_argument("--thumbnail-workers", type=int, default=2, help="Worker threads making filmstrip thumbnails")
+parser.add_argument("--group-threshold", type=float, default=GROUP_THRESHOLD,
+                    help="Largest block difference (gray levels) of near-identical frames, see frame_groups.py")
+args = parser.parse_args([])  # defaults when imported (e.g. by the benchmarks), parsed in __main__
 
 # colors for the bboxes
 COLORS = {'person': 'red', 'object': 'blue'}
 
+# selectable display zoom levels
+ZOOM_LEVELS = (0.125, 0.25, 0.5, 1.0, 2.0, 4.0)
+
+# crosshair / rubber-band redraws are coalesced to at most one per frame interval
+MOTION_INTERVAL_MS = 16
+
 
 class LabelTool():
     def __init__(self, master):
@@ -33,6 +74,7 @@ class LabelTool():
         self.frame = Frame(self.parent)
         self.frame.pack(fill=BOTH, expand=1)
         self.parent.resizable(width=FALSE, height=FALSE)
+        self.parent.protocol("WM_DELETE_WINDOW", self.on_close)
 
         # initialize global state
         self.imageDir = ''
@@ -42,8 +84,29 @@ class LabelTool():
         self.total = 0
         self.category = 0
         self.imagename = ''
-        self.labelfilename = ''
+        self.labelname = ''  # image file name without extension, the key of the label store
+        self.store = None
+        self.savedJson = None  # label JSON stored for the current image, to skip saving unchanged frames
+        self.labelIndex = None  # label status of every frame, for "next match" navigation
+        self.frameGroups = None  # runs of near-identical frames, if frame_groups.py was run on the directory
+        self.groupsThread = None  # loads frameGroups after loadDir
         self.tkimg = None
+        self.pyramid = None
+        self.imageId = None
+        self.rendered = None  # region of the display currently rendered into self.tkimg
+        self.zoom = args.zoom
+
+        # decode neighbouring images in the background
+        self.prefetcher = ImagePrefetcher(
+            ahead=args.prefetch_ahead, behind=args.prefetch_behind, workers=args.prefetch_workers,
+            loader=self.load_pyramid
+        )
+        # keep recently shown image pyramids around for going back and forth
+        self.imageCache = ImageCache(max_bytes=args.cache_mb * 1024 * 1024, cache_dir=args.cache_dir)
+        # handler latency histograms, written on exit with --profile
+        PROFILER.enabled = bool(args.profile)
+        # moves the boxes to the next frame for nextWithAnnotationsImage
+        self.propagator = BoxPropagator(mode=args.propagate) if args.propagate != 'off' else None
 
         # initialize mouse state
         self.STATE = {}
@@ -53,16 +116,18 @@ class LabelTool():
 
         # reference to bbox
         self.bboxIdList = []
+        self.bboxIndex = {}  # canvas id -> index into bboxIdList / self.doc.boxes
         self.bboxId = None
-        self.bboxList = []
-        self.bboxTypes = []  # To store type information for bboxes
+        self.doc = AnnotationDocument()  # boxes, tags and connections of the current image
         self.hl = None
         self.vl = None
+        self.motion = (0, 0)  # latest pointer position (widget coordinates)
+        self.motionPending = None
+        self.lastMotionRedraw = 0.0
 
         # Connection management
         self.connectionLines = []
         self.selected_indices = []  # To store selected indices for connections
-        self.connections = []  # To store connections
 
         # ----------------- GUI stuff ---------------------
         # dir entry & load
@@ -78,8 +143,8 @@ class LabelTool():
         self.canvasFrame.grid(row=1, column=1, rowspan=4, sticky=N + E + S + W)
 
         self.mainPanel = Canvas(self.canvasFrame, cursor='tcross')
-        self.scrollY = Scrollbar(self.canvasFrame, orient=VERTICAL, command=self.mainPanel.yview)
-        self.scrollX = Scrollbar(self.canvasFrame, orient=HORIZONTAL, command=self.mainPanel.xview)
+        self.scrollY = Scrollbar(self.canvasFrame, orient=VERTICAL, command=self.on_scroll_y)
+        self.scrollX = Scrollbar(self.canvasFrame, orient=HORIZONTAL, command=self.on_scroll_x)
 
         self.mainPanel.config(yscrollcommand=self.scrollY.set, xscrollcommand=self.scrollX.set)
 
@@ -89,6 +154,7 @@ class LabelTool():
 
         self.mainPanel.bind("<Button-1>", self.mouseClick)
         self.mainPanel.bind("<Motion>", self.mouseMove)
+        self.mainPanel.bind("<Configure>", self.render_image)
         self.parent.bind("<Escape>", self.cancelBBox)  # press <Escape> to cancel current bbox
         self.parent.bind("s", self.cancelBBox)
         self.parent.bind("a", self.prevImage)  # press 'a' to go backward
@@ -97,6 +163,10 @@ class LabelTool():
         self.parent.bind("v", self.nextRelabelImage)
         self.parent.bind("q", self.toggle_drag_mode)
         self.parent.bind("p", self.clear_all_connections)
+        self.parent.bind("n", self.nextMatchImage)  # press 'n' to jump to the next frame matching the filter
+        self.parent.bind("c", self.nextChangeImage)  # press 'c' to skip the rest of a run of near-identical frames
+        self.parent.bind("+", self.zoom_in)
+        self.parent.bind("-", self.zoom_out)
 
 
         # showing bbox info & delete bbox &
@@ -120,15 +190,7 @@ class LabelTool():
         self.personBtn.pack(side=TOP, pady=5)
 
         # object selection
-        self.objectOptions = (
-                ['cell phone'] +
-                ['cup', 'bottle'] +
-                ['couch'] +
-                ['apple'] +
-                ['book'] +
-                ['laptop']
-        )
-        self.objectOptions.sort()
+        self.objectOptions = list(OBJECT_OPTIONS)
         self.objectDropdown = ttk.OptionMenu(
             self.typePanel, StringVar(value='Object'), None, *self.objectOptions, command=self.setObjectType
         )
@@ -138,15 +200,7 @@ class LabelTool():
         self.connectBtn = Button(self.typePanel, text='Select for \nConnection', command=self.selectForConnection)
         self.connectBtn.pack(side=TOP, pady=5)
 
-        self.connectionOptions = (['no_interaction', 'hold'] +
-                                  ['talk_on', 'text_on'] +
-                                  ['drink_with'] +
-                                  ['lie_on', 'sit_on'] +
-                                  ['eat'] + # hold
-                                  ['read'] + # hold -> erstmal nicht labeln
-                                  ['type_on'] # hold
-        )
-        self.connectionOptions.sort()
+        self.connectionOptions = list(CONNECTION_OPTIONS)
         self.connectionDropdown = ttk.OptionMenu(
             self.typePanel, StringVar(value='Save Connection'), None, *self.connectionOptions,
             command=self.save_connection
@@ -176,6 +230,29 @@ class LabelTool():
         self.nextRelabelBtn = Button(self.ctrPanel, text='Next relabel >>', width=10, command=self.nextRelabelImage)
         self.nextRelabelBtn.pack(side=LEFT, padx=5, pady=3)
 
+        # jump to the next frame matching a label status filter
+        self.navFilterOptions = (['unlabeled', 'no_interactions'] +
+                                 ['tag: ' + tag for tag in ['person'] + self.objectOptions] +
+                                 ['interaction: ' + interaction for interaction in self.connectionOptions])
+        self.navFilter = StringVar(value='unlabeled')
+        self.navFilterDropdown = ttk.OptionMenu(self.ctrPanel, self.navFilter, 'unlabeled', *self.navFilterOptions)
+        self.navFilterDropdown.pack(side=LEFT, pady=3)
+        self.nextMatchBtn = Button(self.ctrPanel, text='Next match >>', width=12, command=self.nextMatchImage)
+        self.nextMatchBtn.pack(side=LEFT, padx=5, pady=3)
+
+        # skip / label runs of near-identical frames
+        self.nextChangeBtn = Button(self.ctrPanel, text='Next change >>', width=12, command=self.nextChangeImage)
+        self.nextChangeBtn.pack(side=LEFT, padx=5, pady=3)
+        self.copyToGroupBtn = Button(self.ctrPanel, text='Copy to group', width=12, command=self.copyToGroup)
+        self.copyToGroupBtn.pack(side=LEFT, padx=5, pady=3)
+
+        self.zoomOutBtn = Button(self.ctrPanel, text='-', width=2, command=self.zoom_out)
+        self.zoomOutBtn.pack(side=LEFT, pady=3)
+        self.zoomLabel = Label(self.ctrPanel, text="Zoom: %d%%" % (self.zoom * 100), width=10)
+        self.zoomLabel.pack(side=LEFT)
+        self.zoomInBtn = Button(self.ctrPanel, text='+', width=2, command=self.zoom_in)
+        self.zoomInBtn.pack(side=LEFT, pady=3)
+
         # display mouse position
         self.disp = Label(self.ctrPanel, text='')
         self.disp.pack(side=RIGHT)
@@ -199,6 +276,15 @@ class LabelTool():
         self.filenameLabel = Label(self.ctrPanel, text="Filename: ", anchor=W)
         self.filenameLabel.pack(side=LEFT, padx=5)
 
+        # thumbnails of the surrounding frames, colored by label status, click to jump
+        self.thumbnails = ThumbnailCache(args.cache_dir, workers=args.thumbnail_workers)
+        self.filmstrip = None
+        if args.filmstrip > 0:
+            self.filmCanvas = Canvas(self.frame, height=THUMB_SIZE + 24, highlightthickness=0)
+            self.filmCanvas.grid(row=6, column=1, columnspan=2, sticky=W + E)
+            self.filmstrip = Filmstrip(self.filmCanvas, self.parent, self.thumbnails, self.jumpToImage,
+                                       self.frame_status, count=args.filmstrip)
+
         # Initialize dragging state and mode toggle
         self.drag_mode = False
         self.drag_data = {"x": 0, "y": 0, "item": None}
@@ -246,21 +332,15 @@ class LabelTool():
             sub, obj = self.selected_indices
 
             # Draw the connection line
-            center1 = self.getBBoxCenter(self.bboxList[sub])
-            center2 = self.getBBoxCenter(self.bboxList[obj])
+            center1 = self.getBBoxCenter(self.doc.boxes[sub].corners)
+            center2 = self.getBBoxCenter(self.doc.boxes[obj].corners)
             line_id = self.mainPanel.create_line(
-                center1[0], center1[1], center2[0], center2[1], fill="yellow", width=2
+                *self.to_canvas(center1[0], center1[1], center2[0], center2[1]), fill="yellow", width=2
             )
             self.connectionLines.append(line_id)
 
             # Add to connections and connectionListbox
-            connection = {
-                "object_id": obj,
-                "interaction": connection_type,
-                "subject_id": sub
-            }
-
-            self.connections.append(connection)
+            self.doc.add_interaction(sub, obj, connection_type)
             self.connectionListbox.insert(END, f"[{sub} - {connection_type} - {obj}]")
 
             self.STATE['connection'] = None
@@ -278,7 +358,7 @@ class LabelTool():
         self.connectionLines.pop(idx)
 
         # Remove the connection from the data and listbox
-        self.connections.pop(idx)
+        self.doc.remove_interaction(idx)
         self.connectionListbox.delete(idx)
 
     def getBBoxCenter(self, bbox):
@@ -292,6 +372,101 @@ class LabelTool():
         y_center = (y1 + y2) / 2
         return x_center, y_center
 
+    def index_bbox_ids(self):
+        """Rebuild the canvas id -> box index lookup after boxes were removed from bboxIdList."""
+        self.bboxIndex = {bbox_id: index for index, bbox_id in enumerate(self.bboxIdList)}
+
+    def to_image(self, x, y):
+        """Map a canvas (display) position to full-resolution image pixels."""
+        return x / self.zoom, y / self.zoom
+
+    def to_canvas(self, *coords):
+        """Map full-resolution image coordinates to canvas (display) coordinates."""
+        return [c * self.zoom for c in coords]
+
+    def load_pyramid(self, imagepath):
+        """Runs on the prefetch workers: open the pyramid and load the level needed for the current zoom."""
+        with PROFILER.phase('load_pyramid', 'open'):
+            pyramid = ImagePyramid(imagepath, cache_dir=args.cache_dir)
+        with PROFILER.phase('load_pyramid', 'decode'):
+            pyramid.level(pyramid.level_for(self.zoom))
+            if self.propagator is not None and self.propagator.mode == 'match':
+                pyramid.level(self.propagator.match_level(pyramid))
+        return pyramid
+
+    @profiled('render_image')
+    def render_image(self, event=None):
+        """
+        Render the visible part of the image (plus half a view of margin) at the current zoom.
+        Nothing is done while the view stays inside the already rendered region.
+        """
+        if self.pyramid is None:
+            return
+
+        view_w, view_h = self.mainPanel.winfo_width(), self.mainPanel.winfo_height()
+        disp_w, disp_h = int(self.pyramid.width * self.zoom), int(self.pyramid.height * self.zoom)
+        x1, y1 = max(0, int(self.mainPanel.canvasx(0))), max(0, int(self.mainPanel.canvasy(0)))
+        x2, y2 = min(disp_w, x1 + view_w), min(disp_h, y1 + view_h)
+
+        if self.rendered is not None:
+            rx1, ry1, rx2, ry2 = self.rendered
+            if rx1 <= x1 and ry1 <= y1 and x2 <= rx2 and y2 <= ry2:
+                return
+
+        box = (max(0, x1 - view_w // 2), max(0, y1 - view_h // 2), x2 + view_w // 2, y2 + view_h // 2)
+        with PROFILER.phase('render_image', 'resample'):
+            region = self.pyramid.render(self.zoom, box)
+        with PROFILER.phase('render_image', 'photo_image'):
+            self.tkimg = ImageTk.PhotoImage(region)
+        if self.imageId is None:
+            self.imageId = self.mainPanel.create_image(box[0], box[1], image=self.tkimg, anchor=NW)
+        else:
+            self.mainPanel.itemconfig(self.imageId, image=self.tkimg)
+            self.mainPanel.coords(self.imageId, box[0], box[1])
+        self.mainPanel.tag_lower(self.imageId)
+        self.rendered = (box[0], box[1], box[0] + region.width, box[1] + region.height)
+
+    def on_scroll_x(self, *args):
+        self.mainPanel.xview(*args)
+        self.render_image()
+
+    def on_scroll_y(self, *args):
+        self.mainPanel.yview(*args)
+        self.render_image()
+
+    def set_zoom(self, zoom):
+        if self.pyramid is None or zoom == self.zoom:
+            self.zoom = zoom
+            self.zoomLabel.config(text="Zoom: %d%%" % (zoom * 100))
+            return
+
+        # remember the image position at the centre of the view
+        view_w, view_h = self.mainPanel.winfo_width(), self.mainPanel.winfo_height()
+        cx, cy = self.to_image(self.mainPanel.canvasx(view_w / 2), self.mainPanel.canvasy(view_h / 2))
+
+        # boxes, connection lines and crosshair are kept, only their coordinates are rescaled
+        factor = zoom / self.zoom
+        self.mainPanel.scale(ALL, 0, 0, factor, factor)
+        self.zoom = zoom
+        disp_w, disp_h = self.pyramid.width * zoom, self.pyramid.height * zoom
+        self.mainPanel.config(scrollregion=(0, 0, disp_w, disp_h))
+        self.mainPanel.xview_moveto(max(0, (cx * zoom - view_w / 2) / disp_w))
+        self.mainPanel.yview_moveto(max(0, (cy * zoom - view_h / 2) / disp_h))
+        self.zoomLabel.config(text="Zoom: %d%%" % (zoom * 100))
+
+        self.rendered = None
+        self.render_image()
+
+    def zoom_in(self, event=None):
+        larger = [z for z in ZOOM_LEVELS if z > self.zoom]
+        if larger:
+            self.set_zoom(larger[0])
+
+    def zoom_out(self, event=None):
+        smaller = [z for z in ZOOM_LEVELS if z < self.zoom]
+        if smaller:
+            self.set_zoom(smaller[-1])
+
     def loadDir(self):
         if args.debug:
             image_directory = args.debug
@@ -300,8 +475,13 @@ class LabelTool():
             self.parent.focus()
 
         self.imageDir = image_directory
-        self.imageList = glob.glob(os.path.join(self.imageDir, '*.png'))
-        self.imageList.sort()
+        if self.imageList:
+            self.imageList.save_changes()
+        try:
+            self.imageList = open_catalog(self.imageDir, cache_dir=args.cache_dir)
+        except (OSError, ValueError, zipfile.BadZipFile, tarfile.ReadError) as e:
+            print(f'Could not open {self.imageDir}: {e}')
+            return
         if len(self.imageList) == 0:
             print('No .png images found in the specified dir!')
             return
@@ -309,177 +489,244 @@ class LabelTool():
         # default to the 1st image in the collection
         self.cur = 1
         self.total = len(self.imageList)
+        self.prefetcher.set_images(self.imageList)
+        if self.filmstrip is not None:
+            self.filmstrip.set_images(self.imageList)
 
         # set up output dir
-        if self.imageDir.startswith("Images"):
-            self.outDir = self.imageDir.replace("Images", "Labels", 1)
-        else:
-            self.outDir = "Labels"
+        self.outDir = label_dir(self.imageDir)
 
         print(self.outDir)
         if not os.path.exists(self.outDir):
             os.mkdir(self.outDir)
 
+        # the index thread reads from the store, stop it before the store is closed
+        if self.labelIndex is not None:
+            self.labelIndex.close()
+        if self.store is not None:
+            self.store.flush()
+            self.report_failed_writes(final=True)
+            self.store.close()
+        self.store = WriteBehindStore(open_store(args.store, self.outDir))
+
+        # label status of all frames, read in the background
+        self.labelIndex = LabelIndex(self.store, [self.imageList.label_name(i) for i in range(self.total)],
+                                     on_update=self.filmstrip.status_changed if self.filmstrip is not None else None)
+
+        # checking the cached signatures stats every frame, so the groups are published when ready
+        self.frameGroups = None
+        self.groupsThread = threading.Thread(target=self.load_frame_groups, args=(self.imageList, self.imageDir),
+                                             name='frame-groups', daemon=True)
+        self.groupsThread.start()
+
         self.loadImage()
 
+    def load_frame_groups(self, catalog, image_dir):
+        """Runs on a background thread: groups of near-identical frames from the signature cache."""
+        groups = FrameGroups.load(catalog, args.cache_dir, args.group_threshold)
+        if catalog is not self.imageList:
+            return  # another directory was loaded meanwhile
+        self.frameGroups = groups
+        if groups is None:
+            print(f"No frame signatures for {image_dir}, run frame_groups.py on it to enable 'Next change'")
+        else:
+            print(f"{len(groups)} groups of near-identical frames")
+
+    @profiled('loadImage')
     def loadImage(self, prev=False, relabel=False):
-        # load image
+        # load image; waits for the prefetch worker unless it is done or cached
         imagepath = self.imageList[self.cur - 1]
-        self.img = Image.open(imagepath)
-        self.tkimg = ImageTk.PhotoImage(self.img)
+        with PROFILER.phase('loadImage', 'image'):
+            try:
+                self.imageList.stat(self.cur - 1)  # corrects the listing if the frame was replaced in place
+            except OSError:
+                pass
+            cached = self.imageCache.get(imagepath)
+            if cached is None:
+                self.pyramid = self.prefetcher.get(self.cur - 1)
+                self.imageCache.put(imagepath, self.pyramid, self.pyramid.nbytes)
+                # levels loaded later (zooming, propagation) grow the entry, keep the budget honest
+                self.pyramid.on_level = lambda pyramid: self.imageCache.resize(imagepath, pyramid.nbytes)
+                self.imageCache.resize(imagepath, self.pyramid.nbytes)
+            else:
+                self.pyramid = cached
+        self.prefetcher.schedule(self.cur - 1, skip=self.imageCache.__contains__)
 
-        # Update canvas size to match image dimensions
-        self.mainPanel.config(scrollregion=(0, 0, self.tkimg.width(), self.tkimg.height()))
-        self.mainPanel.create_image(0, 0, image=self.tkimg, anchor=NW)
+        # Update canvas size to match the displayed image dimensions
+        self.mainPanel.config(
+            scrollregion=(0, 0, self.pyramid.width * self.zoom, self.pyramid.height * self.zoom)
+        )
+        self.rendered = None
+        self.render_image()
         self.progLabel.config(text="%04d/%04d" % (self.cur, self.total))
+        if self.filmstrip is not None:
+            self.filmstrip.show(self.cur - 1)
 
         # Update filename label
-        self.imagename = os.path.split(imagepath)[-1]
+        self.imagename = self.imageList.names[self.cur - 1]
         self.filenameLabel.config(text=f"Filename: {self.imagename}")
 
         # load labels
-        self.clear_all()
-        self.imagename = os.path.split(imagepath)[-1]
-        image_name_without_extension = os.path.split(imagepath)[-1].split('.')[0]
-        labelname = image_name_without_extension + '.txt'
-        self.labelfilename = os.path.join(self.outDir, labelname)
+        self.labelname = self.imageList.label_name(self.cur - 1)
 
         if prev or relabel:
-            prev_image_path = self.imageList[self.cur - 2]
-            prev_image_name_without_extension = os.path.split(prev_image_path)[-1].split('.')[0]
-            prev_label_name = prev_image_name_without_extension + '.txt'
-            prev_label_file_name = os.path.join(self.outDir, prev_label_name)
-            load_filename = prev_label_file_name
+            load_name = self.imageList.label_name(self.cur - 2)
         else:
-            load_filename = self.labelfilename
-
-        if not os.path.exists(load_filename):
+            load_name = self.labelname
+
+        self.report_failed_writes()
+        # what is stored for this image; saveImage only writes when the annotations differ from it
+        with PROFILER.phase('loadImage', 'json_read'):
+            self.savedJson = self.store.load_json(self.labelname)
+            text = self.savedJson if load_name == self.labelname else self.store.load_json(load_name)
+        if text is None:
+            with PROFILER.phase('loadImage', 'canvas'):
+                self.show_document(AnnotationDocument(self.imagename, self.pyramid.width, self.pyramid.height))
             return
 
-        with open(load_filename, 'r') as file:
-            data = json.load(file)
-
+        with PROFILER.phase('loadImage', 'json_parse'):
+            doc = AnnotationDocument.from_json(json.loads(text))
         if relabel:
-            with open(self.labelfilename, 'r') as file:
-                data_person = json.load(file)
-
-            gtbox = data_person["gtboxes"][0]
-
-            x1, y1, width, height = map(int, gtbox["box"])
-            x2, y2 = x1 + width - 1, y1 + height - 1
-            self.bboxList.append((x1, y1, x2, y2))
-            label_type = gtbox["tag"]
-            self.bboxTypes.append(label_type)
+            # keep the first box of this image, take all others (and the connections) from the previous one
+            doc.boxes = self.store.load(self.labelname).boxes[:1] + doc.boxes[1:]
+        elif prev and self.propagator is not None:
+            with PROFILER.phase('loadImage', 'propagate'):
+                doc.boxes = self.propagate_boxes(doc.boxes)
+        doc.file_name, doc.width, doc.height = self.imagename, self.pyramid.width, self.pyramid.height
+        with PROFILER.phase('loadImage', 'canvas'):
+            self.show_document(doc)
+
+    def propagate_boxes(self, boxes):
+        """Move the boxes of the previous frame to where they are predicted in the current one."""
+        prev_path = self.imageList[self.cur - 2]
+        prev_pyramid = self.imageCache.get(prev_path) or ImagePyramid(prev_path, cache_dir=args.cache_dir)
+        before = self.store.load(self.imageList.label_name(self.cur - 3)) if self.cur >= 3 else None
+        return self.propagator.propagate(boxes, prev_pyramid, self.pyramid, before.boxes if before else None)
+
+    def connection_coords(self, doc, conn):
+        """Canvas coordinates of the line between the centers of a connection's boxes."""
+        sub, obj = conn['subject_id'], conn['object_id']
+        center1 = self.getBBoxCenter(doc.boxes[sub].corners)
+        center2 = self.getBBoxCenter(doc.boxes[obj].corners)
+        return self.to_canvas(center1[0], center1[1], center2[0], center2[1])
+
+    def show_document(self, doc):
+        """
+        Make `doc` the current document and bring the canvas items and listbox rows in line with it.
+        Consecutive frames mostly have the same boxes, so items are reconciled by index instead of
+        being re-created: unchanged ones are kept, moved ones get new coords, retagged ones a new
+        color, and only the surplus or missing ones are deleted or created.
+        """
+        old = self.doc
+        self.doc = doc
+
+        # selection highlights belong to the previous frame
+        for idx in self.selected_indices:
+            if idx < len(self.bboxIdList):
+                self.mainPanel.itemconfig(self.bboxIdList[idx], fill="", stipple="")
+        self.selected_indices = []
+
+        # bounding boxes
+        rows = self.listbox.get(0, END)
+        common = min(len(self.bboxIdList), len(doc.boxes))
+        for index in range(common):
+            box = doc.boxes[index]
+            if index >= len(old.boxes) or old.boxes[index].corners != box.corners:
+                self.mainPanel.coords(self.bboxIdList[index], *self.to_canvas(*box.corners))
+            color = COLORS[box.tag if box.tag == 'person' else 'object']
+            if index >= len(old.boxes) or old.boxes[index].tag != box.tag:
+                self.mainPanel.itemconfig(self.bboxIdList[index], outline=color)
+            text = f'[{index}][{box.tag}]'
+            if index >= len(rows) or rows[index] != text:
+                self.listbox.delete(index)
+                self.listbox.insert(index, text)
+                self.listbox.itemconfig(index, fg=color)
+
+        for bbox_id in self.bboxIdList[common:]:
+            self.mainPanel.delete(bbox_id)
+        del self.bboxIdList[common:]
+        if len(rows) > common:
+            self.listbox.delete(common, END)
+
+        for index in range(common, len(doc.boxes)):
+            label_type = doc.boxes[index].tag
             tmpId = self.mainPanel.create_rectangle(
-                x1, y1, x2, y2, width=2, outline=COLORS[label_type if label_type == 'person' else 'object']
+                *self.to_canvas(*doc.boxes[index].corners), width=2,
+                outline=COLORS[label_type if label_type == 'person' else 'object']
             )
             self.bboxIdList.append(tmpId)
-            self.listbox.insert(END, f'[{0}][{label_type}]')
-            # self.listbox.insert(END, f'[{x1} {y1} {x2} {y2}]')
-            self.listbox.itemconfig(len(self.bboxIdList) - 1,
-                                    fg=COLORS[label_type if label_type == 'person' else 'object'])
-
-            for index, gtbox in enumerate(data["gtboxes"]):
-                if index == 0:
-                    continue
-
-                x1, y1, width, height = map(int, gtbox["box"])
-                x2, y2 = x1 + width - 1, y1 + height - 1
-                self.bboxList.append((x1, y1, x2, y2))
-                label_type = gtbox["tag"]
-                self.bboxTypes.append(label_type)
-                tmpId = self.mainPanel.create_rectangle(
-                    x1, y1, x2, y2, width=2, outline=COLORS[label_type if label_type == 'person' else 'object']
-                )
-                self.bboxIdList.append(tmpId)
-                self.listbox.insert(END, f'[{index}][{label_type}]')
-                # self.listbox.insert(END, f'[{x1} {y1} {x2} {y2}]')
-                self.listbox.itemconfig(len(self.bboxIdList) - 1,
-                                        fg=COLORS[label_type if label_type == 'person' else 'object'])
-
-        else:
-            # load bounding boxes
-            for index, gtbox in enumerate(data["gtboxes"]):
-                x1, y1, width, height = map(int, gtbox["box"])
-                x2, y2 = x1 + width - 1, y1 + height - 1
-                self.bboxList.append((x1, y1, x2, y2))
-                label_type = gtbox["tag"]
-                self.bboxTypes.append(label_type)
-                tmpId = self.mainPanel.create_rectangle(
-                    x1, y1, x2, y2, width=2, outline=COLORS[label_type if label_type == 'person' else 'object']
-                )
-                self.bboxIdList.append(tmpId)
-                self.listbox.insert(END, f'[{index}][{label_type}]')
-                # self.listbox.insert(END, f'[{x1} {y1} {x2} {y2}]')
-                self.listbox.itemconfig(len(self.bboxIdList) - 1,
-                                        fg=COLORS[label_type if label_type == 'person' else 'object'])
-
-        # loading connections
-        for conn in data["hoi"]:
-            sub = conn['subject_id']
-            obj = conn['object_id']
-            interaction = conn['interaction']
-
-            center1 = self.getBBoxCenter(self.bboxList[sub])
-            center2 = self.getBBoxCenter(self.bboxList[obj])
-
-            line_id = self.mainPanel.create_line(
-                center1[0], center1[1], center2[0], center2[1], fill="yellow", width=2
-            )
+            self.listbox.insert(END, f'[{index}][{label_type}]')
+            self.listbox.itemconfig(index, fg=COLORS[label_type if label_type == 'person' else 'object'])
+        self.index_bbox_ids()
+
+        # connections
+        rows = self.connectionListbox.get(0, END)
+        common = min(len(self.connectionLines), len(doc.hoi))
+        for index in range(common):
+            conn = doc.hoi[index]
+            line = self.connection_coords(doc, conn)
+            try:
+                old_line = self.connection_coords(old, old.hoi[index])
+            except IndexError:
+                old_line = None  # boxes of the old connection were deleted
+            if line != old_line:
+                self.mainPanel.coords(self.connectionLines[index], *line)
+            text = f"[{conn['subject_id']} - {conn['interaction']} - {conn['object_id']}]"
+            if index >= len(rows) or rows[index] != text:
+                self.connectionListbox.delete(index)
+                self.connectionListbox.insert(index, text)
+
+        for line_id in self.connectionLines[common:]:
+            self.mainPanel.delete(line_id)
+        del self.connectionLines[common:]
+        if len(rows) > common:
+            self.connectionListbox.delete(common, END)
+
+        for conn in doc.hoi[common:]:
+            line_id = self.mainPanel.create_line(*self.connection_coords(doc, conn), fill="yellow", width=2)
             self.connectionLines.append(line_id)  # Track connection line
+            self.connectionListbox.insert(END, f"[{conn['subject_id']} - {conn['interaction']} - {conn['object_id']}]")
 
-            connection = {
-                "object_id": obj,
-                "interaction": interaction,
-                "subject_id": sub
-            }
-            self.connections.append(connection)
-            self.connectionListbox.insert(END, f"[{sub} - {interaction} - {obj}]")
-
-        print("-----------------------------------------------------------")
-        print(f"conn: {self.connections}")
-
+    @profiled('saveImage')
     def saveImage(self):
-        # if len(self.connections) == 0 and len(self.bboxList) == 0:
-        #     return
-
-        if len(self.connections) == 0:
-            conn = []
-
-            if len(self.bboxTypes) != 0 and self.bboxTypes[0] == 'person':
-                for index, _ in enumerate(self.bboxList[1:], start=1):
-                    conn.append(
-                        {
-                            "object_id": index,
-                            "interaction": "no_interaction",
-                            "subject_id": 0
-                        }
-                    )
-        else:
-            conn = self.connections
-
-
-        data = {
-            "file_name": self.imagename,
-            "height": self.img.height,
-            "width": self.img.width,
-            "gtboxes": [
-                {
-                    "tag": self.bboxTypes[i],
-                    "box": [int(x_min), int(y_min), int(width), int(height)]
-                }
-                for i, bbox in enumerate(self.bboxList)
-                for x_min, y_min, x_max, y_max in [bbox]
-                for width, height in [(x_max - x_min + 1, y_max - y_min + 1)]
-            ],
-            "hoi": conn
-        }
-
-        print(f"saved data: {data}")
-        with open(self.labelfilename, 'w') as f:
-            json.dump(data, f)
-
-        # print('Image No. %d saved' % self.cur)
+        self.doc.file_name = self.imagename
+        self.doc.width, self.doc.height = self.pyramid.width, self.pyramid.height
+        with PROFILER.phase('saveImage', 'json_serialize'):
+            data = self.doc.to_json()
+            text = json.dumps(data)
+        self.report_failed_writes()
+        if text == self.savedJson:
+            return  # not dirty
+
+        # queued for the background writer, navigation doesn't wait for the disk
+        with PROFILER.phase('saveImage', 'json_write'):
+            self.store.save_json(self.labelname, text)
+        self.savedJson = text
+        self.labelIndex.update(self.labelname, data)
+        if self.filmstrip is not None:
+            self.filmstrip.redraw()
+
+    def report_failed_writes(self, final=False):
+        """
+        Tell the user about label writes that failed since the last check. They are queued again,
+        and the current frame stays dirty, so the labels are not lost while the tool runs.
+        :param final: The store is about to be closed, the labels are retried once more before.
+        """
+        if self.store is None:
+            return
+        failed = self.store.take_failed()
+        if final and failed:
+            self.store.flush()
+            failed = self.store.take_failed()
+        if not failed:
+            return
+        if self.labelname in failed:
+            self.savedJson = None
+        names = list(failed)
+        listed = '\n'.join(names[:10]) + ('\n...' if len(names) > 10 else '')
+        retry = "These labels are LOST." if final else "They are written again with the next save."
+        messagebox.showerror("Labels not saved", f"Could not save the labels of {len(names)} frame(s): "
+                                                 f"{failed[names[-1]]}\n\n{listed}\n\n{retry}")
 
     def setLabelType(self, label_type):
         self.STATE['label_type'] = label_type
@@ -487,67 +734,80 @@ class LabelTool():
     def setObjectType(self, selection):
         self.STATE['label_type'] = selection
 
+    @profiled('mouseMove')
     def mouseMove(self, event):
-        # Calculate the scroll offset
-        x_offset = self.mainPanel.canvasx(event.x)
-        y_offset = self.mainPanel.canvasy(event.y)
-
-        # Update the mouse position display
-        self.disp.config(text=f'x: {x_offset:.0f}, y: {y_offset:.0f}')
+        # Motion events arrive much faster than the screen refreshes, so only the latest
+        # position is kept and the redraw is scheduled for the next frame interval
+        self.motion = (event.x, event.y)
+        if self.motionPending is None:
+            due = self.lastMotionRedraw + MOTION_INTERVAL_MS / 1000
+            delay = max(0, int((due - time.perf_counter()) * 1000))
+            self.motionPending = self.parent.after(delay, self.redraw_cursor)
+
+    @profiled('redraw_cursor')
+    def redraw_cursor(self):
+        self.motionPending = None
+        self.lastMotionRedraw = time.perf_counter()
 
-        if self.tkimg:
-            # Update horizontal line
-            if self.hl:
-                self.mainPanel.delete(self.hl)
-            self.hl = self.mainPanel.create_line(0, y_offset, self.tkimg.width(), y_offset, width=2)
-
-            # Update vertical line
-            if self.vl:
-                self.mainPanel.delete(self.vl)
-            self.vl = self.mainPanel.create_line(x_offset, 0, x_offset, self.tkimg.height(), width=2)
+        # Calculate the scroll offset
+        x_offset = self.mainPanel.canvasx(self.motion[0])
+        y_offset = self.mainPanel.canvasy(self.motion[1])
+
+        # Update the mouse position display (in full-resolution pixels)
+        x_image, y_image = self.to_image(x_offset, y_offset)
+        self.disp.config(text=f'x: {x_image:.0f}, y: {y_image:.0f}')
+
+        # crosshair and preview are persistent canvas items, they are only moved
+        if self.pyramid:
+            disp_w, disp_h = self.to_canvas(self.pyramid.width, self.pyramid.height)
+            if self.hl is None:
+                self.hl = self.mainPanel.create_line(0, y_offset, disp_w, y_offset, width=2)
+                self.vl = self.mainPanel.create_line(x_offset, 0, x_offset, disp_h, width=2)
+            else:
+                self.mainPanel.coords(self.hl, 0, y_offset, disp_w, y_offset)
+                self.mainPanel.coords(self.vl, x_offset, 0, x_offset, disp_h)
 
         # Update bounding box preview
         if self.STATE['click'] == 1:
-            if self.bboxId:
-                self.mainPanel.delete(self.bboxId)
-            self.bboxId = self.mainPanel.create_rectangle(
-                self.STATE['x'], self.STATE['y'], x_offset, y_offset,
-                width=2,
-                outline=COLORS[self.STATE['label_type'] if self.STATE['label_type'] == 'person' else 'object']
-            )
+            x1, y1 = self.to_canvas(self.STATE['x'], self.STATE['y'])
+            if self.bboxId is None:
+                self.bboxId = self.mainPanel.create_rectangle(
+                    x1, y1, x_offset, y_offset,
+                    width=2,
+                    outline=COLORS[self.STATE['label_type'] if self.STATE['label_type'] == 'person' else 'object']
+                )
+            else:
+                self.mainPanel.coords(self.bboxId, x1, y1, x_offset, y_offset)
 
+    @profiled('mouseClick')
     def mouseClick(self, event):
-        x_offset = int(self.mainPanel.canvasx(event.x))
-        y_offset = int(self.mainPanel.canvasy(event.y))
+        x_offset, y_offset = self.to_image(self.mainPanel.canvasx(event.x), self.mainPanel.canvasy(event.y))
+        x_offset, y_offset = int(x_offset), int(y_offset)
 
         if self.drag_mode:
             sel = self.listbox.curselection()
             if len(sel) != 1:
-                for bbox_id in self.bboxIdList:
-                    coords = self.mainPanel.coords(bbox_id)
-                    x1, y1, x2, y2 = coords
-
-                    # Check if the click is near any corner
-                    corners = {
-                        "top_left": (x1, y1),
-                        "top_right": (x2, y1),
-                        "bottom_left": (x1, y2),
-                        "bottom_right": (x2, y2)
+                # corner threshold is given in screen pixels
+                threshold = self.resize_threshold / self.zoom
+
+                # Check if the click is near a corner (looked up in the document's spatial index)
+                hit = self.doc.corner_at(x_offset, y_offset, threshold)
+                if hit is not None:
+                    # Start resizing
+                    index, corner_name = hit
+                    self.resize_mode = True
+                    self.resize_data = {
+                        "x": x_offset, "y": y_offset, "item": self.bboxIdList[index], "corner": corner_name
                     }
-
-                    for corner_name, (cx, cy) in corners.items():
-                        if abs(cx - x_offset) <= self.resize_threshold and abs(cy - y_offset) <= self.resize_threshold:
-                            # Start resizing
-                            self.resize_mode = True
-                            self.resize_data = {"x": x_offset, "y": y_offset, "item": bbox_id, "corner": corner_name}
-                            return
-
-                    # Start dragging if click is within the rectangle
-                    if x1 <= x_offset <= x2 and y1 <= y_offset <= y2:
-                        self.drag_data["item"] = bbox_id
-                        self.drag_data["x"] = x_offset
-                        self.drag_data["y"] = y_offset
-                        return
+                    return
+
+                # Start dragging the smallest rectangle containing the click
+                index = self.doc.box_at(x_offset, y_offset)
+                if index is not None:
+                    self.drag_data["item"] = self.bboxIdList[index]
+                    self.drag_data["x"] = x_offset
+                    self.drag_data["y"] = y_offset
+                    return
             else:
                 idx = int(sel[0])
                 self.drag_data["item"] = self.bboxIdList[idx]
@@ -563,11 +823,20 @@ class LabelTool():
             else:
                 x1, x2 = min(self.STATE['x'], x_offset), max(self.STATE['x'], x_offset)
                 y1, y2 = min(self.STATE['y'], y_offset), max(self.STATE['y'], y_offset)
-                self.bboxList.append((x1, y1, x2, y2))
-                self.bboxTypes.append(self.STATE['label_type'])  # Default to the current label type
+                self.doc.add_box(self.STATE['label_type'], x1, y1, x2, y2)  # Default to the current label type
+
+                # the preview may lag behind the pointer (coalesced redraws), snap it to the final box
+                if self.bboxId is None:
+                    self.bboxId = self.mainPanel.create_rectangle(
+                        *self.to_canvas(x1, y1, x2, y2), width=2,
+                        outline=COLORS[self.STATE['label_type'] if self.STATE['label_type'] == 'person' else 'object']
+                    )
+                else:
+                    self.mainPanel.coords(self.bboxId, *self.to_canvas(x1, y1, x2, y2))
                 self.bboxIdList.append(self.bboxId)
+                self.bboxIndex[self.bboxId] = len(self.bboxIdList) - 1
                 self.bboxId = None
-                self.listbox.insert(END, f'[{len(self.bboxList) - 1}][{self.STATE["label_type"]}]')
+                self.listbox.insert(END, f'[{len(self.doc.boxes) - 1}][{self.STATE["label_type"]}]')
                 self.listbox.itemconfig(
                     len(self.bboxIdList) - 1,
                     fg=COLORS[self.STATE['label_type'] if self.STATE['label_type'] == 'person' else 'object']
@@ -582,7 +851,7 @@ class LabelTool():
             if self.bboxId:
                 self.mainPanel.delete(self.bboxId)
                 self.bboxId = None
-                self.STATE['click'] = 0
+            self.STATE['click'] = 0
 
     def delBBox(self):
         sel = self.listbox.curselection()
@@ -591,8 +860,8 @@ class LabelTool():
         idx = int(sel[0])
         self.mainPanel.delete(self.bboxIdList[idx])
         self.bboxIdList.pop(idx)
-        self.bboxList.pop(idx)
-        self.bboxTypes.pop(idx)
+        self.index_bbox_ids()
+        self.doc.remove_box(idx)
         self.listbox.delete(idx)
 
     def clear_all_btn(self):
@@ -604,15 +873,13 @@ class LabelTool():
         self.clear_all()
 
     def clear_all(self):
-        # empty bboxes
-        self.bboxTypes = []
-
         # Clear bounding boxes
         for idx in range(len(self.bboxIdList)):
             self.mainPanel.delete(self.bboxIdList[idx])
-        self.listbox.delete(0, len(self.bboxList))
+        self.listbox.delete(0, len(self.doc.boxes))
         self.bboxIdList = []
-        self.bboxList = []
+        self.bboxIndex = {}
+        self.doc.clear_boxes()
 
         # Clear connections
         self.clear_all_connections()
@@ -622,42 +889,135 @@ class LabelTool():
         for line in self.connectionLines:
             self.mainPanel.delete(line)
         self.connectionLines = []
-        self.connectionListbox.delete(0, len(self.connections))
-        self.connections = []
+        self.connectionListbox.delete(0, len(self.doc.hoi))
+        self.doc.clear_interactions()
 
+    @profiled('prevImage')
     def prevImage(self, event=None):
         self.saveImage()
         if self.cur > 1:
             self.cur -= 1
             self.loadImage()
 
+    @profiled('nextImage')
     def nextImage(self, event=None):
         self.saveImage()
         if self.cur < self.total:
             self.cur += 1
             self.loadImage()
 
+    @profiled('nextWithAnnotationsImage')
     def nextWithAnnotationsImage(self, event=None):
         self.saveImage()
         if self.cur < self.total:
             self.cur += 1
             self.loadImage(prev=True)
 
+    @profiled('nextRelabelImage')
     def nextRelabelImage(self, event=None):
         self.saveImage()
         if self.cur < self.total:
             self.cur += 1
             self.loadImage(relabel=True)
 
+    @profiled('nextMatchImage')
+    def nextMatchImage(self, event=None):
+        if self.labelIndex is None:
+            return
+        kind, _, value = self.navFilter.get().partition(': ')
+        self.saveImage()
+        idx = self.labelIndex.find(self.cur - 1, kind, value)
+        if idx is None:
+            print(f"No frame after {self.cur} matches '{self.navFilter.get()}'")
+            return
+        self.cur = idx + 1
+        self.loadImage()
+
+    @profiled('nextChangeImage')
+    def nextChangeImage(self, event=None):
+        if self.frameGroups is None:
+            return
+        self.saveImage()
+        idx = self.frameGroups.next_change(self.cur - 1)
+        if idx is None:
+            print(f"Frames {self.cur}-{self.total} are near-identical")
+            return
+        self.cur = idx + 1
+        self.loadImage()
+
+    def copyToGroup(self):
+        """Copy the current labels to the unlabeled frames after this one in its group of near-identical frames."""
+        if self.frameGroups is None:
+            return
+        self.saveImage()
+        _, last = self.frameGroups.group(self.cur - 1)
+        targets = [i for i in range(self.cur, last + 1)
+                   if not self.labelIndex.get(self.imageList.label_name(i)).labeled]
+        if not targets:
+            print(f"No unlabeled near-identical frames after {self.cur}")
+            return
+        if not messagebox.askyesno("Copy to group", f"Copy the labels to {len(targets)} unlabeled frames "
+                                                    f"({targets[0] + 1}-{targets[-1] + 1})?"):
+            return
+        data = self.doc.to_json()
+        for i in targets:
+            data["file_name"] = self.imageList.names[i]
+            name = self.imageList.label_name(i)
+            self.store.save_json(name, json.dumps(data))
+            self.labelIndex.update(name, data)
+        print(f"Labels copied to frames {targets[0] + 1}-{targets[-1] + 1}")
+        if self.filmstrip is not None:
+            self.filmstrip.redraw()
+
+    @profiled('gotoImage')
     def gotoImage(self):
         idx = int(self.idxEntry.get())
         if 1 <= idx <= self.total:
-            self.saveImage()
-            self.cur = idx
-            self.loadImage()
+            self.jumpToImage(idx - 1)
 
         self.parent.focus()
 
+    @profiled('jumpToImage')
+    def jumpToImage(self, index):
+        """Go to frame `index` (0-based), e.g. clicked in the filmstrip."""
+        self.saveImage()
+        self.cur = index + 1
+        self.loadImage()
+
+    def frame_status(self, index):
+        """
+        Filmstrip color of a frame: 'unlabeled', 'labeled', 'hoi' (interactions besides no_interaction),
+        or 'unknown' while the label index has not read it; the index never reads on the Tk thread here.
+        """
+        status = self.labelIndex.peek(self.imageList.label_name(index))
+        if status is None:
+            return 'unknown'
+        if not status.labeled:
+            return 'unlabeled'
+        return 'hoi' if status.interactions - {'no_interaction'} else 'labeled'
+
+    def on_close(self):
+        if PROFILER.enabled:
+            PROFILER.dump(args.profile)
+        print(f"prefetch: {self.prefetcher.stats()}")
+        print(f"image cache: {self.imageCache.stats()}")
+        if self.propagator is not None:
+            print(f"propagation: {self.propagator.stats()}")
+        self.prefetcher.shutdown()
+        deleted, freed = prune_level_cache(args.cache_dir, args.level_cache_mb * 1024 * 1024)
+        if deleted:
+            print(f"pyramid cache: deleted {deleted} least recently used levels ({freed / 1e6:.0f} MB)")
+        self.thumbnails.shutdown()
+        if self.imageList:
+            self.imageList.save_changes()
+        if self.labelIndex is not None:
+            self.labelIndex.close()
+        if self.store is not None:
+            self.store.flush()
+            self.report_failed_writes(final=True)
+            self.store.close()
+        self.parent.destroy()
+
     def toggle_drag_mode(self, event=None):
         """Toggle the drag mode."""
         self.drag_mode = not self.drag_mode
@@ -666,12 +1026,13 @@ class LabelTool():
         else:
             self.moveModeBtn.config(relief=RAISED, text="Move BBox")
 
+    @profiled('on_drag_motion')
     def on_drag_motion(self, event):
-        x, y = self.mainPanel.canvasx(event.x), self.mainPanel.canvasy(event.y)
+        x, y = self.to_image(self.mainPanel.canvasx(event.x), self.mainPanel.canvasy(event.y))
 
         if self.resize_mode and self.resize_data["item"] is not None:
-            item_index = self.bboxIdList.index(self.resize_data["item"])
-            x1, y1, x2, y2 = self.mainPanel.coords(self.resize_data["item"])
+            item_index = self.bboxIndex[self.resize_data["item"]]
+            x1, y1, x2, y2 = self.doc.boxes[item_index].corners
 
             # Update coordinates based on the corner being dragged
             corner = self.resize_data["corner"]
@@ -685,35 +1046,37 @@ class LabelTool():
                 x2, y2 = x, y
 
             # Update the rectangle on the canvas
-            self.mainPanel.coords(self.resize_data["item"], x1, y1, x2, y2)
+            self.mainPanel.coords(self.resize_data["item"], *self.to_canvas(x1, y1, x2, y2))
 
             # Update bounding box list
-            self.bboxList[item_index] = (x1, y1, x2, y2)
+            self.doc.set_corners(item_index, (x1, y1, x2, y2))
 
         elif self.drag_data["item"] is not None:
             dx, dy = x - self.drag_data["x"], y - self.drag_data["y"]
 
             # Move the rectangle
-            self.mainPanel.move(self.drag_data["item"], dx, dy)
+            self.mainPanel.move(self.drag_data["item"], dx * self.zoom, dy * self.zoom)
 
             # Update the drag data
             self.drag_data["x"] = x
             self.drag_data["y"] = y
 
+    @profiled('on_drag_end')
     def on_drag_end(self, event):
         if self.resize_mode:
             self.resize_mode = False
             self.resize_data = {"x": 0, "y": 0, "item": None, "corner": None}
         elif self.drag_data["item"] is not None:
-            x1, y1, x2, y2 = self.mainPanel.coords(self.drag_data["item"])
-            item_index = self.bboxIdList.index(self.drag_data["item"])
-            self.bboxList[item_index] = (x1, y1, x2, y2)
+            x1, y1, x2, y2 = [c / self.zoom for c in self.mainPanel.coords(self.drag_data["item"])]
+            item_index = self.bboxIndex[self.drag_data["item"]]
+            self.doc.set_corners(item_index, (x1, y1, x2, y2))
 
+            label_type = self.doc.boxes[item_index].tag
             self.listbox.delete(item_index)
-            self.listbox.insert(item_index, f'[{item_index}][{self.bboxTypes[item_index]}]')
+            self.listbox.insert(item_index, f'[{item_index}][{label_type}]')
             self.listbox.itemconfig(
                 item_index,
-                fg=COLORS[self.bboxTypes[item_index] if self.bboxTypes[item_index] == 'person' else 'object']
+                fg=COLORS[label_type if label_type == 'person' else 'object']
             )
             self.drag_data = {"x": 0, "y": 0, "item": None}
 
@@ -735,9 +1098,9 @@ class LabelTool():
     def set_label_from_popup(self, popup, label_var):
         selected_label = label_var.get()
         self.STATE['label_type'] = selected_label
-        self.bboxTypes[-1] = selected_label  # Update the last bounding box's type
-        self.listbox.delete(len(self.bboxList) - 1)  # Remove and re-add the last bbox entry
-        self.listbox.insert(END, f'[{len(self.bboxList) - 1}][{selected_label}]')
+        self.doc.set_tag(-1, selected_label)  # Update the last bounding box's type
+        self.listbox.delete(len(self.doc.boxes) - 1)  # Remove and re-add the last bbox entry
+        self.listbox.insert(END, f'[{len(self.doc.boxes) - 1}][{selected_label}]')
         self.listbox.itemconfig(
             len(self.bboxIdList) - 1,
             fg=COLORS[selected_label if selected_label == 'person' else 'object']
@@ -746,6 +1109,7 @@ class LabelTool():
 
 
 if __name__ == '__main__':
+    args = parser.parse_args()
     root = Tk()
     tool = LabelTool(root)
     root.resizable(width=True, height=True)
@@ -0,0 +1,133 @@
+"""
+Random access to .odgt files through a sidecar index (<odgt>.idx.json: file_name -> byte offset/length).
+
+    with OdgtReader('Labels/2fps/reolink_overhead.odgt') as reader:
+        record = reader.get('reolink_overhead_0383.png')
+        record = reader.frame(383)
+
+The index is written by convert_2_odgt.py; if it is missing or does not match the .odgt it is rebuilt
+by scanning the file once. When several records share a file name (or a frame number), the last one
+in the file wins in both lookups, as a later record supersedes an earlier one.
+"""
+import json
+import mmap
+import os
+import re
+
+INDEX_VERSION = 1
+
+FRAME_NUMBER = re.compile(r'(\d+)$')
+
+
+def index_path(odgt_file_path):
+    return odgt_file_path + '.idx.json'
+
+
+def frame_number(file_name):
+    """Trailing number of the file name stem (hanwha_QNF-8010_overhead_0383.png -> 383), or None."""
+    match = FRAME_NUMBER.search(os.path.splitext(file_name)[0])
+    return int(match.group(1)) if match else None
+
+
+def save_index(odgt_file_path, records):
+    """
+    Write the sidecar index.
+    :param records: (file_name, offset, length) per line of the .odgt, length including the newline.
+    """
+    index = {"version": INDEX_VERSION, "size": 0, "records": []}
+    for file_name, offset, length in records:
+        index["records"].append([file_name, offset, length])
+        index["size"] = offset + length
+    tmp_path = index_path(odgt_file_path) + '.tmp'
+    with open(tmp_path, 'w') as file:
+        json.dump(index, file)
+    os.replace(tmp_path, index_path(odgt_file_path))
+
+
+def load_index(odgt_file_path):
+    """Index records, or None if there is no index or it does not match the .odgt size."""
+    try:
+        with open(index_path(odgt_file_path), 'r') as file:
+            index = json.load(file)
+        size = os.path.getsize(odgt_file_path)
+    except (OSError, ValueError):
+        return None
+    if index.get("version") != INDEX_VERSION or index.get("size") != size:
+        return None
+    return [tuple(record) for record in index["records"]]
+
+
+def build_index(odgt_file_path):
+    """Scan an .odgt file and return (file_name, offset, length) for every line."""
+    records = []
+    offset = 0
+    with open(odgt_file_path, 'rb') as file:
+        for line in file:
+            if line.strip():
+                records.append((json.loads(line)["file_name"], offset, len(line)))
+            offset += len(line)
+    return records
+
+
+class OdgtReader():
+    """Memory-mapped .odgt file; records are parsed only when they are requested."""
+
+    def __init__(self, odgt_file_path, rebuild=True):
+        self.path = odgt_file_path
+        records = load_index(odgt_file_path)
+        if records is None:
+            if not rebuild:
+                raise ValueError(f"No valid index for {odgt_file_path}")
+            records = build_index(odgt_file_path)
+            save_index(odgt_file_path, records)
+
+        self.records = records
+        # later records overwrite earlier ones in both maps
+        self.by_name = {}
+        self.by_frame = {}
+        for i, (file_name, _, _) in enumerate(records):
+            self.by_name[file_name] = i
+            number = frame_number(file_name)
+            if number is not None:
+                self.by_frame[number] = i
+
+        self.file = open(odgt_file_path, 'rb')
+        size = os.fstat(self.file.fileno()).st_size
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+
+    def __len__(self):
+        return len(self.records)
+
+    def __contains__(self, file_name):
+        return file_name in self.by_name
+
+    def names(self):
+        return [file_name for file_name, _, _ in self.records]
+
+    def raw(self, i):
+        """The JSON line of the i-th record (0-based, in file order), without the newline."""
+        _, offset, length = self.records[i]
+        return self.map[offset:offset + length].rstrip(b'\r\n')
+
+    def __getitem__(self, i):
+        return json.loads(self.raw(i))
+
+    def get(self, file_name, default=None):
+        i = self.by_name.get(file_name)
+        return default if i is None else self[i]
+
+    def frame(self, number, default=None):
+        """Record whose file name ends with frame `number` (e.g. 383 for ..._0383.png)."""
+        i = self.by_frame.get(number)
+        return default if i is None else self[i]
+
+    def close(self):
+        if isinstance(self.map, mmap.mmap):
+            self.map.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,111 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor, CancelledError
+
+from image_source import open_image
+
+
+def decode_image(imagepath, cache_dir='.cache'):
+    """
+    Open and fully decode an image file.
+    Image.open is lazy, so load() is called to do the actual decoding on the calling thread.
+    :param imagepath: Path of the image on disk, or of a member of a shard (see image_source).
+    :param cache_dir: Where the index of a shard is cached.
+    :return: The decoded PIL image.
+    """
+    img = open_image(imagepath, cache_dir)
+    img.load()
+    return img
+
+
+class ImagePrefetcher():
+    """
+    Decodes the images around the current frame on a worker thread pool.
+
+    The window covers the next `ahead` and the previous `behind` images of the image list.
+    Only PIL decoding happens on the workers, the ImageTk.PhotoImage conversion has to stay
+    on the Tk main thread.
+    """
+
+    def __init__(self, ahead=2, behind=1, workers=2, loader=decode_image):
+        self.ahead = ahead
+        self.behind = behind
+        self.loader = loader
+        self.executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='prefetch')
+        self.lock = threading.Lock()
+        self.imageList = []
+        self.futures = {}  # image path -> Future
+        self.hits = 0
+        self.misses = 0
+        self.cancelled = 0
+
+    def set_images(self, image_list):
+        """
+        Replace the image list and drop all pending work for the previous one.
+        :param image_list: Sequence of image paths (a list or an ImageCatalog), it is not copied.
+        """
+        self.cancel_all()
+        self.imageList = image_list
+
+    def window(self, index):
+        """Indices (0-based) of the images that should be decoded around `index`."""
+        first = max(0, index - self.behind)
+        last = min(len(self.imageList) - 1, index + self.ahead)
+        return [i for i in range(first, last + 1) if i != index]
+
+    def schedule(self, index, skip=None):
+        """
+        Queue the window around `index` and cancel everything outside of it.
+        Called after every navigation, so a jump with gotoImage drops the stale window.
+        :param skip: Optional predicate on the image path; matching images are not decoded (e.g. already cached).
+        """
+        wanted = {self.imageList[i] for i in self.window(index)}
+        if skip is not None:
+            wanted = {path for path in wanted if not skip(path)}
+        with self.lock:
+            for path in list(self.futures):
+                if path not in wanted:
+                    if self.futures.pop(path).cancel():
+                        self.cancelled += 1
+            for path in wanted:
+                if path not in self.futures:
+                    self.futures[path] = self.executor.submit(self.loader, path)
+
+    def get(self, index):
+        """
+        Return the decoded image at `index`, waiting for an in-flight decode if there is one.
+        Falls back to decoding synchronously on a miss.
+        """
+        path = self.imageList[index]
+        with self.lock:
+            future = self.futures.pop(path, None)
+
+        if future is not None:
+            try:
+                img = future.result()
+                self.hits += 1
+                return img
+            except (CancelledError, OSError):
+                pass
+
+        self.misses += 1
+        return self.loader(path)
+
+    def cancel_all(self):
+        with self.lock:
+            for future in self.futures.values():
+                if future.cancel():
+                    self.cancelled += 1
+            self.futures = {}
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "cancelled": self.cancelled,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+    def shutdown(self):
+        self.cancel_all()
+        self.executor.shutdown(wait=False)
@@ -0,0 +1,166 @@
+"""
+Propagate labeled keyframes forward into the following unlabeled frames, without the GUI.
+
+    python propagate_batch.py Images/2fps/reolink_overhead
+    python propagate_batch.py Images/2fps/reolink_overhead --start 100 --end 400 --workers 8
+
+Every labeled frame in the range starts a segment that runs up to the next labeled frame; the
+unlabeled frames of a segment get the keyframe's boxes moved by propagation.BoxPropagator (as
+`Next wA` in the tool) and its connections. Segments are independent and run on a process pool.
+Labeled frames are never overwritten and every frame is written as soon as it is done, so an
+interrupted run is resumed by starting it again.
+"""
+import argparse
+import os
+import queue
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from multiprocessing import Manager
+
+from annotation import AnnotationDocument
+from image_catalog import label_dir
+from image_source import open_catalog
+from label_store import open_store
+from propagation import BoxPropagator
+from pyramid import ImagePyramid
+
+
+def find_segments(catalog, store, start, end):
+    """
+    Split frames start..end (0-based, inclusive) into segments [keyframe, unlabeled frames...].
+    Unlabeled frames at the start of the range continue from the last labeled frame before it.
+    :return: List of lists of frame indices, only segments with at least one unlabeled frame.
+    """
+    if start > end:
+        return []
+    labeled = [store.exists(catalog.label_name(i)) for i in range(start, end + 1)]
+    key = None
+    if not labeled[0]:
+        key = next((i for i in range(start - 1, -1, -1) if store.exists(catalog.label_name(i))), None)
+
+    segments = []
+    current = [key] if key is not None else None
+    for i, is_labeled in zip(range(start, end + 1), labeled):
+        if is_labeled:
+            if current is not None and len(current) > 1:
+                segments.append(current)
+            current = [i]
+        elif current is not None:
+            current.append(i)
+    if current is not None and len(current) > 1:
+        segments.append(current)
+    return segments
+
+
+def propagate_segment(paths, names, before_name, out_dir, store_kind, cache_dir, mode, progress):
+    """
+    Propagate the labels of paths[0] into paths[1:], writing every frame when it is done.
+    Stops early if a frame of the segment got labeled in the meantime.
+    :param before_name: Label name of the frame before the keyframe (for the velocity prediction), or None.
+    :param progress: Queue receiving (label name, number of boxes) for every written frame.
+    :return: (number of frames written, propagator stats)
+    """
+    store = open_store(store_kind, out_dir)
+    propagator = BoxPropagator(mode=mode)
+    written = 0
+    try:
+        doc = store.load(names[0])
+        before = store.load(before_name) if before_name else None
+        before_boxes = before.boxes if before is not None else None
+        prev_pyramid = ImagePyramid(paths[0], cache_dir=cache_dir)
+
+        for path, name in zip(paths[1:], names[1:]):
+            if store.exists(name):
+                break
+            pyramid = ImagePyramid(path, cache_dir=cache_dir)
+            boxes = propagator.propagate(doc.boxes, prev_pyramid, pyramid, before_boxes)
+            before_boxes = doc.boxes
+            doc = AnnotationDocument(os.path.basename(path), pyramid.width, pyramid.height, boxes, doc.hoi)
+            store.save(name, doc)
+            written += 1
+            progress.put((name, len(boxes)))
+            prev_pyramid = pyramid
+    finally:
+        store.close()
+    return written, propagator.stats()
+
+
+class PrintProgress():
+    """Progress sink for the in-process mode."""
+
+    def __init__(self, total):
+        self.total = total
+        self.done = 0
+
+    def put(self, item):
+        self.done += 1
+        print(f"[{self.done}/{self.total}] {item[0]}: {item[1]} boxes", flush=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Propagate keyframe labels into the following unlabeled frames")
+    parser.add_argument("image_dir", help="Image directory or shard, e.g. Images/2fps/reolink_overhead(.tar)")
+    parser.add_argument("--start", type=int, default=1, help="First frame (1-based, as shown in the tool)")
+    parser.add_argument("--end", type=int, default=0, help="Last frame (inclusive, default: last frame)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Worker processes (0 = run in this process)")
+    parser.add_argument("--store", type=str, default='files', choices=['files', 'sqlite'], help="Label storage")
+    parser.add_argument("--cache-dir", type=str, default='.cache', help="Directory for on-disk caches")
+    parser.add_argument("--mode", type=str, default='match', choices=['match', 'velocity'], help="Propagation mode")
+    args = parser.parse_args(argv)
+
+    catalog = open_catalog(args.image_dir, cache_dir=args.cache_dir)
+    if len(catalog) == 0:
+        print(f"No .png images found in {args.image_dir}")
+        return 1
+    out_dir = label_dir(args.image_dir)
+    os.makedirs(out_dir, exist_ok=True)
+
+    start = max(1, args.start) - 1
+    end = min(len(catalog), args.end or len(catalog)) - 1
+    if start > end:
+        print(f"Empty frame range --start {args.start} --end {args.end or len(catalog)} "
+              f"({len(catalog)} frames in {args.image_dir})")
+        return 1
+    store = open_store(args.store, out_dir)
+    segments = find_segments(catalog, store, start, end)
+    store.close()
+
+    total = sum(len(segment) - 1 for segment in segments)
+    print(f"{len(segments)} segments, {total} unlabeled frames to propagate")
+    if not segments:
+        return 0
+
+    def job(segment):
+        before_name = catalog.label_name(segment[0] - 1) if segment[0] > 0 else None
+        return ([catalog[i] for i in segment], [catalog.label_name(i) for i in segment], before_name,
+                out_dir, args.store, args.cache_dir, args.mode)
+
+    started = time.perf_counter()
+    written = 0
+    if args.workers <= 0:
+        progress = PrintProgress(total)
+        for segment in segments:
+            written += propagate_segment(*job(segment), progress)[0]
+    else:
+        with Manager() as manager, ProcessPoolExecutor(max_workers=args.workers) as executor:
+            progress = manager.Queue()
+            printer = PrintProgress(total)
+            pending = {executor.submit(propagate_segment, *job(segment), progress) for segment in segments}
+            while pending:
+                done, pending = wait(pending, timeout=0.2, return_when=FIRST_COMPLETED)
+                for future in done:
+                    written += future.result()[0]
+                try:
+                    while True:
+                        printer.put(progress.get_nowait())
+                except queue.Empty:
+                    pass
+
+    elapsed = time.perf_counter() - started
+    print(f"{written} frames written to {out_dir} in {elapsed:.1f} s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
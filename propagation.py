@@ -0,0 +1,157 @@
+"""
+Predict where the boxes of a frame are in the next frame, for nextWithAnnotationsImage.
+
+Each box is searched in the next frame by template matching (sum of squared differences computed
+with FFTs) on a downscaled pyramid level, in a window around the position predicted from the motion
+between the two previous frames. Boxes keep their order, size and tag, so the connections stay valid.
+"""
+import time
+
+import numpy as np
+
+from annotation import Box
+
+MODES = ('match', 'velocity', 'off')
+
+
+def velocity(prev_boxes, before_boxes):
+    """
+    Per-box (dx, dy) of the centers between the frame before and the previous frame, in full-resolution
+    pixels; 0 for boxes that cannot be paired (different box count or tag at the same index).
+    """
+    if before_boxes is None or len(before_boxes) != len(prev_boxes):
+        return [(0, 0)] * len(prev_boxes)
+    shifts = []
+    for prev, before in zip(prev_boxes, before_boxes):
+        if prev.tag != before.tag:
+            shifts.append((0, 0))
+            continue
+        (px, py), (bx, by) = prev.center(), before.center()
+        shifts.append((px - bx, py - by))
+    return shifts
+
+
+def ssd_map(window, template):
+    """
+    Sum of squared differences between `template` and every position of it inside `window`.
+    :return: Array of shape (Wh - Th + 1, Ww - Tw + 1), entry (y, x) for the template at window[y:, x:].
+    """
+    th, tw = template.shape
+    wh, ww = window.shape
+    # correlation of window and template via FFT; positions without wrap-around are exact
+    corr = np.fft.irfft2(np.fft.rfft2(window) * np.conj(np.fft.rfft2(template, s=window.shape)), s=window.shape)
+    corr = corr[:wh - th + 1, :ww - tw + 1]
+
+    # sum of window**2 under every template position, from an integral image
+    integral = np.zeros((wh + 1, ww + 1))
+    integral[1:, 1:] = np.cumsum(np.cumsum(window.astype(np.float64) ** 2, axis=0), axis=1)
+    energy = integral[th:, tw:] - integral[:-th, tw:] - integral[th:, :-tw] + integral[:-th, :-tw]
+
+    return energy - 2 * corr + np.sum(template.astype(np.float64) ** 2)
+
+
+def subpixel(values):
+    """Offset (-0.5..0.5) of the vertex of the parabola through three values around a minimum, 0 at the border."""
+    if len(values) != 3:
+        return 0.0
+    left, center, right = values
+    curvature = left - 2 * center + right
+    if curvature <= 0:
+        return 0.0
+    return float(np.clip((left - right) / (2 * curvature), -0.5, 0.5))
+
+
+class BoxPropagator():
+    """
+    :param mode: 'match' (template matching around the velocity prediction) or 'velocity' (prediction only).
+    :param search: Search radius in pixels of the matching level.
+    :param max_side: The matching runs on the finest pyramid level not larger than this.
+    :param min_template: Boxes smaller than this (in level pixels) or without texture only use the prediction.
+    """
+
+    def __init__(self, mode='match', search=16, max_side=1024, min_template=6):
+        self.mode = mode
+        self.search = search
+        self.max_side = max_side
+        self.min_template = min_template
+        self.timings = {'images': [], 'match': [], 'total': []}
+        self.matched = 0
+        self.predicted = 0
+
+    def match_level(self, pyramid):
+        """Pyramid level the matching runs on."""
+        return pyramid.level_for(min(1.0, self.max_side / max(pyramid.width, pyramid.height)))
+
+    def gray_level(self, pyramid):
+        """Grayscale array of the pyramid level used for matching and its scale relative to full resolution."""
+        img = pyramid.level(self.match_level(pyramid))
+        return np.asarray(img.convert('L'), dtype=np.float32), img.width / pyramid.width
+
+    def propagate(self, prev_boxes, prev_pyramid, next_pyramid, before_boxes=None):
+        """
+        Boxes of the previous frame moved to their predicted position in the next frame.
+        :param prev_boxes: Boxes of the previous frame (full-resolution corners).
+        :param prev_pyramid: ImagePyramid of the previous frame.
+        :param next_pyramid: ImagePyramid of the frame the boxes are propagated to.
+        :param before_boxes: Boxes of the frame before the previous one, for the velocity prediction (optional).
+        :return: New Box objects, in the same order.
+        """
+        start = time.perf_counter()
+        shifts = velocity(prev_boxes, before_boxes)
+
+        if self.mode == 'match' and prev_boxes:
+            prev_gray, scale = self.gray_level(prev_pyramid)
+            next_gray, _ = self.gray_level(next_pyramid)
+            images_done = time.perf_counter()
+            shifts = [self.match(prev_gray, next_gray, box, shift, scale) for box, shift in zip(prev_boxes, shifts)]
+            self.timings['images'].append(images_done - start)
+            self.timings['match'].append(time.perf_counter() - images_done)
+
+        width, height = next_pyramid.width, next_pyramid.height
+        boxes = []
+        for box, (dx, dy) in zip(prev_boxes, shifts):
+            dx, dy = int(round(dx)), int(round(dy))
+            # keep the size, move it back inside the image if needed
+            dx = min(max(dx, -box.x1), width - 1 - box.x2) if box.x2 - box.x1 < width else 0
+            dy = min(max(dy, -box.y1), height - 1 - box.y2) if box.y2 - box.y1 < height else 0
+            boxes.append(Box(box.tag, box.x1 + dx, box.y1 + dy, box.x2 + dx, box.y2 + dy))
+
+        self.timings['total'].append(time.perf_counter() - start)
+        return boxes
+
+    def match(self, prev_gray, next_gray, box, shift, scale):
+        """Full-resolution (dx, dy) of one box, searched around the predicted shift."""
+        h, w = prev_gray.shape
+        x1, y1 = max(0, int(box.x1 * scale)), max(0, int(box.y1 * scale))
+        x2, y2 = min(w, int(box.x2 * scale) + 1), min(h, int(box.y2 * scale) + 1)
+        template = prev_gray[y1:y2, x1:x2]
+        if min(template.shape) < self.min_template or template.std() < 2:
+            self.predicted += 1
+            return shift
+
+        # search window around the predicted position
+        px, py = int(round(shift[0] * scale)), int(round(shift[1] * scale))
+        wx1, wy1 = max(0, x1 + px - self.search), max(0, y1 + py - self.search)
+        wx2, wy2 = min(w, x2 + px + self.search), min(h, y2 + py + self.search)
+        if wx2 - wx1 < x2 - x1 or wy2 - wy1 < y2 - y1:
+            self.predicted += 1
+            return shift
+
+        ssd = ssd_map(next_gray[wy1:wy2, wx1:wx2], template)
+        best_y, best_x = np.unravel_index(np.argmin(ssd), ssd.shape)
+        self.matched += 1
+        # sub-pixel position of the minimum from a parabola through it and its neighbours
+        fx = best_x + (subpixel(ssd[best_y, best_x - 1:best_x + 2]) if best_x > 0 else 0.0)
+        fy = best_y + (subpixel(ssd[best_y - 1:best_y + 2, best_x]) if best_y > 0 else 0.0)
+        return (wx1 + fx - x1) / scale, (wy1 + fy - y1) / scale
+
+    def stats(self):
+        stats = {"matched": self.matched, "predicted": self.predicted}
+        for phase, times in self.timings.items():
+            if times:
+                stats[phase] = {
+                    "calls": len(times),
+                    "mean_ms": sum(times) / len(times) * 1000,
+                    "max_ms": max(times) * 1000,
+                }
+        return stats
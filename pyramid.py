@@ -0,0 +1,169 @@
+import hashlib
+import os
+import threading
+
+from PIL import Image
+
+from image_cache import image_nbytes
+from image_source import open_image, stat_image
+
+MIN_LEVEL_SIZE = 256
+
+
+def reducible(img):
+    """
+    The image in a mode Image.reduce supports: palette images become RGB (RGBA with transparency),
+    bilevel ones L and 16-bit grayscale I; other modes are returned unchanged.
+    """
+    if img.mode == 'P':
+        return img.convert('RGBA' if 'transparency' in img.info else 'RGB')
+    if img.mode == '1':
+        return img.convert('L')
+    if img.mode.startswith('I;16'):
+        return img.convert('I')
+    return img
+
+
+class ImagePyramid():
+    """
+    Multi-resolution pyramid of one image. Level k is the image downscaled by 2**k.
+
+    Levels are created lazily and the downscaled ones are persisted in `cache_dir`, keyed by path,
+    mtime and size, so a coarse level can be shown without decoding the full-resolution file.
+    `on_level(pyramid)` is called after a level was loaded, so a cache holding the pyramid can
+    account for its grown nbytes. A level that cannot be built is replaced by the full-resolution
+    image, which render() and the propagation scale like any other level.
+    """
+
+    def __init__(self, path, cache_dir=None):
+        self.path = path
+        self.cache_dir = cache_dir
+        self.lock = threading.Lock()
+        self.on_level = None
+
+        # Image.open only reads the header, the pixel data is decoded in level(0)
+        with open_image(path, cache_dir or '.cache') as header:
+            self.width, self.height = header.size
+            self.mode = header.mode
+
+        self.num_levels = 1
+        while max(self.width, self.height) >> self.num_levels >= MIN_LEVEL_SIZE:
+            self.num_levels += 1
+        self.levels = [None] * self.num_levels
+
+        size, mtime_ns = stat_image(path, cache_dir or '.cache')
+        key = f"{os.path.abspath(path)}:{mtime_ns}:{size}"
+        self.key = hashlib.sha1(key.encode()).hexdigest()
+
+    @property
+    def nbytes(self):
+        # a level that fell back to the full-resolution image shares it with level 0
+        levels = {id(level): level for level in self.levels if level is not None}
+        return sum(image_nbytes(level, photo=False) for level in levels.values())
+
+    def level_for(self, zoom):
+        """Coarsest level whose resolution is still at least the requested zoom."""
+        level = 0
+        while level + 1 < self.num_levels and 0.5 ** (level + 1) >= zoom:
+            level += 1
+        return level
+
+    def level_path(self, level):
+        return os.path.join(self.cache_dir, 'pyramid', self.key[:2], f"{self.key}_{level}.png")
+
+    def level(self, level):
+        """Return the PIL image of `level`, loading it from the disk cache or computing it."""
+        with self.lock:
+            loaded = self.levels[level] is None
+            img = self._level(level)
+        if loaded and self.on_level is not None:
+            self.on_level(self)
+        return img
+
+    def _level(self, level):
+        if self.levels[level] is not None:
+            return self.levels[level]
+
+        if level == 0:
+            img = open_image(self.path, self.cache_dir or '.cache')
+            img.load()
+        else:
+            img = None
+            cache_path = self.level_path(level) if self.cache_dir else None
+            if cache_path and os.path.exists(cache_path):
+                try:
+                    img = Image.open(cache_path)
+                    img.load()
+                    os.utime(cache_path)  # recently used, see prune_level_cache
+                except OSError:
+                    img = None
+
+            if img is None:
+                try:
+                    img = reducible(self._level(level - 1)).reduce(2)
+                except (ValueError, OSError) as e:
+                    print(f"Could not build level {level} of {self.path}, showing full resolution: {e}")
+                    img = self._level(0)
+                    cache_path = None
+                if cache_path:
+                    try:
+                        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+                        tmp_path = f"{cache_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+                        img.save(tmp_path, format='PNG', compress_level=1)
+                        os.replace(tmp_path, cache_path)
+                    except OSError as e:
+                        print(f"Could not write pyramid level {cache_path}: {e}")
+
+        self.levels[level] = img
+        return img
+
+    def render(self, zoom, box):
+        """
+        Render a region of the image as displayed at `zoom`.
+        :param zoom: Display scale relative to the full-resolution image.
+        :param box: Region (x1, y1, x2, y2) in display coordinates.
+        :return: PIL image of the region, clipped to the image extent.
+        """
+        x1, y1, x2, y2 = box
+        x2 = min(x2, int(self.width * zoom))
+        y2 = min(y2, int(self.height * zoom))
+        level = self.level_for(zoom)
+        src = self.level(level)
+        # display pixel -> level pixel, per axis since odd sizes are rounded up by reduce()
+        sx = src.width / (self.width * zoom)
+        sy = src.height / (self.height * zoom)
+        src_box = (x1 * sx, y1 * sy, x2 * sx, y2 * sy)
+        size = (max(1, x2 - x1), max(1, y2 - y1))
+
+        if sx == 1 and sy == 1:
+            return src.crop((x1, y1, x2, y2))
+        resample = Image.NEAREST if zoom > 1 else Image.BILINEAR
+        return src.resize(size, resample=resample, box=src_box)
+
+
+def prune_level_cache(cache_dir, max_bytes):
+    """
+    Delete the least recently used level files of `<cache_dir>/pyramid` until it holds at most `max_bytes`.
+    :return: (number of files deleted, bytes freed)
+    """
+    files = []
+    for dirpath, _, filenames in os.walk(os.path.join(cache_dir, 'pyramid')):
+        for filename in filenames:
+            path = os.path.join(dirpath, filename)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            files.append((st.st_mtime_ns, st.st_size, path))
+    total = sum(size for _, size, _ in files)
+    deleted = freed = 0
+    for _, size, path in sorted(files):
+        if total - freed <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        deleted += 1
+        freed += size
+    return deleted, freed
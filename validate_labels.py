@@ -0,0 +1,220 @@
+"""
+Check label files for problems the tool can produce, optionally repairing them.
+
+    python validate_labels.py                       # every camera folder under Labels/1fps, Labels/2fps and Labels/hico
+    python validate_labels.py Labels/2fps/reolink_overhead
+    python validate_labels.py --fix
+
+Each directory is loaded into AnnotationArrays and all checks run on whole columns at once:
+
+- box_out_of_bounds: box not inside width x height
+- box_non_positive_size: width or height <= 0 (corners dragged past each other)
+- hoi_index_out_of_range: subject_id / object_id not an index into gtboxes (connections are not
+  renumbered by `Delete Object`)
+- hoi_subject_not_person: the subject of a connection is not tagged person
+- invalid_file: not a readable label file
+
+--fix repairs the files with issues: corners are ordered and clipped to the image, boxes left
+without area are removed (and connections renumbered), and connections with invalid indices are
+dropped. Subjects that are not persons are only reported.
+"""
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from annotation import AnnotationDocument
+from annotation_arrays import AnnotationArrays
+from convert_2_odgt import find_label_dirs, list_label_files
+from label_store import FileLabelStore
+
+RECORD_KEYS = {"file_name", "width", "height", "gtboxes", "hoi"}
+HOI_KEYS = {"subject_id", "object_id", "interaction"}
+CHECKS = ('box_out_of_bounds', 'box_non_positive_size', 'hoi_index_out_of_range', 'hoi_subject_not_person')
+
+
+def is_number(value):
+    # bool is an int, but True as a coordinate is a broken file
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def load_records(txt_files):
+    """Parse label files, returning (records, paths) of the valid ones and the issues of the others."""
+    records, paths, issues = [], [], []
+    for txt_file in txt_files:
+        try:
+            with open(txt_file, 'r') as file:
+                data = json.load(file)
+            if not isinstance(data, dict) or not RECORD_KEYS <= data.keys():
+                raise ValueError(f"expected a JSON object with {sorted(RECORD_KEYS)}")
+            if not all(is_number(data[key]) for key in ("width", "height")):
+                raise ValueError("width / height not a number")
+            for index, gtbox in enumerate(data["gtboxes"]):
+                if not isinstance(gtbox, dict) or not isinstance(gtbox.get("tag"), str):
+                    raise ValueError(f"gtboxes[{index}] without a tag")
+                box = gtbox.get("box")
+                if not isinstance(box, list) or len(box) != 4 or not all(map(is_number, box)):
+                    raise ValueError(f"gtboxes[{index}] box is not 4 numbers: {box!r}")
+            for index, conn in enumerate(data["hoi"]):
+                if not isinstance(conn, dict) or not HOI_KEYS <= conn.keys():
+                    raise ValueError(f"hoi[{index}] without {sorted(HOI_KEYS)}")
+                if not (is_number(conn["subject_id"]) and is_number(conn["object_id"])):
+                    raise ValueError(f"hoi[{index}] subject_id / object_id not a number")
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            issues.append((txt_file, 'invalid_file', str(e)))
+            continue
+        records.append(data)
+        paths.append(txt_file)
+    return records, paths, issues
+
+
+def check_arrays(arrays):
+    """
+    Run all checks on the arrays.
+    :return: Dict check name -> (frame indices, row indices) of the offending boxes / HOI rows.
+    """
+    box_frame = arrays.box_frame
+    width, height = arrays.width[box_frame], arrays.height[box_frame]
+    x, y, w, h = arrays.x, arrays.y, arrays.w, arrays.h
+
+    positive = (w > 0) & (h > 0)
+    out_of_bounds = positive & ((x < 0) | (y < 0) | (x + w > width) | (y + h > height))
+    non_positive = ~positive
+
+    hoi_frame = arrays.hoi_frame
+    box_count = np.diff(arrays.box_offsets)[hoi_frame]
+    sub, obj = arrays.hoi_subject, arrays.hoi_object
+    out_of_range = (sub < 0) | (sub >= box_count) | (obj < 0) | (obj >= box_count)
+
+    # tag of the subject box, for the connections whose subject exists
+    person = arrays.tags.codes.get('person', -1)
+    subject_rows = arrays.box_offsets[hoi_frame] + np.clip(sub, 0, None)
+    valid_subject = (sub >= 0) & (sub < box_count)
+    subject_tag = np.full(len(sub), -1, dtype=np.int64)
+    subject_tag[valid_subject] = arrays.tag[subject_rows[valid_subject]]
+    not_person = valid_subject & (subject_tag != person)
+
+    box_rows = np.arange(len(x))
+    hoi_rows = np.arange(len(sub))
+    return {
+        'box_out_of_bounds': (box_frame[out_of_bounds], box_rows[out_of_bounds]),
+        'box_non_positive_size': (box_frame[non_positive], box_rows[non_positive]),
+        'hoi_index_out_of_range': (hoi_frame[out_of_range], hoi_rows[out_of_range]),
+        'hoi_subject_not_person': (hoi_frame[not_person], hoi_rows[not_person]),
+    }
+
+
+def describe(arrays, check, frame, row):
+    if check.startswith('box'):
+        index = row - arrays.box_offsets[frame]
+        box = [int(arrays.x[row]), int(arrays.y[row]), int(arrays.w[row]), int(arrays.h[row])]
+        return (f"gtboxes[{index}] {arrays.tags[arrays.tag[row]]} {box} "
+                f"in {int(arrays.width[frame])}x{int(arrays.height[frame])}")
+    index = row - arrays.hoi_offsets[frame]
+    return (f"hoi[{index}] {int(arrays.hoi_subject[row])} - {arrays.interactions[arrays.hoi_interaction[row]]} - "
+            f"{int(arrays.hoi_object[row])} ({int(arrays.box_offsets[frame + 1] - arrays.box_offsets[frame])} boxes)")
+
+
+def fix_document(doc):
+    """
+    Repair a document in place (see the module docstring).
+    :return: True if anything was changed.
+    """
+    changed = False
+    keep = []
+    for index, box in enumerate(doc.boxes):
+        x1, x2 = sorted((box.x1, box.x2))
+        y1, y2 = sorted((box.y1, box.y2))
+        x1, y1 = max(0, x1), max(0, y1)
+        x2, y2 = min(doc.width - 1, x2), min(doc.height - 1, y2)
+        if (x1, y1, x2, y2) != box.corners:
+            box.corners = (x1, y1, x2, y2)
+            changed = True
+        if x1 <= x2 and y1 <= y2:
+            keep.append(index)
+
+    new_index = {old: new for new, old in enumerate(keep)}
+    if len(keep) != len(doc.boxes):
+        doc.boxes = [doc.boxes[i] for i in keep]
+        changed = True
+
+    hoi = []
+    for conn in doc.hoi:
+        sub, obj = new_index.get(conn["subject_id"]), new_index.get(conn["object_id"])
+        if sub is None or obj is None:
+            changed = True
+            continue
+        if (sub, obj) != (conn["subject_id"], conn["object_id"]):
+            changed = True
+        hoi.append({"object_id": obj, "interaction": conn["interaction"], "subject_id": sub})
+    doc.hoi = hoi
+    return changed
+
+
+def validate_dir(labels_dir, fix=False):
+    """
+    Validate (and optionally fix) all label files of a directory.
+    :return: (number of files, list of (path, check, detail), number of files fixed)
+    """
+    txt_files = list_label_files(labels_dir)
+    records, paths, issues = load_records(txt_files)
+    arrays = AnnotationArrays.from_json(records)
+    arrays.paths = paths
+
+    flagged = set()
+    for check, (frames, rows) in check_arrays(arrays).items():
+        for frame, row in zip(frames.tolist(), rows.tolist()):
+            issues.append((paths[frame], check, describe(arrays, check, frame, row)))
+            if check != 'hoi_subject_not_person':
+                flagged.add(frame)
+    issues.sort(key=lambda issue: issue[0])
+
+    fixed = 0
+    if fix and flagged:
+        store = FileLabelStore(labels_dir)
+        for frame in sorted(flagged):
+            doc = AnnotationDocument.from_json(records[frame])
+            if fix_document(doc):
+                store.save_json(os.path.basename(paths[frame])[:-len('.txt')], json.dumps(doc.to_json()))
+                fixed += 1
+    return len(txt_files), issues, fixed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Validate label files")
+    parser.add_argument("labels_dir", nargs='*', help="Label directories (default: all camera folders)")
+    parser.add_argument("--labels-root", type=str, default='Labels', help="Root searched for camera folders")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Worker processes (0 = this process)")
+    parser.add_argument("--fix", action='store_true', help="Repair the files with issues in place")
+    parser.add_argument("--quiet", action='store_true', help="Only print the summary")
+    args = parser.parse_args(argv)
+
+    label_dirs = args.labels_dir or find_label_dirs(args.labels_root)
+    if args.workers > 0 and len(label_dirs) > 1:
+        with ProcessPoolExecutor(max_workers=args.workers) as executor:
+            results = list(executor.map(validate_dir, label_dirs, [args.fix] * len(label_dirs)))
+    else:
+        results = [validate_dir(labels_dir, args.fix) for labels_dir in label_dirs]
+
+    counts = dict.fromkeys(CHECKS + ('invalid_file',), 0)
+    files = fixed = 0
+    for labels_dir, (count, issues, dir_fixed) in zip(label_dirs, results):
+        files += count
+        fixed += dir_fixed
+        for path, check, detail in issues:
+            counts[check] += 1
+            if not args.quiet:
+                print(f"{path}: {check}: {detail}")
+
+    print(f"{files} files in {len(label_dirs)} directories: " +
+          ", ".join(f"{count} {check}" for check, count in counts.items()))
+    if args.fix:
+        print(f"{fixed} files fixed")
+    return 1 if any(counts.values()) and not args.fix else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())